@@ -3,7 +3,8 @@ Admin routes for user management
 """
 from fastapi import APIRouter, Depends, Query
 from core.database import get_database
-from core.security import get_current_user, require_role
+from core.security import get_current_user, require_role, invalidate_principal
+from core.pagination import paginate
 from typing import Optional
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
@@ -13,12 +14,13 @@ router = APIRouter(prefix="/admin", tags=["Admin"])
 async def get_all_users(
     search: Optional[str] = Query(None, description="Search by name, email, or phone"),
     status: Optional[str] = Query(None, description="Filter by status: active, blocked"),
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
     limit: int = Query(100, ge=1, le=1000),
     current_user: dict = Depends(require_role(["admin"])),
     db = Depends(get_database)
 ):
-    """Get all users with optional search and filters"""
+    """Get all users with optional search and filters (newest first)"""
     query = {}
     
     # Search filter
@@ -37,8 +39,7 @@ async def get_all_users(
             query["is_active"] = False
     
     # Fetch users
-    users_cursor = db.users.find(query).skip(skip).limit(limit)
-    users = await users_cursor.to_list(length=limit)
+    users, next_cursor = await paginate(db.users, query, limit, cursor, skip, sort_field="_id")
     
     # Transform users
     result_users = []
@@ -61,7 +62,8 @@ async def get_all_users(
         "users": result_users,
         "total": len(result_users),
         "skip": skip,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": next_cursor
     }
 
 
@@ -113,6 +115,8 @@ async def block_user(
         from fastapi import HTTPException, status
         raise HTTPException(status_code=404, detail="User not found")
     
+    await invalidate_principal(db, user_id)
+    
     return {"message": "User blocked successfully"}
 
 
@@ -135,6 +139,8 @@ async def unblock_user(
         from fastapi import HTTPException, status
         raise HTTPException(status_code=404, detail="User not found")
     
+    await invalidate_principal(db, user_id)
+    
     return {"message": "User unblocked successfully"}
 
 
@@ -272,4 +278,39 @@ async def force_logout_user(
         from fastapi import HTTPException, status
         raise HTTPException(status_code=404, detail="User not found")
     
+    await invalidate_principal(db, user_id)
+    
     return {"message": "User logged out from all devices"}
+
+
+@router.get("/jobs", summary="Get scheduled jobs status (Admin only)")
+async def get_scheduled_jobs(
+    current_user: dict = Depends(require_role(["admin"])),
+    db = Depends(get_database)
+):
+    """Last run, duration, throughput and lease owner of each background job"""
+    from core.scheduler import scheduler
+    
+    return {"jobs": await scheduler.status(db)}
+
+
+@router.post("/jobs/{job_name}/run", summary="Run a scheduled job now (Admin only)")
+async def run_scheduled_job(
+    job_name: str,
+    current_user: dict = Depends(require_role(["admin"])),
+    db = Depends(get_database)
+):
+    """Run a job immediately (only if no other worker is holding it)"""
+    from fastapi import HTTPException
+    from core.scheduler import scheduler
+    
+    if job_name not in scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if scheduler.get_db is None:
+        raise HTTPException(status_code=503, detail="Scheduler is not running")
+    
+    result = await scheduler.run_now(job_name)
+    if result is None:
+        raise HTTPException(status_code=409, detail="Job is held by another worker, try again later")
+    
+    return {"job": job_name, **result}
@@ -1,10 +1,14 @@
 """
 Admin referral routes
 """
+from typing import Optional
 from fastapi import APIRouter, Depends, Query
 from core.database import get_database
 from core.security import require_role
-from app.referrals.service import ReferralService
+from core.pagination import paginate
+from core.system_settings import system_settings
+from app.referrals.service import ReferralService, COMMISSION_RATE_SETTING
+from app.referrals.stats import recompute_referral_stats
 from app.referrals.schemas import WithdrawalApproval
 
 
@@ -22,6 +26,20 @@ async def get_referral_stats(
     return stats
 
 
+@router.post("/stats/reconcile", summary="Recompute referral system stats")
+async def reconcile_referral_stats(
+    current_user: dict = Depends(require_role(["admin"])),
+    db = Depends(get_database)
+):
+    """Recompute the stats rollup from source collections and report drift"""
+    result = await recompute_referral_stats(db)
+    return {
+        "message": "Referral stats reconciled",
+        "drift": {field: {"rollup": before, "actual": after} for field, (before, after) in result["drift"].items()},
+        "deferred": result["deferred"]
+    }
+
+
 @router.get("/withdrawals/pending", summary="Get pending withdrawals")
 async def get_pending_withdrawals(
     current_user: dict = Depends(require_role(["admin"])),
@@ -77,14 +95,14 @@ async def process_withdrawal(
 
 @router.get("/commissions", summary="Get all commissions")
 async def get_all_commissions(
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
     limit: int = Query(100, ge=1, le=500),
     current_user: dict = Depends(require_role(["admin"])),
     db = Depends(get_database)
 ):
     """Get all referral commissions with pagination"""
-    commissions_cursor = db.referral_commissions.find({}).sort("created_at", -1).skip(skip).limit(limit)
-    commissions = await commissions_cursor.to_list(length=limit)
+    commissions, next_cursor = await paginate(db.referral_commissions, {}, limit, cursor, skip)
     
     for commission in commissions:
         commission["_id"] = str(commission["_id"])
@@ -95,19 +113,22 @@ async def get_all_commissions(
         "commissions": commissions,
         "total": total_count,
         "skip": skip,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": next_cursor
     }
 
 
 @router.get("/users/{user_id}/referrals", summary="Get user's referral details")
 async def get_user_referrals(
     user_id: str,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page of referrals"),
+    limit: int = Query(50, ge=1, le=200),
     current_user: dict = Depends(require_role(["admin"])),
     db = Depends(get_database)
 ):
     """Get detailed referral information for a specific user"""
     service = ReferralService(db)
-    data = await service.get_referral_dashboard(user_id)
+    data = await service.get_referral_dashboard(user_id, limit, cursor)
     return data
 
 
@@ -150,21 +171,7 @@ async def update_commission_rate(
     db = Depends(get_database)
 ):
     """Update the global referral commission rate (default 10%)"""
-    # Store in settings collection
-    from datetime import datetime
-    
-    await db.system_settings.update_one(
-        {"key": "referral_commission_rate"},
-        {
-            "$set": {
-                "key": "referral_commission_rate",
-                "value": rate,
-                "updated_by": current_user["_id"],
-                "updated_at": datetime.utcnow().isoformat()
-            }
-        },
-        upsert=True
-    )
+    await system_settings.set(db, COMMISSION_RATE_SETTING, rate, updated_by=current_user["_id"])
     
     return {
         "message": "Commission rate updated successfully",
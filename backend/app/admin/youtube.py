@@ -1,8 +1,10 @@
 """
 Admin YouTube request management routes
 """
+from typing import Optional
 from fastapi import APIRouter, Depends, Query
 from core.database import get_database
+from core.loaders import UserLoader, get_user_loader, user_info
 from core.security import require_role
 from app.youtube.service import YouTubeRequestService
 from app.youtube.schemas import YouTubeRequestUpdate
@@ -13,15 +15,21 @@ router = APIRouter(prefix="/admin/youtube", tags=["Admin - YouTube"])
 
 @router.get("/requests", summary="List all YouTube requests (Admin)")
 async def list_youtube_requests(
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
     limit: int = Query(100, ge=1, le=1000),
     status: str = Query(None, description="Filter by status: pending, done"),
     current_user: dict = Depends(require_role(["admin"])),
-    db=Depends(get_database)
+    db=Depends(get_database),
+    user_loader: UserLoader = Depends(get_user_loader)
 ):
-    """List all YouTube email requests (admin only)"""
+    """
+    List all YouTube email requests (admin only)
+    - username / registered_email are as submitted; user_info is the current profile
+    """
     service = YouTubeRequestService(db)
-    requests = await service.list_requests(skip, limit, status)
+    requests, next_cursor = await service.list_requests(skip, limit, status, cursor)
+    users = await user_loader.load_many(r["user_id"] for r in requests)
     
     return {
         "requests": [
@@ -30,6 +38,7 @@ async def list_youtube_requests(
                 "user_id": r["user_id"],
                 "username": r["username"],
                 "registered_email": r["registered_email"],
+                "user_info": user_info(r["user_id"], users.get(str(r["user_id"]))),
                 "subscription_id": r["subscription_id"],
                 "youtube_email": r["youtube_email"],
                 "platform_name": r.get("platform_name"),
@@ -41,7 +50,8 @@ async def list_youtube_requests(
             }
             for r in requests
         ],
-        "count": len(requests)
+        "count": len(requests),
+        "next_cursor": next_cursor
     }
 
 
@@ -0,0 +1,98 @@
+"""
+Per-platform credential counters and derived product stock
+
+``credential_counters`` holds one ``{"_id": platform_key, "available": n}``
+document per platform, where available = active credentials not claimed by
+a subscription (exactly what ``CredentialPool.claim`` can hand out). The pool
+and the credential service ``$inc`` it on every claim, release, recycle,
+create, update and delete, so stock for credential-backed products is read
+from the counters instead of the separately edited ``products.stock``.
+
+``StockCache`` keeps a per-worker copy of the counters for the product list;
+``recompute_counters`` rebuilds them from ``credentials`` in one aggregation
+(run by ``reconcile_credential_counters.py`` and on first startup).
+``product_stock`` in ``pool.py`` turns counters into product stock.
+"""
+import time
+from typing import Dict, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from core.config import settings
+
+
+def is_available(credential: dict) -> bool:
+    """Whether a credential document can be claimed"""
+    return bool(credential.get("is_active")) and "used_by" not in credential
+
+
+async def adjust_available(db: AsyncIOMotorDatabase, deltas: Dict[str, int], session=None):
+    """$inc available counters, e.g. {"netflix": -1}"""
+    operations = [
+        UpdateOne({"_id": key}, {"$inc": {"available": delta}}, upsert=True)
+        for key, delta in deltas.items()
+        if key and delta
+    ]
+    if operations:
+        await db.credential_counters.bulk_write(operations, ordered=False, session=session)
+    stock_cache.invalidate()
+
+
+async def recompute_counters(db: AsyncIOMotorDatabase) -> dict:
+    """
+    Rebuild counters from credentials
+    Returns {"counters": {...}, "drift": {key: (counter, actual)}}
+    """
+    pipeline = [
+        {"$match": {"is_active": True, "used_by": {"$exists": False}}},
+        {"$group": {"_id": "$platform_key", "available": {"$sum": 1}}}
+    ]
+    actual = {
+        row["_id"]: row["available"]
+        async for row in db.credentials.aggregate(pipeline)
+        if row["_id"]
+    }
+    current = {
+        doc["_id"]: doc.get("available", 0)
+        async for doc in db.credential_counters.find({})
+    }
+
+    drift = {
+        key: (current.get(key, 0), actual.get(key, 0))
+        for key in set(actual) | set(current)
+        if current.get(key, 0) != actual.get(key, 0)
+    }
+    operations = [
+        UpdateOne({"_id": key}, {"$set": {"available": actual.get(key, 0)}}, upsert=True)
+        for key in drift
+    ]
+    if operations:
+        await db.credential_counters.bulk_write(operations, ordered=False)
+    stock_cache.invalidate()
+    return {"counters": actual, "drift": drift}
+
+
+class StockCache:
+    """Per-worker copy of credential_counters (tiny: one entry per platform)"""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._counters: Optional[Dict[str, int]] = None
+        self._loaded_at = 0.0
+
+    async def get(self, db: AsyncIOMotorDatabase) -> Dict[str, int]:
+        """Counters, reloaded at most every ttl_seconds"""
+        if self._counters is None or time.monotonic() - self._loaded_at > self.ttl_seconds:
+            self._counters = {
+                doc["_id"]: doc.get("available", 0)
+                async for doc in db.credential_counters.find({})
+            }
+            self._loaded_at = time.monotonic()
+        return self._counters
+
+    def invalidate(self):
+        """Drop this worker's copy (other workers pick changes up within the TTL)"""
+        self._counters = None
+
+
+# Global cache (one per worker)
+stock_cache = StockCache(ttl_seconds=settings.STOCK_CACHE_SECONDS)
@@ -0,0 +1,202 @@
+"""
+Streaming bulk credential importer
+
+Supplier files run to hundreds of thousands of lines, so the importer never
+holds the whole file: it reads the input in blocks, parses lines into a
+bounded chunk of documents and writes each chunk with an unordered
+``insert_many``. Duplicates are rejected by the unique
+``(platform_key, username)`` index and counted, invalid lines are counted
+with a sample of reasons, and neither aborts the import.
+
+Line format (``#`` comments and blank lines are skipped)::
+
+    Platform|Username|Password|Notes
+
+Comma separated lines are accepted as well (a ``platform,username,...``
+header row is skipped). After every chunk ``offset`` is the byte position
+of the first line that has not been written yet, so an interrupted import
+can be resumed with ``start_offset=offset``.
+"""
+import asyncio
+import csv
+import time
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError
+from .pool import platform_key
+from .counters import adjust_available
+
+
+DUPLICATE_KEY = 11000
+READ_BLOCK_SIZE = 64 * 1024
+# Invalid / failed lines reported back in detail
+MAX_ERROR_SAMPLES = 100
+
+
+ProgressFunc = Callable[[dict], Awaitable[None]]
+
+
+def parse_line(line: str) -> Optional[List[str]]:
+    """Split a line into fields, or None for blank lines, comments and headers"""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if "|" in line:
+        fields = line.split("|")
+    else:
+        fields = next(csv.reader([line]))
+    fields = [field.strip() for field in fields]
+    if fields[0].lower() == "platform":
+        return None
+    return fields
+
+
+def credential_document(fields: List[str], now: str) -> dict:
+    """Credential document from parsed fields (raises ValueError if invalid)"""
+    if len(fields) < 3:
+        raise ValueError("need at least Platform|Username|Password")
+    platform, username, password = fields[:3]
+    notes = fields[3] if len(fields) > 3 and fields[3] else None
+    if not platform or not username or not password:
+        raise ValueError("platform, username and password must not be empty")
+    key = platform_key(platform)
+    if not key:
+        raise ValueError(f"unrecognized platform '{platform}'")
+    return {
+        "platform": platform,
+        "platform_key": key,
+        "username": username,
+        "password": password,
+        "notes": notes,
+        "is_active": True,
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+async def file_blocks(path: str, start_offset: int = 0) -> AsyncIterator[bytes]:
+    """Read a file in blocks from a byte offset without blocking the event loop"""
+    with open(path, "rb") as f:
+        f.seek(start_offset)
+        while True:
+            block = await asyncio.to_thread(f.read, READ_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+
+
+async def split_lines(blocks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Raw lines (newline included) from a stream of byte blocks"""
+    pending = b""
+    async for block in blocks:
+        pending += block
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+    if pending:
+        yield pending
+
+
+class CredentialImporter:
+    """Imports credentials from a byte stream in bounded chunks"""
+
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        chunk_size: int = 1000,
+        on_progress: Optional[ProgressFunc] = None
+    ):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.on_progress = on_progress
+        self.stats = {
+            "lines": 0,
+            "inserted": 0,
+            "duplicates": 0,
+            "invalid": 0,
+            "failed": 0,
+            "offset": 0,
+            "elapsed_seconds": 0.0,
+            "lines_per_sec": 0.0,
+            "errors": []
+        }
+        self._started = 0.0
+        self._lines_at_start = 0
+
+    def _error(self, line_no: int, reason: str):
+        if len(self.stats["errors"]) < MAX_ERROR_SAMPLES:
+            self.stats["errors"].append({"line": line_no, "error": reason})
+
+    async def import_file(self, path: str, start_offset: int = 0) -> dict:
+        """Import a file, optionally resuming from a byte offset"""
+        return await self.run(file_blocks(path, start_offset), start_offset)
+
+    async def run(self, blocks: AsyncIterator[bytes], start_offset: int = 0) -> dict:
+        """
+        Import from a stream of byte blocks
+        Line numbers continue from stats["lines"], so when resuming seed
+        the stats of the earlier run to keep them absolute
+        """
+        self._started = time.perf_counter()
+        self._lines_at_start = self.stats["lines"]
+        self.stats["offset"] = start_offset
+        offset = start_offset
+        chunk: List[Tuple[int, dict]] = []
+
+        async for raw in split_lines(blocks):
+            offset += len(raw)
+            self.stats["lines"] += 1
+            line_no = self.stats["lines"]
+            try:
+                fields = parse_line(raw.decode("utf-8-sig" if line_no == 1 else "utf-8"))
+                if fields is None:
+                    continue
+                chunk.append((line_no, credential_document(fields, datetime.utcnow().isoformat())))
+            except (UnicodeDecodeError, ValueError, csv.Error) as e:
+                self.stats["invalid"] += 1
+                self._error(line_no, str(e))
+                continue
+
+            if len(chunk) >= self.chunk_size:
+                await self._write(chunk)
+                chunk = []
+                await self._checkpoint(offset)
+
+        if chunk:
+            await self._write(chunk)
+        await self._checkpoint(offset)
+        return self.stats
+
+    async def _write(self, chunk: List[Tuple[int, dict]]):
+        """Unordered insert of one chunk; duplicates and failures are counted, not raised"""
+        failed_indexes = set()
+        try:
+            await self.db.credentials.insert_many([doc for _, doc in chunk], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed_indexes.add(error["index"])
+                line_no = chunk[error["index"]][0]
+                if error.get("code") == DUPLICATE_KEY:
+                    self.stats["duplicates"] += 1
+                else:
+                    self.stats["failed"] += 1
+                    self._error(line_no, error.get("errmsg", "write failed"))
+
+        deltas: Dict[str, int] = {}
+        for index, (_, doc) in enumerate(chunk):
+            if index not in failed_indexes:
+                deltas[doc["platform_key"]] = deltas.get(doc["platform_key"], 0) + 1
+        self.stats["inserted"] += sum(deltas.values())
+        await adjust_available(self.db, deltas)
+
+    async def _checkpoint(self, offset: int):
+        """Record progress after a chunk is written"""
+        elapsed = time.perf_counter() - self._started
+        self.stats["offset"] = offset
+        self.stats["elapsed_seconds"] = round(elapsed, 2)
+        lines = self.stats["lines"] - self._lines_at_start
+        self.stats["lines_per_sec"] = round(lines / elapsed, 1) if elapsed else 0.0
+        if self.on_progress:
+            await self.on_progress(self.stats)
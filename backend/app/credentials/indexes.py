@@ -0,0 +1,39 @@
+"""
+Credential pool indexes
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+
+INDEXES = {
+    "credentials": [
+        # One credential per account and platform (bulk import dedup)
+        IndexModel(
+            [("platform_key", ASCENDING), ("username", ASCENDING)],
+            name="platform_key_username_unique",
+            unique=True
+        ),
+        # Credential claim at checkout (CredentialPool.claim)
+        IndexModel(
+            [("platform_key", ASCENDING), ("is_active", ASCENDING), ("used_by", ASCENDING)],
+            name="platform_key_is_active_used_by"
+        ),
+        # Release by subscription (refund, recycling)
+        IndexModel(
+            [("subscription_id", ASCENDING)],
+            name="subscription_id",
+            partialFilterExpression={"subscription_id": {"$exists": True}}
+        ),
+        # Recycled credentials waiting for a new password
+        IndexModel(
+            [("rotation_required", ASCENDING)],
+            name="rotation_required",
+            partialFilterExpression={"rotation_required": True}
+        ),
+        # Admin credential list
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+    ],
+    # Upload history (newest first)
+    "credential_imports": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+    ]
+}
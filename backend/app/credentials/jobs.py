@@ -0,0 +1,16 @@
+"""
+Scheduled credential pool jobs (registered with core.scheduler in main.py)
+"""
+from datetime import timedelta
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from core.config import settings
+from .pool import CredentialPool
+
+
+async def recycle_credentials_job(db: AsyncIOMotorDatabase) -> dict:
+    """Return credentials of expired / cancelled subscriptions to the pool"""
+    return await CredentialPool(db).recycle_ended(
+        batch_size=settings.CREDENTIAL_RECYCLE_BATCH_SIZE,
+        cooldown=timedelta(hours=settings.CREDENTIAL_RECYCLE_COOLDOWN_HOURS),
+        require_rotation=settings.CREDENTIAL_RECYCLE_REQUIRE_ROTATION
+    )
@@ -0,0 +1,363 @@
+"""
+Credential pool allocator
+
+Products and credentials both carry a canonical ``platform_key`` (e.g.
+"Amazon Prime Video" -> "prime") so checkout can claim an unused credential
+with one indexed find_one_and_update instead of probing name variations.
+The claim is atomic: two concurrent buyers can never get the same credential.
+
+Credentials of expired / cancelled subscriptions are recycled back into the
+pool by a scheduled job: ending a subscription flags it with
+``credentials_release_pending`` and the job releases its credentials in bulk.
+"""
+import asyncio
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from .counters import adjust_available
+
+
+# Keyword -> canonical key, checked in order (first match wins)
+PLATFORM_KEYWORDS = [
+    ("combo", "combo"),
+    ("youtube", "youtube"),
+    ("netflix", "netflix"),
+    ("prime", "prime"),
+    ("amazon", "prime"),
+    ("pornhub", "pornhub"),
+    ("hotstar", "hotstar"),
+    ("zee", "zee5"),
+]
+
+# Unique (platform_key, username) index, as labelled by core.indexes
+UNIQUE_CREDENTIAL_INDEX = "credentials.platform_key_username_unique"
+# Duplicate groups listed in the startup / sync_indexes report
+MAX_DUPLICATE_GROUPS = 100
+
+# Platforms bundled in a combo plan: key -> display name
+COMBO_COMPONENTS = {
+    "netflix": "Netflix",
+    "prime": "Prime",
+    "pornhub": "Pornhub",
+}
+
+# Platforms that are fulfilled without a pooled credential
+NON_POOLED_PLATFORMS = {"youtube"}
+
+# Subscription statuses whose credentials go back to the pool
+ENDED_STATUSES = ["expired", "cancelled"]
+
+# Fields that tie a credential to a subscription
+CLAIM_FIELDS = {"used_by": "", "used_at": "", "subscription_id": "", "user_info": ""}
+
+
+def platform_key(platform_name: str) -> str:
+    """Normalize a platform/product name to its canonical pool key"""
+    name = (platform_name or "").lower()
+    for keyword, key in PLATFORM_KEYWORDS:
+        if keyword in name:
+            return key
+    # Unknown platform: first word, alphanumerics only
+    words = name.split()
+    return re.sub(r"[^a-z0-9]", "", words[0]) if words else ""
+
+
+def is_pooled(product: dict) -> bool:
+    """Whether a product is fulfilled (and stocked) from the credential pool"""
+    key = product.get("platform_key") or platform_key(product.get("platform_name", ""))
+    return key not in NON_POOLED_PLATFORMS
+
+
+def product_stock(product: dict, counters: Dict[str, int]) -> int:
+    """
+    Sellable stock of a product from credential counters
+    A combo needs one credential of each component; non-pooled platforms
+    keep the stored products.stock.
+    """
+    key = product.get("platform_key") or platform_key(product.get("platform_name", ""))
+    if key in NON_POOLED_PLATFORMS:
+        return product.get("stock", 0)
+    if key == "combo":
+        return max(0, min(counters.get(component, 0) for component in COMBO_COMPONENTS))
+    return max(0, counters.get(key, 0))
+
+
+class CredentialPool:
+    """Claims and reports pooled OTT credentials"""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+
+    async def claim(
+        self,
+        key: str,
+        user_id: str,
+        subscription_id: str,
+        user_info: Optional[dict] = None,
+        session=None
+    ) -> Optional[dict]:
+        """
+        Atomically claim one unused credential for a subscription
+        Returns the claimed credential or None if the platform is out of stock
+        """
+        now = datetime.utcnow().isoformat()
+        credential = await self.db.credentials.find_one_and_update(
+            {
+                "platform_key": key,
+                "is_active": True,
+                "used_by": {"$exists": False}
+            },
+            {
+                "$set": {
+                    "used_by": user_id,
+                    "used_at": now,
+                    "subscription_id": subscription_id,
+                    "user_info": user_info,
+                    "updated_at": now
+                }
+            },
+            projection={"username": 1, "password": 1, "platform_key": 1},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if credential:
+            await adjust_available(self.db, {key: -1}, session=session)
+        return credential
+
+    async def release(self, credential_id, subscription_id: str, session=None) -> bool:
+        """
+        Return a claimed credential to the pool
+        Only releases it if it is still claimed for the given subscription
+        """
+        released = await self.db.credentials.find_one_and_update(
+            {"_id": credential_id, "subscription_id": subscription_id},
+            {
+                "$unset": CLAIM_FIELDS,
+                "$set": {"updated_at": datetime.utcnow().isoformat()}
+            },
+            projection={"platform_key": 1, "is_active": 1},
+            session=session
+        )
+        if released and released.get("is_active"):
+            await adjust_available(self.db, {released.get("platform_key"): 1}, session=session)
+        return released is not None
+
+    async def release_subscription(self, subscription_id: str, session=None) -> int:
+        """Return every credential claimed for a subscription to the pool"""
+        claimed = await self.db.credentials.find(
+            {"subscription_id": subscription_id},
+            {"platform_key": 1, "is_active": 1},
+            session=session
+        ).to_list(length=None)
+        if not claimed:
+            return 0
+        result = await self.db.credentials.update_many(
+            {"_id": {"$in": [cred["_id"] for cred in claimed]}, "subscription_id": subscription_id},
+            {
+                "$unset": CLAIM_FIELDS,
+                "$set": {"updated_at": datetime.utcnow().isoformat()}
+            },
+            session=session
+        )
+        await adjust_available(
+            self.db,
+            Counter(cred.get("platform_key") for cred in claimed if cred.get("is_active")),
+            session=session
+        )
+        return result.modified_count
+
+    async def claim_all(
+        self,
+        keys: List[str],
+        user_id: str,
+        subscription_id: str,
+        user_info: Optional[dict] = None,
+        session=None
+    ) -> Tuple[Dict[str, dict], List[str]]:
+        """
+        Claim one credential per key concurrently, all-or-nothing
+
+        Returns (claimed credentials by key, keys that were out of stock).
+        If any key is out of stock (or a claim fails), the credentials that
+        were claimed are released again so nothing leaks from the pool.
+        """
+        if session is not None:
+            # Operations on one session can't run concurrently; the
+            # transaction makes the claims all-or-nothing instead
+            claimed = {}
+            for key in keys:
+                cred = await self.claim(key, user_id, subscription_id, user_info, session=session)
+                if cred is None:
+                    return {}, [key]
+                claimed[key] = cred
+            return claimed, []
+
+        results = await asyncio.gather(
+            *(self.claim(key, user_id, subscription_id, user_info) for key in keys),
+            return_exceptions=True
+        )
+
+        claimed = {key: cred for key, cred in zip(keys, results) if isinstance(cred, dict)}
+        missing = [key for key, cred in zip(keys, results) if cred is None]
+        errors = [cred for cred in results if isinstance(cred, BaseException)]
+
+        if missing or errors:
+            await asyncio.gather(
+                *(self.release(cred["_id"], subscription_id) for cred in claimed.values())
+            )
+            if errors:
+                raise errors[0]
+            return {}, missing
+
+        return claimed, []
+
+    async def recycle_ended(
+        self,
+        batch_size: int = 200,
+        max_batches: int = 10,
+        cooldown: timedelta = timedelta(0),
+        require_rotation: bool = False
+    ) -> dict:
+        """
+        Release credentials of subscriptions that ended at least `cooldown` ago
+
+        - **require_rotation**: recycled credentials are parked (inactive,
+          rotation_required) until an admin sets a new password
+        - Returns counters: processed (credentials), subscriptions, by_platform
+        """
+        cutoff = (datetime.utcnow() - cooldown).isoformat()
+        recycled = 0
+        subscriptions = 0
+        by_platform: Counter = Counter()
+
+        for _ in range(max_batches):
+            ended = await self.db.subscriptions.find(
+                {"credentials_release_pending": True, "updated_at": {"$lte": cutoff}},
+                {"_id": 1}
+            ).sort("updated_at", 1).limit(batch_size).to_list(length=batch_size)
+            if not ended:
+                break
+
+            subscription_ids = [str(sub["_id"]) for sub in ended]
+            credentials = await self.db.credentials.find(
+                {"subscription_id": {"$in": subscription_ids}},
+                {"platform_key": 1, "is_active": 1}
+            ).to_list(length=None)
+
+            if credentials:
+                now = datetime.utcnow().isoformat()
+                fields = {"recycled_at": now, "updated_at": now}
+                if require_rotation:
+                    fields.update({"is_active": False, "rotation_required": True})
+                result = await self.db.credentials.update_many(
+                    {"_id": {"$in": [cred["_id"] for cred in credentials]}, "subscription_id": {"$in": subscription_ids}},
+                    {"$unset": CLAIM_FIELDS, "$set": fields, "$inc": {"recycle_count": 1}}
+                )
+                recycled += result.modified_count
+                if result.modified_count:
+                    # A concurrent run may have released some of them first:
+                    # count only the credentials this update changed
+                    released = await self.db.credentials.find(
+                        {"_id": {"$in": [cred["_id"] for cred in credentials]}, "recycled_at": now},
+                        {"platform_key": 1, "is_active": 1}
+                    ).to_list(length=None)
+                    by_platform.update(cred.get("platform_key") or "unknown" for cred in released)
+                    if not require_rotation:
+                        await adjust_available(
+                            self.db,
+                            Counter(cred.get("platform_key") for cred in released if cred.get("is_active"))
+                        )
+
+            await self.db.subscriptions.update_many(
+                {"_id": {"$in": [sub["_id"] for sub in ended]}},
+                {
+                    "$unset": {"credentials_release_pending": ""},
+                    "$set": {"credentials_released_at": datetime.utcnow().isoformat()}
+                }
+            )
+            subscriptions += len(ended)
+            if len(ended) < batch_size:
+                break
+
+        return {"processed": recycled, "subscriptions": subscriptions, "by_platform": dict(by_platform)}
+
+    async def backfill_release_pending(self) -> int:
+        """Flag subscriptions that ended before recycling existed"""
+        result = await self.db.subscriptions.update_many(
+            {
+                "status": {"$in": ENDED_STATUSES},
+                "credentials_release_pending": {"$exists": False},
+                "credentials_released_at": {"$exists": False}
+            },
+            {"$set": {"credentials_release_pending": True}}
+        )
+        return result.modified_count
+
+    async def available_counts(self) -> dict:
+        """Unused active credentials per platform key (from credential_counters)"""
+        counters = await self.db.credential_counters.find({}).to_list(length=None)
+        return {c["_id"]: c.get("available", 0) for c in counters}
+
+    async def backfill_platform_keys(self) -> int:
+        """
+        Set platform_key on credentials/products created before it existed (or left null)
+        One update_many per distinct platform name, so this is cheap to run at startup
+        """
+        updated = 0
+        for collection, field in (("credentials", "platform"), ("products", "platform_name")):
+            names = await self.db[collection].distinct(field, {"platform_key": None})
+            for name in names:
+                result = await self.db[collection].update_many(
+                    {field: name, "platform_key": None},
+                    {"$set": {"platform_key": platform_key(name)}}
+                )
+                updated += result.modified_count
+        return updated
+
+    async def find_duplicate_credentials(self, limit: int = MAX_DUPLICATE_GROUPS) -> list:
+        """
+        Accounts stored more than once for the same platform
+        They block the unique (platform_key, username) index until an admin
+        deletes the extra copies. Returns [{"platform_key", "username", "count", "credential_ids"}]
+        """
+        rows = await self.db.credentials.aggregate([
+            {"$group": {
+                "_id": {"platform_key": "$platform_key", "username": "$username"},
+                "count": {"$sum": 1},
+                "credential_ids": {"$push": "$_id"}
+            }},
+            {"$match": {"count": {"$gt": 1}}},
+            {"$sort": {"count": -1}},
+            {"$limit": limit}
+        ], allowDiskUse=True).to_list(length=limit)
+        return [
+            {
+                "platform_key": row["_id"].get("platform_key"),
+                "username": row["_id"].get("username"),
+                "count": row["count"],
+                "credential_ids": [str(credential_id) for credential_id in row["credential_ids"]]
+            }
+            for row in rows
+        ]
+
+
+async def report_duplicate_credentials(db: AsyncIOMotorDatabase, index_report: dict) -> list:
+    """Print duplicate credentials if the unique index couldn't be built, returns them"""
+    blocked = [
+        label for label in index_report["failed"] + index_report["missing"]
+        if label.startswith(UNIQUE_CREDENTIAL_INDEX)
+    ]
+    if not blocked:
+        return []
+    duplicates = await CredentialPool(db).find_duplicate_credentials()
+    if duplicates:
+        print(f"  ⚠️  {len(duplicates)} duplicate credential accounts block {UNIQUE_CREDENTIAL_INDEX}; delete the extra copies:")
+        for duplicate in duplicates:
+            print(
+                f"     {duplicate['platform_key']} / {duplicate['username']}: "
+                f"{duplicate['count']} copies ({', '.join(duplicate['credential_ids'])})"
+            )
+    return duplicates
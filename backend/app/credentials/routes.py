@@ -1,10 +1,16 @@
 """
 Admin credentials management routes
 """
-from fastapi import APIRouter, Depends, Query
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Query, Request, UploadFile
+from core.config import settings
 from core.database import get_database
+from core.loaders import UserLoader, get_user_loader, user_info
 from core.security import require_role
 from .service import CredentialService
+from .pool import CredentialPool
+from .importer import CredentialImporter
+from .uploads import CredentialImportService, save_upload, import_out
 from .schemas import CredentialCreate, CredentialUpdate
 
 
@@ -13,18 +19,22 @@ router = APIRouter(prefix="/admin/credentials", tags=["Admin - Credentials"])
 
 @router.get("", summary="List all credentials (Admin)")
 async def list_credentials(
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
     limit: int = Query(100, ge=1, le=1000),
     platform: str = Query(None, description="Filter by platform name"),
     is_active: bool = Query(None, description="Filter by active status"),
     current_user: dict = Depends(require_role(["admin"])),
-    db=Depends(get_database)
+    db=Depends(get_database),
+    user_loader: UserLoader = Depends(get_user_loader)
 ):
     """List all OTT platform credentials (admin only)"""
     service = CredentialService(db)
-    credentials = await service.list_credentials(skip, limit, platform, is_active)
+    credentials, next_cursor = await service.list_credentials(skip, limit, platform, is_active, cursor)
+    
+    # Resolve the users of used credentials in one query
+    users = await user_loader.load_many(c.get("used_by") for c in credentials)
     
-    # Get user details for used credentials
     result_credentials = []
     for c in credentials:
         cred_data = {
@@ -41,28 +51,113 @@ async def list_credentials(
             "subscription_id": c.get("subscription_id")
         }
         
-        # Get user info if credential is used
-        if c.get("used_by"):
-            try:
-                user = await db.users.find_one({"_id": ObjectId(c["used_by"])})
-                if user:
-                    cred_data["user_info"] = {
-                        "user_id": c["used_by"],
-                        "name": user.get("name"),
-                        "email": user.get("email"),
-                        "phone": user.get("phone")
-                    }
-            except:
-                pass
+        info = user_info(c["used_by"], users.get(str(c["used_by"]))) if c.get("used_by") else None
+        if info:
+            cred_data["user_info"] = info
         
         result_credentials.append(cred_data)
     
     return {
         "credentials": result_credentials,
-        "count": len(result_credentials)
+        "count": len(result_credentials),
+        "next_cursor": next_cursor
+    }
+
+
+@router.get("/pool", summary="Available credentials per platform (Admin)")
+async def get_pool_availability(
+    current_user: dict = Depends(require_role(["admin"])),
+    db=Depends(get_database)
+):
+    """Count unused active credentials per platform key (admin only)"""
+    pool = CredentialPool(db)
+    available = await pool.available_counts()
+    return {
+        "platforms": available,
+        "total_available": sum(available.values()),
+        "awaiting_rotation": await db.credentials.count_documents({"rotation_required": True})
+    }
+
+
+@router.post("/import", summary="Bulk import credentials (Admin)")
+async def import_credentials(
+    request: Request,
+    offset: int = Query(0, ge=0, description="Byte offset the body starts at (resume)"),
+    current_user: dict = Depends(require_role(["admin"])),
+    db=Depends(get_database)
+):
+    """
+    Import credentials from the raw request body (admin only)
+    - One `Platform|Username|Password|Notes` per line, streamed in chunks
+    - Duplicates (same platform and username) and invalid lines are counted, not fatal
+    - `offset` in the response is where to resume if the import was interrupted
+    """
+    importer = CredentialImporter(db, chunk_size=settings.CREDENTIAL_IMPORT_CHUNK_SIZE)
+    stats = await importer.run(request.stream(), start_offset=offset)
+    return {"message": "Import finished", **stats}
+
+
+@router.post("/imports", status_code=202, summary="Upload credentials file (Admin)")
+async def upload_credentials(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(..., description="Platform|Username|Password|Notes per line, or CSV"),
+    current_user: dict = Depends(require_role(["admin"])),
+    db=Depends(get_database)
+):
+    """
+    Upload a credentials file for import (admin only)
+    - The file is saved to disk in chunks (max MAX_FILE_SIZE) and imported in the background
+    - Poll `GET /admin/credentials/imports/{id}` for progress
+    """
+    path, size = await save_upload(file)
+    service = CredentialImportService(db)
+    record = await service.create_import(file.filename, path, size, str(current_user["_id"]))
+    background_tasks.add_task(service.run_import, record["_id"])
+    return {"message": "Import queued", "import": import_out(record)}
+
+
+@router.get("/imports", summary="List credential imports (Admin)")
+async def list_imports(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(require_role(["admin"])),
+    db=Depends(get_database)
+):
+    """Recent credential file imports, newest first (admin only)"""
+    service = CredentialImportService(db)
+    records, next_cursor = await service.list_imports(limit, cursor)
+    return {
+        "imports": [import_out(record) for record in records],
+        "count": len(records),
+        "next_cursor": next_cursor
     }
 
 
+@router.get("/imports/{import_id}", summary="Credential import progress (Admin)")
+async def get_import(
+    import_id: str,
+    current_user: dict = Depends(require_role(["admin"])),
+    db=Depends(get_database)
+):
+    """Status and progress (rows done / failed) of an import (admin only)"""
+    service = CredentialImportService(db)
+    return import_out(await service.get_import(import_id))
+
+
+@router.post("/imports/{import_id}/resume", status_code=202, summary="Resume credential import (Admin)")
+async def resume_import(
+    import_id: str,
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(require_role(["admin"])),
+    db=Depends(get_database)
+):
+    """Continue a failed or stalled import from its last offset (admin only)"""
+    service = CredentialImportService(db)
+    record = await service.resume_import(import_id)
+    background_tasks.add_task(service.run_import, record["_id"])
+    return {"message": "Import resumed", "import": import_out(record)}
+
+
 @router.get("/{credential_id}", summary="Get credential by ID (Admin)")
 async def get_credential(
     credential_id: str,
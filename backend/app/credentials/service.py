@@ -5,6 +5,10 @@ from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+from core.pagination import paginate
+from .pool import platform_key
+from .counters import adjust_available, is_available
 
 
 class CredentialService:
@@ -17,6 +21,7 @@ class CredentialService:
         """Create new credential"""
         credential = {
             "platform": platform,
+            "platform_key": platform_key(platform),
             "username": username,
             "password": password,
             "notes": notes,
@@ -25,8 +30,12 @@ class CredentialService:
             "updated_at": datetime.utcnow().isoformat()
         }
         
-        result = await self.db.credentials.insert_one(credential)
+        try:
+            result = await self.db.credentials.insert_one(credential)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=409, detail="Credential already exists for this platform")
         credential["_id"] = str(result.inserted_id)
+        await adjust_available(self.db, {credential["platform_key"]: 1})
         
         return credential
     
@@ -43,21 +52,27 @@ class CredentialService:
         credential["_id"] = str(credential["_id"])
         return credential
     
-    async def list_credentials(self, skip: int = 0, limit: int = 100, platform: str = None, is_active: bool = None) -> list:
-        """List all credentials with optional filters"""
+    async def list_credentials(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        platform: str = None,
+        is_active: bool = None,
+        cursor: str = None
+    ) -> tuple:
+        """List all credentials with optional filters, returns (credentials, next_cursor)"""
         query = {}
         if platform:
             query["platform"] = {"$regex": platform, "$options": "i"}
         if is_active is not None:
             query["is_active"] = is_active
         
-        cursor = self.db.credentials.find(query).sort("created_at", -1).skip(skip).limit(limit)
-        credentials = await cursor.to_list(length=limit)
+        credentials, next_cursor = await paginate(self.db.credentials, query, limit, cursor, skip)
         
         for cred in credentials:
             cred["_id"] = str(cred["_id"])
         
-        return credentials
+        return credentials, next_cursor
     
     async def update_credential(self, credential_id: str, update_data: dict) -> dict:
         """Update credential"""
@@ -65,28 +80,59 @@ class CredentialService:
             raise HTTPException(status_code=400, detail="No update data provided")
         
         update_data["updated_at"] = datetime.utcnow().isoformat()
+        if "platform" in update_data:
+            update_data["platform_key"] = platform_key(update_data["platform"])
         
         try:
-            result = await self.db.credentials.update_one(
-                {"_id": ObjectId(credential_id)},
-                {"$set": update_data}
-            )
+            credential_oid = ObjectId(credential_id)
         except:
             raise HTTPException(status_code=400, detail="Invalid credential ID")
         
-        if result.matched_count == 0:
+        update = {"$set": update_data}
+        if "password" in update_data:
+            # A new password completes the rotation of a recycled credential
+            update["$unset"] = {"rotation_required": ""}
+        
+        try:
+            before = await self.db.credentials.find_one_and_update(
+                {"_id": credential_oid},
+                update,
+                projection={"platform_key": 1, "is_active": 1, "used_by": 1, "rotation_required": 1}
+            )
+        except DuplicateKeyError:
+            raise HTTPException(status_code=409, detail="Credential already exists for this platform")
+        if not before:
             raise HTTPException(status_code=404, detail="Credential not found")
         
+        after = {**before, **update_data}
+        if before.get("rotation_required") and "password" in update_data and "is_active" not in update_data:
+            await self.db.credentials.update_one({"_id": credential_oid}, {"$set": {"is_active": True}})
+            after["is_active"] = True
+        
+        # Keep availability counters in step with is_active / platform changes
+        deltas = {}
+        if is_available(before):
+            deltas[before.get("platform_key")] = -1
+        if is_available(after):
+            deltas[after.get("platform_key")] = deltas.get(after.get("platform_key"), 0) + 1
+        await adjust_available(self.db, deltas)
+        
         return await self.get_credential_by_id(credential_id)
     
     async def delete_credential(self, credential_id: str) -> dict:
         """Delete credential"""
         try:
-            result = await self.db.credentials.delete_one({"_id": ObjectId(credential_id)})
+            deleted = await self.db.credentials.find_one_and_delete(
+                {"_id": ObjectId(credential_id)},
+                projection={"platform_key": 1, "is_active": 1, "used_by": 1}
+            )
         except:
             raise HTTPException(status_code=400, detail="Invalid credential ID")
         
-        if result.deleted_count == 0:
+        if not deleted:
             raise HTTPException(status_code=404, detail="Credential not found")
         
+        if is_available(deleted):
+            await adjust_available(self.db, {deleted.get("platform_key"): -1})
+        
         return {"message": "Credential deleted successfully"}
@@ -0,0 +1,192 @@
+"""
+Credential file uploads
+
+An admin upload is streamed to ``UPLOAD_DIR`` in chunks (bounded by
+``MAX_FILE_SIZE``) and recorded in ``credential_imports``; the import itself
+runs in a background task through ``CredentialImporter``, which writes its
+progress (rows done / failed, byte offset) to that record after every
+chunk so the admin panel can poll it. A failed or stalled import can be
+resumed from its last offset as long as the file is still on disk.
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi import HTTPException, UploadFile
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from core.config import settings
+from core.pagination import paginate
+from .importer import CredentialImporter
+
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# A running import that hasn't reported progress for this long is considered dead
+STALLED_AFTER = timedelta(minutes=10)
+
+
+async def save_upload(file: UploadFile) -> tuple:
+    """
+    Copy an upload to UPLOAD_DIR chunk by chunk
+    Returns (path, size); raises 413 (and removes the partial file) past MAX_FILE_SIZE
+    """
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(settings.UPLOAD_DIR, f"credentials_{uuid.uuid4().hex}.txt")
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.MAX_FILE_SIZE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File too large (max {settings.MAX_FILE_SIZE} bytes)"
+                    )
+                out.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    finally:
+        await file.close()
+
+    if size == 0:
+        os.remove(path)
+        raise HTTPException(status_code=400, detail="Uploaded file is empty")
+    return path, size
+
+
+def import_out(record: dict) -> dict:
+    """Public representation of an import record"""
+    size = record.get("size") or 0
+    stats = record.get("stats", {})
+    offset = stats.get("offset", 0)
+    return {
+        "id": str(record["_id"]),
+        "filename": record.get("filename"),
+        "size": size,
+        "status": record["status"],
+        "progress_percent": round(offset / size * 100, 1) if size else 0.0,
+        "rows_done": stats.get("lines", 0),
+        "rows_failed": stats.get("invalid", 0) + stats.get("failed", 0),
+        "inserted": stats.get("inserted", 0),
+        "duplicates": stats.get("duplicates", 0),
+        "lines_per_sec": stats.get("lines_per_sec", 0.0),
+        "errors": stats.get("errors", []),
+        "error": record.get("error"),
+        "created_by": record.get("created_by"),
+        "created_at": record["created_at"],
+        "updated_at": record.get("updated_at"),
+        "finished_at": record.get("finished_at")
+    }
+
+
+class CredentialImportService:
+    """Uploaded credential files and their background imports"""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+
+    async def create_import(self, filename: str, path: str, size: int, admin_id: str) -> dict:
+        """Record an uploaded file as a queued import"""
+        now = datetime.utcnow().isoformat()
+        record = {
+            "filename": filename,
+            "path": path,
+            "size": size,
+            "status": "queued",
+            "stats": {"offset": 0},
+            "created_by": admin_id,
+            "created_at": now,
+            "updated_at": now
+        }
+        result = await self.db.credential_imports.insert_one(record)
+        record["_id"] = result.inserted_id
+        return record
+
+    async def get_import(self, import_id: str) -> dict:
+        """Get an import record"""
+        if not ObjectId.is_valid(import_id):
+            raise HTTPException(status_code=400, detail="Invalid import ID")
+        record = await self.db.credential_imports.find_one({"_id": ObjectId(import_id)})
+        if not record:
+            raise HTTPException(status_code=404, detail="Import not found")
+        return record
+
+    async def list_imports(self, limit: int = 20, cursor: str = None) -> tuple:
+        """Recent imports, returns (records, next_cursor)"""
+        return await paginate(
+            self.db.credential_imports, {}, limit, cursor,
+            projection={"stats.errors": 0}
+        )
+
+    async def resume_import(self, import_id: str) -> dict:
+        """Requeue a failed or stalled import so it continues from its last offset"""
+        record = await self.get_import(import_id)
+        if not os.path.isfile(record["path"]):
+            raise HTTPException(status_code=410, detail="Uploaded file is no longer available")
+
+        stalled_before = (datetime.utcnow() - STALLED_AFTER).isoformat()
+        record = await self.db.credential_imports.find_one_and_update(
+            {"_id": record["_id"], "$or": [
+                {"status": "failed"},
+                {"status": "running", "updated_at": {"$lt": stalled_before}}
+            ]},
+            {"$set": {"status": "queued", "error": None, "updated_at": datetime.utcnow().isoformat()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not record:
+            raise HTTPException(status_code=409, detail="Import is not failed or stalled")
+        return record
+
+    async def run_import(self, import_id: ObjectId):
+        """Process a queued import (background task)"""
+        record = await self.db.credential_imports.find_one_and_update(
+            {"_id": import_id, "status": "queued"},
+            {"$set": {"status": "running", "updated_at": datetime.utcnow().isoformat()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not record:
+            return
+
+        async def save_progress(stats: dict):
+            await self.db.credential_imports.update_one(
+                {"_id": import_id},
+                {"$set": {"stats": stats, "updated_at": datetime.utcnow().isoformat()}}
+            )
+
+        importer = CredentialImporter(
+            self.db,
+            chunk_size=settings.CREDENTIAL_IMPORT_CHUNK_SIZE,
+            on_progress=save_progress
+        )
+        # Resuming: continue the counts of the earlier run
+        previous = record.get("stats", {})
+        for field in ("lines", "inserted", "duplicates", "invalid", "failed", "errors"):
+            if field in previous:
+                importer.stats[field] = previous[field]
+        try:
+            stats = await importer.import_file(record["path"], start_offset=previous.get("offset", 0))
+        except Exception as e:
+            print(f"Credential import {import_id} failed at offset {importer.stats['offset']}: {e}")
+            await self.db.credential_imports.update_one(
+                {"_id": import_id},
+                {"$set": {"status": "failed", "error": str(e), "updated_at": datetime.utcnow().isoformat()}}
+            )
+            return
+
+        now = datetime.utcnow().isoformat()
+        await self.db.credential_imports.update_one(
+            {"_id": import_id},
+            {"$set": {"status": "completed", "stats": stats, "updated_at": now, "finished_at": now}}
+        )
+        try:
+            os.remove(record["path"])
+        except OSError:
+            pass
+        print(
+            f"Credential import {import_id}: {stats['inserted']} inserted, "
+            f"{stats['duplicates']} duplicates, {stats['invalid']} invalid"
+        )
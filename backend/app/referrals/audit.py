@@ -0,0 +1,29 @@
+"""
+Referral commission audit trail
+
+Commission records are written to ``referral_commissions`` through a
+``BatchWriter``, so a record can sit in some worker's buffer for up to
+``AUDIT_FLUSH_SECONDS`` after the referrer's balance and the rollup were
+incremented. Recomputes from the audit trail flush the local buffer first
+and only overwrite counters whose last commission is older than
+``AUDIT_SETTLE_SECONDS``; newer ones are left for the next run.
+"""
+from datetime import datetime, timedelta
+from core.config import settings
+from core.batch_writer import BatchWriter
+
+
+# Comfortably longer than a flush interval on every worker
+AUDIT_SETTLE_SECONDS = max(5.0, settings.AUDIT_FLUSH_SECONDS * 10)
+
+# Commission audit records are written in batches off the top-up path
+commission_audit_writer = BatchWriter(
+    "referral_commissions",
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_seconds=settings.AUDIT_FLUSH_SECONDS
+)
+
+
+def audits_settled_before() -> str:
+    """ISO cutoff: commissions credited before it have their audit record written"""
+    return (datetime.utcnow() - timedelta(seconds=AUDIT_SETTLE_SECONDS)).isoformat()
@@ -0,0 +1,34 @@
+"""
+Referral indexes
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+
+INDEXES = {
+    "users": [
+        # Referral code lookup at registration / apply
+        IndexModel(
+            [("referral_code", ASCENDING)],
+            name="referral_code_unique",
+            unique=True,
+            partialFilterExpression={"referral_code": {"$type": "string"}}
+        ),
+        # Referral dashboard (users referred by me, newest first)
+        IndexModel([("referred_by", ASCENDING), ("_id", DESCENDING)], name="referred_by_id"),
+    ],
+    "referral_commissions": [
+        IndexModel([("referrer_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="referrer_id_created_at_id"),
+        IndexModel([("referred_user_id", ASCENDING)], name="referred_user_id"),
+        # Per-referral earnings on a dashboard page
+        IndexModel([("referrer_id", ASCENDING), ("referred_user_id", ASCENDING)], name="referrer_id_referred_user_id"),
+        # Admin commission list
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+    ],
+    "withdrawal_requests": [
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING)], name="user_id_status"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="status_created_at_id"),
+    ],
+    "system_settings": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+    ],
+}
@@ -1,7 +1,8 @@
 """
 Referral API routes - User endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from core.database import get_database
 from core.security import get_current_user
 from .service import ReferralService
@@ -36,12 +37,14 @@ async def apply_referral_code(
 
 @router.get("/dashboard", summary="Get referral dashboard")
 async def get_referral_dashboard(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page of referrals"),
+    limit: int = Query(50, ge=1, le=200),
     current_user: dict = Depends(get_current_user),
     db = Depends(get_database)
 ):
-    """Get user's referral statistics and earnings"""
+    """Get user's referral statistics and earnings (referrals list is paginated)"""
     service = ReferralService(db)
-    data = await service.get_referral_dashboard(current_user["_id"])
+    data = await service.get_referral_dashboard(current_user["_id"], limit, cursor)
     return data
 
 
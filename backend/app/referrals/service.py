@@ -4,11 +4,21 @@ Referral service - Core business logic
 import secrets
 import string
 from datetime import datetime
+from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+from core.loaders import UserLoader
+from core.pagination import paginate
+from core.system_settings import system_settings
+from .audit import commission_audit_writer, audits_settled_before
+from .stats import bump_referral_stats, recompute_referral_stats, ROLLUP_ID
 
 
+# system_settings key the admin panel writes the commission rate to
+COMMISSION_RATE_SETTING = "referral_commission_rate"
+
 class ReferralService:
     """Referral management service"""
     
@@ -16,6 +26,9 @@ class ReferralService:
     COMMISSION_RATE = 0.10  # 10%
     MIN_WITHDRAWAL_AMOUNT = 100.0  # Minimum ₹100
     
+    # Fields shown for each referred user on the dashboard
+    REFERRAL_PROJECTION = {"name": 1, "email": 1, "phone": 1, "referral_applied_at": 1, "created_at": 1}
+    
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
     
@@ -80,8 +93,8 @@ class ReferralService:
             )
         
         # Update user with referrer
-        await self.db.users.update_one(
-            {"_id": ObjectId(user_id)},
+        result = await self.db.users.update_one(
+            {"_id": ObjectId(user_id), "referred_by": None},
             {
                 "$set": {
                     "referred_by": referrer_id,
@@ -89,6 +102,12 @@ class ReferralService:
                 }
             }
         )
+        if result.modified_count == 0:
+            raise HTTPException(
+                status_code=400,
+                detail="You have already used a referral code"
+            )
+        await bump_referral_stats(self.db, total_referred_users=1)
         
         return {
             "message": "Referral code applied successfully",
@@ -96,6 +115,10 @@ class ReferralService:
             "referrer_code": referral_code
         }
     
+    async def get_commission_rate(self) -> float:
+        """Effective commission rate: admin-set system setting, else COMMISSION_RATE"""
+        return float(await system_settings.get(self.db, COMMISSION_RATE_SETTING, self.COMMISSION_RATE))
+    
     async def credit_referral_commission(
         self,
         referred_user_id: str,
@@ -105,49 +128,49 @@ class ReferralService:
         """
         Credit commission to referrer when referred user adds money
         CRITICAL: Only called for genuine wallet top-ups, NOT admin credits
+        
+        The referrer's balances and referral totals move in one $inc, so
+        concurrent top-ups by different referred users can't lose a credit.
         """
-        # Get referred user
-        referred_user = await self.db.users.find_one({"_id": ObjectId(referred_user_id)})
-        if not referred_user or not referred_user.get("referred_by"):
+        # Get referred user and mark them active (the before-image tells if this is their first commission)
+        referred_user = await self.db.users.find_one_and_update(
+            {"_id": ObjectId(referred_user_id), "referred_by": {"$ne": None}},
+            {"$set": {"referral_active": True}},
+            projection={"referred_by": 1, "name": 1, "email": 1, "referral_active": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if not referred_user:
             return {"message": "No referrer found", "commission_credited": False}
         
         referrer_id = referred_user["referred_by"]
+        commission_rate = await self.get_commission_rate()
+        commission_amount = topup_amount * commission_rate
         
-        # Calculate commission (10%)
-        commission_amount = topup_amount * self.COMMISSION_RATE
-        
-        # Get referrer's current balance
-        referrer = await self.db.users.find_one({"_id": ObjectId(referrer_id)})
-        if not referrer:
-            return {"message": "Referrer not found", "commission_credited": False}
-        
-        # Get current balances from referrer user document
-        current_wallet_balance = referrer.get("wallet_balance", 0.0)
-        current_withdrawable_balance = referrer.get("withdrawable_balance", 0.0)
-        
-        # Calculate new balances after commission
-        new_wallet_balance = current_wallet_balance + commission_amount
-        new_withdrawable_balance = current_withdrawable_balance + commission_amount
+        inc = {
+            "wallet_balance": commission_amount,
+            "withdrawable_balance": commission_amount,
+            "referral_totals.total_earnings": commission_amount
+        }
+        if not referred_user.get("referral_active"):
+            inc["referral_totals.active_referrals"] = 1
         
-        # Atomic update to prevent race conditions
-        result = await self.db.users.update_one(
+        # Atomic credit, returns post-update balances
+        now = datetime.utcnow().isoformat()
+        referrer = await self.db.users.find_one_and_update(
             {"_id": ObjectId(referrer_id)},
             {
-                "$set": {
-                    "wallet_balance": new_wallet_balance,
-                    "withdrawable_balance": new_withdrawable_balance,
-                    "updated_at": datetime.utcnow().isoformat()
-                }
-            }
+                "$inc": inc,
+                "$set": {"updated_at": now, "referral_totals.last_credit_at": now}
+            },
+            projection={"withdrawable_balance": 1},
+            return_document=ReturnDocument.AFTER
         )
+        if not referrer:
+            return {"message": "Referrer not found", "commission_credited": False}
         
-        if result.modified_count == 0:
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to credit referral commission"
-            )
+        new_withdrawable_balance = referrer["withdrawable_balance"]
         
-        # Log commission in referral_commissions collection for audit trail
+        # Log commission in referral_commissions collection for audit trail (batched)
         commission_record = {
             "referrer_id": referrer_id,
             "referred_user_id": referred_user_id,
@@ -155,14 +178,15 @@ class ReferralService:
             "referred_user_email": referred_user.get("email", ""),
             "topup_amount": topup_amount,
             "commission_amount": commission_amount,
-            "commission_rate": self.COMMISSION_RATE,
+            "commission_rate": commission_rate,
             "transaction_id": transaction_id,
-            "balance_before": current_withdrawable_balance,
+            "balance_before": new_withdrawable_balance - commission_amount,
             "balance_after": new_withdrawable_balance,
             "created_at": datetime.utcnow().isoformat()
         }
         
-        await self.db.referral_commissions.insert_one(commission_record)
+        await commission_audit_writer.add(self.db, commission_record)
+        await bump_referral_stats(self.db, total_commissions_paid=commission_amount, commission_count=1)
         
         return {
             "message": "Commission credited successfully",
@@ -171,10 +195,87 @@ class ReferralService:
             "referrer_id": referrer_id
         }
     
-    async def get_referral_dashboard(self, user_id: str) -> dict:
-        """Get user's referral dashboard data"""
+    async def recompute_referral_totals(self, referrer_id: Optional[str] = None) -> int:
+        """
+        Rebuild referral_totals from referral_commissions
+        Used to backfill referrers on first dashboard load, or for all referrers
+        (referrer_id=None) when totals look off. Returns referrers updated.
+        
+        Totals incremented on a referrer that was never backfilled only cover
+        commissions since the rollout, so they aren't trusted until "backfilled".
+        A referrer credited within AUDIT_SETTLE_SECONDS may have audit records
+        still buffered on some worker, so they are skipped (and stay
+        un-backfilled until a later run).
+        """
+        await commission_audit_writer.flush()
+        settled = {"$or": [
+            {"referral_totals.last_credit_at": {"$exists": False}},
+            {"referral_totals.last_credit_at": {"$lt": audits_settled_before()}}
+        ]}
+        
+        match = {"referrer_id": referrer_id} if referrer_id else {}
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": "$referrer_id",
+                "total_earnings": {"$sum": "$commission_amount"},
+                "referred_users": {"$addToSet": "$referred_user_id"}
+            }}
+        ]
+        
+        updated = 0
+        seen = False
+        async for row in self.db.referral_commissions.aggregate(pipeline):
+            seen = True
+            referred_ids = [ObjectId(uid) for uid in row["referred_users"] if ObjectId.is_valid(uid)]
+            # Flag existing earners so their next commission doesn't count them again
+            if referred_ids:
+                await self.db.users.update_many(
+                    {"_id": {"$in": referred_ids}},
+                    {"$set": {"referral_active": True}}
+                )
+            result = await self.db.users.update_one(
+                {"_id": ObjectId(row["_id"]), **settled},
+                {"$set": {
+                    "referral_totals.total_earnings": row["total_earnings"],
+                    "referral_totals.active_referrals": len(row["referred_users"]),
+                    "referral_totals.backfilled": True
+                }}
+            )
+            updated += result.matched_count
+        
+        # A referrer with no commissions still gets (zero) totals
+        if referrer_id and not seen:
+            result = await self.db.users.update_one(
+                {"_id": ObjectId(referrer_id), **settled},
+                {"$set": {
+                    "referral_totals.total_earnings": 0.0,
+                    "referral_totals.active_referrals": 0,
+                    "referral_totals.backfilled": True
+                }}
+            )
+            updated = result.matched_count
+        
+        return updated
+    
+    async def get_referral_dashboard(
+        self,
+        user_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> dict:
+        """
+        Get user's referral dashboard data
+        
+        Totals come from the referrer's denormalized referral_totals; the
+        referral list is paginated (newest first) and each page's earnings
+        come from one $group over that page's commissions.
+        """
         # Get user
-        user = await self.db.users.find_one({"_id": ObjectId(user_id)})
+        user = await self.db.users.find_one(
+            {"_id": ObjectId(user_id)},
+            {"referral_code": 1, "withdrawable_balance": 1, "referral_totals": 1}
+        )
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -183,56 +284,70 @@ class ReferralService:
             # Generate code if not exists
             referral_code = await self.create_referral_code(user_id)
         
-        # Get all referrals
-        referrals_cursor = self.db.users.find({"referred_by": user_id})
-        referrals = await referrals_cursor.to_list(length=1000)
-        
-        # Get commission history
-        commissions_cursor = self.db.referral_commissions.find({"referrer_id": user_id})
-        commissions = await commissions_cursor.to_list(length=1000)
-        
-        # Calculate stats
-        total_referrals = len(referrals)
-        total_earnings = sum(c["commission_amount"] for c in commissions)
-        withdrawable_balance = user.get("withdrawable_balance", 0.0)
+        totals = user.get("referral_totals")
+        if not totals or not totals.get("backfilled"):
+            # First load since totals were introduced
+            await self.recompute_referral_totals(user_id)
+            refreshed = await self.db.users.find_one({"_id": ObjectId(user_id)}, {"referral_totals": 1})
+            totals = refreshed.get("referral_totals", {})
+        
+        total_referrals = await self.db.users.count_documents({"referred_by": user_id})
+        
+        # One page of referred users
+        referrals, next_cursor = await paginate(
+            self.db.users,
+            {"referred_by": user_id},
+            limit,
+            cursor,
+            sort_field="_id",
+            projection=self.REFERRAL_PROJECTION
+        )
         
-        # Get active referrals (those who added money at least once)
-        active_referral_ids = set(c["referred_user_id"] for c in commissions)
-        active_referrals = len(active_referral_ids)
+        # Earnings per referred user on this page
+        page_ids = [str(referral["_id"]) for referral in referrals]
+        earnings = {}
+        if page_ids:
+            pipeline = [
+                {"$match": {"referrer_id": user_id, "referred_user_id": {"$in": page_ids}}},
+                {"$group": {
+                    "_id": "$referred_user_id",
+                    "total_amount_added": {"$sum": "$topup_amount"},
+                    "total_commission_earned": {"$sum": "$commission_amount"}
+                }}
+            ]
+            async for row in self.db.referral_commissions.aggregate(pipeline):
+                earnings[row["_id"]] = row
         
-        # Build referral list with stats
         referral_list = []
         for referral in referrals:
             referral_id = str(referral["_id"])
-            
-            # Get commissions from this referral
-            referral_commissions = [c for c in commissions if c["referred_user_id"] == referral_id]
-            total_commission_from_referral = sum(c["commission_amount"] for c in referral_commissions)
-            total_added_by_referral = sum(c["topup_amount"] for c in referral_commissions)
-            
+            referral_earnings = earnings.get(referral_id, {})
             referral_list.append({
                 "user_id": referral_id,
                 "name": referral.get("name", "Unknown"),
                 "email": referral.get("email", ""),
                 "phone": referral.get("phone", ""),
                 "joined_at": referral.get("referral_applied_at", referral.get("created_at")),
-                "total_amount_added": total_added_by_referral,
-                "total_commission_earned": total_commission_from_referral,
-                "is_active": referral_id in active_referral_ids
+                "total_amount_added": referral_earnings.get("total_amount_added", 0.0),
+                "total_commission_earned": referral_earnings.get("total_commission_earned", 0.0),
+                "is_active": referral_id in earnings
             })
         
-        # Sort by commission earned (highest first)
-        referral_list.sort(key=lambda x: x["total_commission_earned"], reverse=True)
+        recent_commissions = await self.db.referral_commissions.find(
+            {"referrer_id": user_id},
+            {"referred_user_name": 1, "topup_amount": 1, "commission_amount": 1, "created_at": 1}
+        ).sort([("created_at", -1), ("_id", -1)]).limit(10).to_list(length=10)
         
         return {
             "referral_code": referral_code,
             "total_referrals": total_referrals,
-            "active_referrals": active_referrals,
-            "total_earnings": total_earnings,
-            "withdrawable_balance": withdrawable_balance,
-            "commission_rate": self.COMMISSION_RATE * 100,  # 10%
+            "active_referrals": totals.get("active_referrals", 0),
+            "total_earnings": totals.get("total_earnings", 0.0),
+            "withdrawable_balance": user.get("withdrawable_balance", 0.0),
+            "commission_rate": await self.get_commission_rate() * 100,
             "min_withdrawal_amount": self.MIN_WITHDRAWAL_AMOUNT,
             "referrals": referral_list,
+            "next_cursor": next_cursor,
             "recent_commissions": [
                 {
                     "id": str(c["_id"]),
@@ -241,7 +356,7 @@ class ReferralService:
                     "commission_amount": c["commission_amount"],
                     "created_at": c["created_at"]
                 }
-                for c in sorted(commissions, key=lambda x: x["created_at"], reverse=True)[:10]
+                for c in recent_commissions
             ]
         }
     
@@ -301,6 +416,7 @@ class ReferralService:
         
         result = await self.db.withdrawal_requests.insert_one(withdrawal_request)
         withdrawal_request["_id"] = str(result.inserted_id)
+        await bump_referral_stats(self.db, pending_withdrawals_count=1, pending_withdrawals_amount=amount)
         
         return {
             "message": "Withdrawal request submitted successfully",
@@ -317,16 +433,24 @@ class ReferralService:
         status: str,
         admin_notes: str = None
     ) -> dict:
-        """Admin: Approve or reject withdrawal request"""
-        # Get withdrawal request
-        withdrawal = await self.db.withdrawal_requests.find_one({"_id": ObjectId(withdrawal_id)})
+        """
+        Admin: Approve or reject withdrawal request
+        The request is claimed (pending -> processing) before the wallet is
+        debited, so concurrent approvals can't debit it twice
+        """
+        # Claim the request
+        withdrawal = await self.db.withdrawal_requests.find_one_and_update(
+            {"_id": ObjectId(withdrawal_id), "status": "pending"},
+            {"$set": {"status": "processing", "processed_by": admin_id}},
+            return_document=ReturnDocument.AFTER
+        )
         if not withdrawal:
-            raise HTTPException(status_code=404, detail="Withdrawal request not found")
-        
-        if withdrawal["status"] != "pending":
+            existing = await self.db.withdrawal_requests.find_one({"_id": ObjectId(withdrawal_id)}, {"status": 1})
+            if not existing:
+                raise HTTPException(status_code=404, detail="Withdrawal request not found")
             raise HTTPException(
-                status_code=400,
-                detail=f"Withdrawal already {withdrawal['status']}"
+                status_code=409,
+                detail=f"Withdrawal already {existing['status']}"
             )
         
         user_id = withdrawal["user_id"]
@@ -351,8 +475,13 @@ class ReferralService:
             )
             
             if not updated_user:
+                # Nothing was debited: hand the request back
+                await self.db.withdrawal_requests.update_one(
+                    {"_id": withdrawal["_id"], "status": "processing"},
+                    {"$set": {"status": "pending"}, "$unset": {"processed_by": ""}}
+                )
                 # Either user not found or insufficient balance
-                user = await self.db.users.find_one({"_id": ObjectId(user_id)})
+                user = await self.db.users.find_one({"_id": ObjectId(user_id)}, {"_id": 1})
                 if not user:
                     raise HTTPException(status_code=404, detail="User not found")
                 raise HTTPException(
@@ -392,9 +521,9 @@ class ReferralService:
             }
             await self.db.referral_transactions.insert_one(withdrawal_transaction)
         
-        # Update withdrawal request
-        await self.db.withdrawal_requests.update_one(
-            {"_id": ObjectId(withdrawal_id)},
+        # Complete the claimed request
+        result = await self.db.withdrawal_requests.update_one(
+            {"_id": withdrawal["_id"], "status": "processing"},
             {
                 "$set": {
                     "status": status,
@@ -404,6 +533,11 @@ class ReferralService:
                 }
             }
         )
+        if result.modified_count:
+            increments = {"pending_withdrawals_count": -1, "pending_withdrawals_amount": -amount}
+            if status == "approved":
+                increments["total_withdrawn"] = amount
+            await bump_referral_stats(self.db, **increments)
         
         return {
             "message": f"Withdrawal {status} successfully",
@@ -413,43 +547,29 @@ class ReferralService:
         }
     
     async def get_admin_referral_stats(self) -> dict:
-        """Admin: Get overall referral system statistics"""
-        # Total users with referrals
-        users_with_referrals = await self.db.users.count_documents({"referred_by": {"$exists": True, "$ne": None}})
-        
-        # Total commissions paid
-        commissions_cursor = self.db.referral_commissions.find({})
-        commissions = await commissions_cursor.to_list(length=None)
-        total_commissions_paid = sum(c["commission_amount"] for c in commissions)
-        
-        # Pending withdrawals
-        pending_withdrawals_cursor = self.db.withdrawal_requests.find({"status": "pending"})
-        pending_withdrawals = await pending_withdrawals_cursor.to_list(length=100)
-        pending_withdrawal_amount = sum(w["amount"] for w in pending_withdrawals)
-        
-        # Top referrers
-        pipeline = [
-            {"$group": {
-                "_id": "$referrer_id",
-                "total_commission": {"$sum": "$commission_amount"},
-                "total_referrals": {"$sum": 1}
-            }},
-            {"$sort": {"total_commission": -1}},
-            {"$limit": 10}
-        ]
-        top_referrers = await self.db.referral_commissions.aggregate(pipeline).to_list(length=10)
-        
-        # Enrich with user data
+        """Admin: Get overall referral system statistics (from the referral_stats rollup)"""
+        stats = await self.db.referral_stats.find_one({"_id": ROLLUP_ID})
+        if not stats or "reconciled_at" not in stats:
+            # First call since the rollup was introduced
+            await recompute_referral_stats(self.db)
+            stats = await self.db.referral_stats.find_one({"_id": ROLLUP_ID})
+        
+        # Enrich top referrers with user data in one query
+        top_referrers = stats.get("top_referrers", [])
+        users_by_id = await UserLoader(self.db, fields=("name", "email")).load_many(
+            r["_id"] for r in top_referrers
+        )
         for referrer in top_referrers:
-            user = await self.db.users.find_one({"_id": ObjectId(referrer["_id"])})
-            referrer["user_name"] = user.get("name", "Unknown") if user else "Unknown"
-            referrer["user_email"] = user.get("email", "") if user else ""
+            user = users_by_id.get(str(referrer["_id"])) or {}
+            referrer["user_name"] = user.get("name", "Unknown")
+            referrer["user_email"] = user.get("email", "")
         
         return {
-            "total_referred_users": users_with_referrals,
-            "total_commissions_paid": total_commissions_paid,
-            "pending_withdrawals_count": len(pending_withdrawals),
-            "pending_withdrawals_amount": pending_withdrawal_amount,
-            "commission_rate": self.COMMISSION_RATE * 100,
-            "top_referrers": top_referrers
+            "total_referred_users": stats.get("total_referred_users", 0),
+            "total_commissions_paid": stats.get("total_commissions_paid", 0.0),
+            "pending_withdrawals_count": stats.get("pending_withdrawals_count", 0),
+            "pending_withdrawals_amount": stats.get("pending_withdrawals_amount", 0.0),
+            "commission_rate": await self.get_commission_rate() * 100,
+            "top_referrers": top_referrers,
+            "top_referrers_updated_at": stats.get("reconciled_at")
         }
@@ -0,0 +1,136 @@
+"""
+Referral system rollup
+
+``/admin/referrals/stats`` reads a single ``referral_stats`` document kept up
+to date with ``$inc`` wherever a referral is applied, a commission credited
+or a withdrawal requested / processed. A scheduled job periodically
+recomputes the rollup from source collections, reports drift and refreshes
+the top referrers list.
+
+Commission audit records are written in batches (see ``audit``), so the
+commission counters are only overwritten when no commission was credited
+within AUDIT_SETTLE_SECONDS; otherwise they are left as they are until the
+next run.
+"""
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from .audit import commission_audit_writer, audits_settled_before
+
+
+ROLLUP_ID = "global"
+TOP_REFERRERS_LIMIT = 10
+
+# Counters are compared with a tolerance (amounts are floats)
+DRIFT_TOLERANCE = 0.01
+
+# Counters derived from the (batched) commission audit trail
+COMMISSION_FIELDS = ("total_commissions_paid", "commission_count")
+
+
+async def bump_referral_stats(db: AsyncIOMotorDatabase, **increments):
+    """$inc rollup counters, e.g. bump_referral_stats(db, commission_count=1)"""
+    now = datetime.utcnow().isoformat()
+    touched = {"updated_at": now}
+    if "commission_count" in increments:
+        touched["last_commission_at"] = now
+    try:
+        await db.referral_stats.update_one(
+            {"_id": ROLLUP_ID},
+            {"$inc": increments, "$set": touched},
+            upsert=True
+        )
+    except Exception as e:
+        # The reconciliation job repairs missed increments
+        print(f"Failed to update referral stats rollup: {e}")
+
+
+async def _sum_group(collection, match: dict, field: str) -> dict:
+    """{count, total} of `field` over documents matching `match`"""
+    rows = await collection.aggregate([
+        {"$match": match},
+        {"$group": {"_id": None, "count": {"$sum": 1}, "total": {"$sum": f"${field}"}}}
+    ]).to_list(length=1)
+    return rows[0] if rows else {"count": 0, "total": 0.0}
+
+
+async def recompute_referral_stats(db: AsyncIOMotorDatabase) -> dict:
+    """
+    Recompute the rollup from source collections and store it
+    Returns {"drift": {field: (rollup value, actual value)}} for counters that
+    were off, and "deferred": commission counters skipped because a
+    commission was credited too recently
+    """
+    await commission_audit_writer.flush()
+    settled_before = audits_settled_before()
+    current = await db.referral_stats.find_one({"_id": ROLLUP_ID}) or {}
+
+    commissions = await _sum_group(db.referral_commissions, {}, "commission_amount")
+    pending = await _sum_group(db.withdrawal_requests, {"status": "pending"}, "amount")
+    withdrawn = await _sum_group(db.withdrawal_requests, {"status": "approved"}, "amount")
+
+    actual = {
+        "total_referred_users": await db.users.count_documents({"referred_by": {"$exists": True, "$ne": None}}),
+        "pending_withdrawals_count": pending["count"],
+        "pending_withdrawals_amount": pending["total"],
+        "total_withdrawn": withdrawn["total"],
+    }
+    commission_actual = {
+        "total_commissions_paid": commissions["total"],
+        "commission_count": commissions["count"],
+    }
+
+    top_referrers = await db.referral_commissions.aggregate([
+        {"$group": {
+            "_id": "$referrer_id",
+            "total_commission": {"$sum": "$commission_amount"},
+            "total_referrals": {"$sum": 1}
+        }},
+        {"$sort": {"total_commission": -1}},
+        {"$limit": TOP_REFERRERS_LIMIT}
+    ]).to_list(length=TOP_REFERRERS_LIMIT)
+
+    # Only overwrite commission counters if no commission came in since `current`
+    # was read and the last one is old enough for its audit record to be written
+    last_commission_at = current.get("last_commission_at")
+    deferred = []
+    if last_commission_at is not None and last_commission_at >= settled_before:
+        deferred = list(COMMISSION_FIELDS)
+    else:
+        result = await db.referral_stats.update_one(
+            {"_id": ROLLUP_ID, "last_commission_at": last_commission_at},
+            {"$set": commission_actual}
+        )
+        if result.matched_count or not current:
+            actual.update(commission_actual)
+        else:
+            deferred = list(COMMISSION_FIELDS)
+
+    drift = {
+        field: (current.get(field, 0), value)
+        for field, value in actual.items()
+        if abs(current.get(field, 0) - value) > DRIFT_TOLERANCE
+    }
+
+    now = datetime.utcnow().isoformat()
+    await db.referral_stats.update_one(
+        {"_id": ROLLUP_ID},
+        {"$set": {
+            **actual,
+            "top_referrers": top_referrers,
+            "reconciled_at": now,
+            "last_drift": {field: list(values) for field, values in drift.items()},
+            "updated_at": now
+        }},
+        upsert=True
+    )
+    if deferred:
+        print(f"Referral stats: {', '.join(deferred)} not reconciled, commission credited since {settled_before}")
+    return {"drift": drift, "deferred": deferred}
+
+
+async def reconcile_referral_stats_job(db: AsyncIOMotorDatabase) -> dict:
+    """Scheduled reconciliation of the rollup"""
+    result = await recompute_referral_stats(db)
+    if result["drift"]:
+        print(f"Referral stats drift corrected: {result['drift']}")
+    return {"drift_fields": sorted(result["drift"]), "deferred_fields": result["deferred"]}
@@ -0,0 +1,17 @@
+"""
+YouTube request indexes
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+
+INDEXES = {
+    "youtube_requests": [
+        # My requests / request by subscription
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_id_created_at_id"),
+        IndexModel([("subscription_id", ASCENDING), ("user_id", ASCENDING)], name="subscription_id_user_id"),
+        # Admin list filtered by status
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="status_created_at_id"),
+        # Admin list, all statuses
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+    ]
+}
@@ -5,6 +5,7 @@ from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from fastapi import HTTPException
+from core.pagination import paginate
 
 
 class YouTubeRequestService:
@@ -62,19 +63,18 @@ class YouTubeRequestService:
         request["_id"] = str(request["_id"])
         return request
     
-    async def list_requests(self, skip: int = 0, limit: int = 100, status: str = None) -> list:
-        """List all YouTube requests (admin)"""
+    async def list_requests(self, skip: int = 0, limit: int = 100, status: str = None, cursor: str = None) -> tuple:
+        """List all YouTube requests (admin), returns (requests, next_cursor)"""
         query = {}
         if status:
             query["status"] = status
         
-        cursor = self.db.youtube_requests.find(query).sort("created_at", -1).skip(skip).limit(limit)
-        requests = await cursor.to_list(length=limit)
+        requests, next_cursor = await paginate(self.db.youtube_requests, query, limit, cursor, skip)
         
         for req in requests:
             req["_id"] = str(req["_id"])
         
-        return requests
+        return requests, next_cursor
     
     async def update_request_status(self, request_id: str, status: str, notes: str = None) -> dict:
         """Update request status (admin only)"""
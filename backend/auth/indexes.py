@@ -0,0 +1,24 @@
+"""
+Authentication indexes (users collection)
+"""
+from pymongo import ASCENDING, IndexModel
+
+
+INDEXES = {
+    "users": [
+        # Login and registration duplicate checks
+        IndexModel(
+            [("email", ASCENDING)],
+            name="email_unique",
+            unique=True,
+            partialFilterExpression={"email": {"$type": "string"}}
+        ),
+        # Phone login / OTP lookups (phone-only users have no email)
+        IndexModel(
+            [("phone", ASCENDING)],
+            name="phone_unique",
+            unique=True,
+            partialFilterExpression={"phone": {"$type": "string"}}
+        ),
+    ]
+}
@@ -2,6 +2,7 @@
 Authentication API routes
 """
 from fastapi import APIRouter, Depends, HTTPException
+from bson import ObjectId
 from core.database import get_database
 from core.security import get_current_user
 from auth.schemas import RegisterRequest, LoginRequest, AdminLoginRequest, UserLoginRequest, VerifyOTPRequest, TokenResponse, UserResponse
@@ -90,16 +91,18 @@ async def verify_otp(request: VerifyOTPRequest, db=Depends(get_database)):
 
 
 @router.get("/me", summary="Get current user profile")
-async def get_me(current_user: dict = Depends(get_current_user)):
+async def get_me(current_user: dict = Depends(get_current_user), db=Depends(get_database)):
     """
     Get authenticated user's profile
     
     Requires: Bearer token in Authorization header
     """
+    # Principal is cached without balances, read the live balance
+    user = await db.users.find_one({"_id": ObjectId(current_user["_id"])}, {"wallet_balance": 1})
     return {
         "id": current_user["_id"],
         "phone": current_user["phone"],
         "role": current_user["role"],
-        "wallet_balance": current_user.get("wallet_balance", 0.0),
+        "wallet_balance": user.get("wallet_balance", 0.0) if user else 0.0,
         "created_at": current_user.get("created_at")
     }
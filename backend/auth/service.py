@@ -5,7 +5,7 @@ from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from core.config import settings
-from core.security import create_access_token, get_password_hash, verify_password
+from core.security import create_access_token, hash_password_async, verify_password_async, password_needs_rehash
 from fastapi import HTTPException, status
 import secrets
 
@@ -16,6 +16,15 @@ class AuthService:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
     
+    async def _rehash_if_needed(self, user: dict, password: str) -> dict:
+        """
+        Re-hash a verified password when BCRYPT_ROUNDS changed
+        Returns fields to $set on the user (empty if hash is current)
+        """
+        if not password_needs_rehash(user.get("password", "")):
+            return {}
+        return {"password": await hash_password_async(password)}
+    
     async def register_user(self, name: str, email: str, phone: str, password: str, referral_code: str = None) -> dict:
         """
         Register a new user with email and password
@@ -41,7 +50,7 @@ class AuthService:
                 )
         
         # Hash password
-        hashed_password = get_password_hash(password)
+        hashed_password = await hash_password_async(password)
         
         # Validate referral code if provided
         referrer_id = None
@@ -77,8 +86,12 @@ class AuthService:
         result = await self.db.users.insert_one(new_user)
         user_id = str(result.inserted_id)
         
-        # Generate referral code for the new user
         from app.referrals.service import ReferralService
+        from app.referrals.stats import bump_referral_stats
+        if referrer_id:
+            await bump_referral_stats(self.db, total_referred_users=1)
+        
+        # Generate referral code for the new user
         referral_service = ReferralService(self.db)
         try:
             await referral_service.create_referral_code(user_id)
@@ -124,7 +137,7 @@ class AuthService:
             )
         
         # Verify password
-        if not verify_password(password, user.get("password", "")):
+        if not await verify_password_async(password, user.get("password", "")):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
@@ -150,9 +163,11 @@ class AuthService:
         refresh_token = secrets.token_urlsafe(32)
         
         # Store refresh token in database
+        login_update = {"refresh_token": refresh_token, "last_login": datetime.utcnow().isoformat()}
+        login_update.update(await self._rehash_if_needed(user, password))
         await self.db.users.update_one(
             {"_id": ObjectId(user_id)},
-            {"$set": {"refresh_token": refresh_token, "last_login": datetime.utcnow().isoformat()}}
+            {"$set": login_update}
         )
         
         return {
@@ -182,7 +197,7 @@ class AuthService:
             )
         
         # Verify password
-        if not verify_password(password, user.get("password", "")):
+        if not await verify_password_async(password, user.get("password", "")):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
@@ -201,9 +216,11 @@ class AuthService:
         refresh_token = secrets.token_urlsafe(32)
         
         # Store refresh token in database
+        login_update = {"refresh_token": refresh_token, "last_login": datetime.utcnow().isoformat()}
+        login_update.update(await self._rehash_if_needed(user, password))
         await self.db.users.update_one(
             {"_id": ObjectId(user_id)},
-            {"$set": {"refresh_token": refresh_token, "last_login": datetime.utcnow().isoformat()}}
+            {"$set": login_update}
         )
         
         return {
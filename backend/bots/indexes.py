@@ -0,0 +1,14 @@
+"""
+Telegram outbox indexes
+"""
+from pymongo import ASCENDING, IndexModel
+
+
+INDEXES = {
+    "telegram_outbox": [
+        # Dispatcher due-alert scan
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt_at"),
+        # Sent/failed alerts are purged after retention
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ]
+}
@@ -0,0 +1,211 @@
+"""
+Telegram alert outbox
+
+Request handlers only insert alerts into the ``telegram_outbox`` collection.
+A dispatcher task (one active worker, chosen by lease) delivers them in the
+background: batches due alerts, coalesces bursts into digest messages, stays
+under the per-chat rate limit and retries failures with backoff.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from telegram.error import RetryAfter
+from core.config import settings
+from core.leases import acquire_lease, release_lease
+from .telegram import telegram_service, TelegramBotService
+
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+
+LEASE_NAME = "telegram_outbox_dispatcher"
+
+
+async def enqueue_alerts(db: AsyncIOMotorDatabase, alerts: List[Tuple[str, dict]]):
+    """
+    Queue admin alerts for background delivery (single insert)
+
+    - **alerts**: list of (kind, payload), kind matches a TelegramBotService
+      format_<kind> method, e.g. ("new_order", {...})
+    """
+    now = datetime.utcnow()
+    docs = [
+        {
+            "kind": kind,
+            "payload": payload,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now.isoformat()
+        }
+        for kind, payload in alerts
+    ]
+    if docs:
+        await db.telegram_outbox.insert_many(docs, ordered=False)
+
+
+async def enqueue_alert(db: AsyncIOMotorDatabase, kind: str, payload: dict):
+    """Queue a single admin alert"""
+    await enqueue_alerts(db, [(kind, payload)])
+
+
+class TelegramOutboxDispatcher:
+    """Background task delivering queued Telegram alerts"""
+
+    def __init__(
+        self,
+        get_db: Callable[[], AsyncIOMotorDatabase],
+        bot_service: TelegramBotService = telegram_service
+    ):
+        self.get_db = get_db
+        self.bot_service = bot_service
+        self.batch_size = settings.TELEGRAM_OUTBOX_BATCH_SIZE
+        self.poll_seconds = settings.TELEGRAM_OUTBOX_POLL_SECONDS
+        self.digest_threshold = settings.TELEGRAM_DIGEST_THRESHOLD
+        self.max_attempts = settings.TELEGRAM_OUTBOX_MAX_ATTEMPTS
+        self.retention = timedelta(days=settings.TELEGRAM_OUTBOX_RETENTION_DAYS)
+        self.min_interval = 60.0 / settings.TELEGRAM_MAX_MESSAGES_PER_MINUTE
+        self._last_sent_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.alerts_sent = 0
+        self.messages_sent = 0
+        self.digests_sent = 0
+        self.failures = 0
+
+    def start(self):
+        """Start dispatcher loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop dispatcher loop and hand the lease over"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await release_lease(self.get_db(), LEASE_NAME)
+        except Exception as e:
+            print(f"Failed to release Telegram outbox lease: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                delivered = 0
+                if await acquire_lease(self.get_db(), LEASE_NAME, ttl_seconds=max(30, int(self.poll_seconds * 10))):
+                    delivered = await self.dispatch_once()
+                # Drain backlog without waiting; otherwise poll
+                if delivered < self.batch_size:
+                    await asyncio.sleep(self.poll_seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Telegram outbox dispatcher error: {e}")
+                await asyncio.sleep(self.poll_seconds)
+
+    async def _throttle(self):
+        """Keep at most TELEGRAM_MAX_MESSAGES_PER_MINUTE to the admin chat"""
+        wait = self._last_sent_at + self.min_interval - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._last_sent_at = time.monotonic()
+
+    def _build_messages(self, alerts: list) -> List[Tuple[str, list]]:
+        """
+        Turn alerts into (text, alert ids) messages
+        Bursts at or above the digest threshold are coalesced into digests
+        """
+        rendered = []
+        for alert in alerts:
+            try:
+                text = self.bot_service.render(alert["kind"], alert.get("payload", {}))
+            except ValueError as e:
+                text = f"⚠️ {e}"
+            rendered.append((text, alert["_id"]))
+
+        if len(rendered) < self.digest_threshold:
+            return [(text, [alert_id]) for text, alert_id in rendered]
+
+        messages = []
+        header = f"📦 <b>Digest: {len(rendered)} alerts</b>\n\n"
+        current, ids = header, []
+        for text, alert_id in rendered:
+            block = text[:MAX_MESSAGE_LENGTH - len(header) - 2] + "\n\n"
+            if ids and len(current) + len(block) > MAX_MESSAGE_LENGTH:
+                messages.append((current.strip(), ids))
+                current, ids = header, []
+            current += block
+            ids.append(alert_id)
+        if ids:
+            messages.append((current.strip(), ids))
+        return messages
+
+    async def dispatch_once(self) -> int:
+        """Deliver one batch of due alerts, returns number of alerts handled"""
+        db = self.get_db()
+        now = datetime.utcnow()
+        alerts = await db.telegram_outbox.find(
+            {"status": "pending", "next_attempt_at": {"$lte": now}}
+        ).sort("next_attempt_at", 1).limit(self.batch_size).to_list(length=self.batch_size)
+
+        if not alerts:
+            return 0
+
+        attempts_by_id = {a["_id"]: a.get("attempts", 0) for a in alerts}
+        messages = self._build_messages(alerts)
+
+        for text, ids in messages:
+            await self._throttle()
+            try:
+                await self.bot_service.deliver(text)
+            except RetryAfter as e:
+                # Rate limited by Telegram - leave pending and back off
+                print(f"Telegram rate limit hit, retrying after {e.retry_after}s")
+                await asyncio.sleep(float(e.retry_after))
+                return len(alerts)
+            except Exception as e:
+                self.failures += 1
+                await self._record_failure(db, ids, attempts_by_id, str(e))
+                continue
+
+            sent_at = datetime.utcnow()
+            await db.telegram_outbox.update_many(
+                {"_id": {"$in": ids}},
+                {"$set": {"status": "sent", "sent_at": sent_at, "expires_at": sent_at + self.retention}}
+            )
+            self.messages_sent += 1
+            self.alerts_sent += len(ids)
+            if len(ids) > 1:
+                self.digests_sent += 1
+
+        return len(alerts)
+
+    async def _record_failure(self, db: AsyncIOMotorDatabase, ids: list, attempts_by_id: dict, error: str):
+        """Schedule retry with exponential backoff or give up after max attempts"""
+        now = datetime.utcnow()
+        for alert_id in ids:
+            attempts = attempts_by_id.get(alert_id, 0) + 1
+            if attempts >= self.max_attempts:
+                update = {"status": "failed", "expires_at": now + self.retention}
+            else:
+                update = {"next_attempt_at": now + timedelta(seconds=min(600, 5 * 2 ** attempts))}
+            update.update({"attempts": attempts, "last_error": error[:500]})
+            await db.telegram_outbox.update_one({"_id": alert_id}, {"$set": update})
+
+    def stats(self) -> dict:
+        """Dispatcher counters"""
+        return {
+            "running": self._task is not None,
+            "alerts_sent": self.alerts_sent,
+            "messages_sent": self.messages_sent,
+            "digests_sent": self.digests_sent,
+            "failures": self.failures
+        }
@@ -19,6 +19,27 @@ class TelegramBotService:
         except Exception as e:
             print(f"Warning: Telegram bot initialization failed: {e}")
     
+    async def deliver(self, message: str):
+        """
+        Send message to admin via Telegram, raising on failure
+        Used by the outbox dispatcher so it can retry / honour RetryAfter
+        """
+        if not self.bot:
+            raise RuntimeError("Telegram bot not initialized")
+        
+        await self.bot.send_message(
+            chat_id=self.admin_chat_id,
+            text=message,
+            parse_mode="HTML"
+        )
+    
+    def render(self, kind: str, data: dict) -> str:
+        """Render an alert by kind (e.g. "new_order" -> format_new_order)"""
+        formatter = getattr(self, f"format_{kind}", None)
+        if formatter is None:
+            raise ValueError(f"Unknown Telegram alert kind: {kind}")
+        return formatter(data)
+    
     async def send_message(self, message: str) -> bool:
         """
         Send message to admin via Telegram
@@ -28,11 +49,7 @@ class TelegramBotService:
             return False
         
         try:
-            await self.bot.send_message(
-                chat_id=self.admin_chat_id,
-                text=message,
-                parse_mode="HTML"
-            )
+            await self.deliver(message)
             return True
         except TelegramError as e:
             print(f"Failed to send Telegram message: {e}")
@@ -41,8 +58,8 @@ class TelegramBotService:
             print(f"Unexpected error sending Telegram message: {e}")
             return False
     
-    async def notify_new_order(self, order_data: dict):
-        """Notify admin about new order"""
+    def format_new_order(self, order_data: dict) -> str:
+        """Build new order alert message"""
         message = f"""
 🛒 <b>New Order Received</b>
 
@@ -53,10 +70,14 @@ Amount: ₹{order_data.get('amount')}
 Status: {order_data.get('status')}
 Time: {order_data.get('created_at')}
 """
-        await self.send_message(message.strip())
+        return message.strip()
     
-    async def notify_payment_success(self, payment_data: dict):
-        """Notify admin about successful payment"""
+    async def notify_new_order(self, order_data: dict):
+        """Notify admin about new order"""
+        await self.send_message(self.format_new_order(order_data))
+    
+    def format_payment_success(self, payment_data: dict) -> str:
+        """Build successful payment alert message"""
         message = f"""
 💰 <b>Payment Successful</b>
 
@@ -66,10 +87,14 @@ Amount: ₹{payment_data.get('amount')}
 Payment ID: {payment_data.get('payment_id')}
 Time: {payment_data.get('paid_at')}
 """
-        await self.send_message(message.strip())
+        return message.strip()
     
-    async def notify_subscription_activated(self, subscription_data: dict):
-        """Notify admin about subscription activation"""
+    async def notify_payment_success(self, payment_data: dict):
+        """Notify admin about successful payment"""
+        await self.send_message(self.format_payment_success(payment_data))
+    
+    def format_subscription_activated(self, subscription_data: dict) -> str:
+        """Build subscription activation alert message"""
         message = f"""
 ✅ <b>Subscription Activated</b>
 
@@ -82,10 +107,14 @@ Valid Until: {subscription_data.get('end_date')}
 
 ⚠️ <i>Please assign credentials to the user.</i>
 """
-        await self.send_message(message.strip())
+        return message.strip()
     
-    async def notify_refund_issued(self, refund_data: dict):
-        """Notify admin about refund"""
+    async def notify_subscription_activated(self, subscription_data: dict):
+        """Notify admin about subscription activation"""
+        await self.send_message(self.format_subscription_activated(subscription_data))
+    
+    def format_refund_issued(self, refund_data: dict) -> str:
+        """Build refund alert message"""
         message = f"""
 🔄 <b>Refund Issued</b>
 
@@ -95,10 +124,14 @@ Amount: ₹{refund_data.get('amount')}
 Reason: {refund_data.get('reason', 'Not specified')}
 Time: {refund_data.get('refunded_at')}
 """
-        await self.send_message(message.strip())
+        return message.strip()
     
-    async def notify_wallet_recharge(self, wallet_data: dict):
-        """Notify admin about wallet recharge"""
+    async def notify_refund_issued(self, refund_data: dict):
+        """Notify admin about refund"""
+        await self.send_message(self.format_refund_issued(refund_data))
+    
+    def format_wallet_recharge(self, wallet_data: dict) -> str:
+        """Build wallet recharge alert message"""
         message = f"""
 💳 <b>Wallet Recharged</b>
 
@@ -108,10 +141,14 @@ New Balance: ₹{wallet_data.get('new_balance')}
 Payment ID: {wallet_data.get('payment_id')}
 Time: {wallet_data.get('created_at')}
 """
-        await self.send_message(message.strip())
+        return message.strip()
     
-    async def notify_low_stock(self, product_data: dict):
-        """Notify admin about low stock"""
+    async def notify_wallet_recharge(self, wallet_data: dict):
+        """Notify admin about wallet recharge"""
+        await self.send_message(self.format_wallet_recharge(wallet_data))
+    
+    def format_low_stock(self, product_data: dict) -> str:
+        """Build low stock alert message"""
         message = f"""
 ⚠️ <b>Low Stock Alert</b>
 
@@ -122,7 +159,27 @@ Price: ₹{product_data.get('price')}
 
 Please restock this product.
 """
-        await self.send_message(message.strip())
+        return message.strip()
+    
+    async def notify_low_stock(self, product_data: dict):
+        """Notify admin about low stock"""
+        await self.send_message(self.format_low_stock(product_data))
+    
+    def format_payment_needs_review(self, payment_data: dict) -> str:
+        """Build alert for a wallet payment the sweeper could not recover"""
+        message = f"""
+🚨 <b>Wallet Payment Needs Review</b>
+
+User ID: {payment_data.get('user_id')}
+Amount: ₹{payment_data.get('amount')}
+Order ID: {payment_data.get('razorpay_order_id')}
+Payment ID: {payment_data.get('razorpay_payment_id')}
+Attempts: {payment_data.get('attempts')}
+Error: {payment_data.get('error')}
+
+Check Razorpay and credit the wallet manually if needed.
+"""
+        return message.strip()
 
 
 # Global instance
@@ -1,88 +1,72 @@
 """
 Bulk import credentials from CSV/text format
-Usage: python bulk_import_credentials.py credentials.txt
+Usage: python bulk_import_credentials.py credentials.txt [--offset BYTES] [--chunk-size N]
 
 Format (one per line):
 Platform|Username|Password|Notes
 Netflix|user1@example.com|pass123|Premium account
 Prime|user2@example.com|pass456|Family plan
+
+The file is streamed in chunks; duplicates (same platform and username) and
+invalid lines are reported without stopping the import. If an import is
+interrupted, rerun it with the last printed offset to resume.
 """
+import argparse
 import asyncio
-import sys
+import os
 from motor.motor_asyncio import AsyncIOMotorClient
 from core.config import settings
-from datetime import datetime
+from app.credentials.importer import CredentialImporter
+
+
+async def print_progress(stats: dict):
+    print(
+        f"  {stats['lines']} lines | {stats['inserted']} inserted | "
+        f"{stats['duplicates']} duplicates | {stats['invalid']} invalid | "
+        f"{stats['lines_per_sec']} lines/sec | offset {stats['offset']}"
+    )
 
 
-async def bulk_import_credentials(file_path: str):
+async def bulk_import_credentials(file_path: str, offset: int = 0, chunk_size: int = None):
     """Import credentials from file"""
-    client = AsyncIOMotorClient(settings.MONGODB_URL)
-    db = client[settings.MONGODB_DB_NAME]
-    
-    print(f"📁 Reading credentials from {file_path}...")
-    
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-    except FileNotFoundError:
+    if not os.path.isfile(file_path):
         print(f"❌ File not found: {file_path}")
         return
-    
-    credentials_to_insert = []
-    skipped = 0
-    
-    for i, line in enumerate(lines, 1):
-        line = line.strip()
-        
-        # Skip empty lines and comments
-        if not line or line.startswith('#'):
-            continue
-        
-        # Parse line
-        parts = line.split('|')
-        if len(parts) < 3:
-            print(f"⚠️  Line {i}: Invalid format (need at least Platform|Username|Password)")
-            skipped += 1
-            continue
-        
-        platform = parts[0].strip()
-        username = parts[1].strip()
-        password = parts[2].strip()
-        notes = parts[3].strip() if len(parts) > 3 else None
-        
-        credential = {
-            "platform": platform,
-            "username": username,
-            "password": password,
-            "notes": notes,
-            "is_active": True,
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
-        }
-        
-        credentials_to_insert.append(credential)
-    
-    if credentials_to_insert:
-        print(f"\n📤 Importing {len(credentials_to_insert)} credentials...")
-        result = await db.credentials.insert_many(credentials_to_insert)
-        print(f"✅ Successfully imported {len(result.inserted_ids)} credentials")
-    
-    if skipped:
-        print(f"⚠️  Skipped {skipped} invalid lines")
-    
-    client.close()
+
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.DATABASE_NAME]
+
+    print(f"📁 Importing credentials from {file_path} (offset {offset})...")
+    importer = CredentialImporter(
+        db,
+        chunk_size=chunk_size or settings.CREDENTIAL_IMPORT_CHUNK_SIZE,
+        on_progress=print_progress
+    )
+
+    try:
+        stats = await importer.import_file(file_path, start_offset=offset)
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print(f"\n⚠️  Interrupted - resume with --offset {importer.stats['offset']}")
+        raise
+    finally:
+        client.close()
+
+    print(f"\n✅ Imported {stats['inserted']} credentials in {stats['elapsed_seconds']}s ({stats['lines_per_sec']} lines/sec)")
+    if stats["duplicates"]:
+        print(f"ℹ️  Skipped {stats['duplicates']} duplicates")
+    if stats["invalid"] or stats["failed"]:
+        print(f"⚠️  {stats['invalid']} invalid lines, {stats['failed']} failed inserts")
+        for error in stats["errors"]:
+            print(f"   Line {error['line']}: {error['error']}")
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python bulk_import_credentials.py <file_path>")
-        print("\nFile format (one per line):")
-        print("Platform|Username|Password|Notes")
-        print("\nExample:")
-        print("Netflix|user1@example.com|pass123|Premium account")
-        print("Prime|user2@example.com|pass456|Family plan")
-        print("Pornhub|user3@example.com|pass789|Premium")
-        sys.exit(1)
-    
-    file_path = sys.argv[1]
-    asyncio.run(bulk_import_credentials(file_path))
+    parser = argparse.ArgumentParser(
+        description="Bulk import credentials (Platform|Username|Password|Notes per line)"
+    )
+    parser.add_argument("file_path")
+    parser.add_argument("--offset", type=int, default=0, help="Byte offset to resume from")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Documents per insert")
+    args = parser.parse_args()
+
+    asyncio.run(bulk_import_credentials(args.file_path, args.offset, args.chunk_size))
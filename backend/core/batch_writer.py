@@ -0,0 +1,122 @@
+"""
+Batched inserts for append-only audit records
+
+Hot paths hand audit documents to a ``BatchWriter`` instead of awaiting an
+insert each. A background task flushes the buffer with one unordered
+``insert_many`` every few hundred milliseconds, or as soon as a batch fills
+up; shutdown flushes whatever is left. Until ``start`` is called (scripts,
+tests) ``add`` simply inserts directly.
+
+Records are never dropped: a batch that fails is kept for the next flush,
+and once ``max_buffer`` documents are waiting ``add`` falls back to a
+direct ``insert_one`` (raising to the caller if that fails too).
+"""
+import asyncio
+from typing import Callable, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError
+
+
+DUPLICATE_KEY = 11000
+
+
+class BatchWriter:
+    """Buffers documents for one collection and inserts them in batches"""
+
+    def __init__(self, collection_name: str, batch_size: int, flush_seconds: float, max_buffer: int = 10000):
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffer = max_buffer
+        self._buffer: List[dict] = []
+        self._get_db: Optional[Callable[[], AsyncIOMotorDatabase]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+        # Metrics
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.direct_inserts = 0
+
+    def start(self, get_db: Callable[[], AsyncIOMotorDatabase]):
+        """Start buffering and the periodic flush loop"""
+        self._get_db = get_db
+        self._flush_lock = asyncio.Lock()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write out the remaining buffer"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    async def add(self, db: AsyncIOMotorDatabase, document: dict):
+        """Queue a document (inserted directly when the writer isn't running)"""
+        if self._task is None:
+            await db[self.collection_name].insert_one(document)
+            self.written += 1
+            return
+
+        if len(self._buffer) >= self.max_buffer:
+            # Flushes are failing: write through instead of growing the buffer
+            await db[self.collection_name].insert_one(document)
+            self.written += 1
+            self.direct_inserts += 1
+            return
+
+        self._buffer.append(document)
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        """Insert everything buffered so far"""
+        if not self._buffer or self._get_db is None:
+            return
+        async with self._flush_lock:
+            batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+            try:
+                await self._get_db()[self.collection_name].insert_many(batch, ordered=False)
+                self.written += len(batch)
+            except BulkWriteError as e:
+                # Unordered: everything except the reported errors was written
+                write_errors = e.details.get("writeErrors", [])
+                self.written += e.details.get("nInserted", 0)
+                self.failures += len(write_errors)
+                print(f"{self.collection_name} batch insert errors: {write_errors[:3]}")
+                # Duplicates were written by an earlier attempt; retry the rest
+                retry = [batch[error["index"]] for error in write_errors if error.get("code") != DUPLICATE_KEY]
+                self._buffer = retry + self._buffer
+            except Exception as e:
+                # Nothing written: keep the batch for the next flush
+                self.failures += 1
+                print(f"{self.collection_name} batch insert failed, will retry: {e}")
+                self._buffer = batch + self._buffer
+            self.batches += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"{self.collection_name} batch writer error: {e}")
+
+    def stats(self) -> dict:
+        """Buffer size and counters"""
+        return {
+            "buffered": len(self._buffer),
+            "written": self.written,
+            "batches": self.batches,
+            "failures": self.failures,
+            "direct_inserts": self.direct_inserts
+        }
@@ -19,6 +19,7 @@ class Settings(BaseSettings):
     # MongoDB
     MONGODB_URL: str
     DATABASE_NAME: str
+    MONGODB_TRANSACTIONS: bool = True  # Used when the server is a replica set / mongos
     
     # JWT
     SECRET_KEY: str
@@ -29,7 +30,14 @@ class Settings(BaseSettings):
     
     # Security
     BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 64
     RATE_LIMIT_PER_MINUTE: int = 60
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+    PRINCIPAL_INVALIDATION_POLL_SECONDS: float = 2.0
+    IDEMPOTENCY_KEY_TTL_HOURS: int = 24
+    IDEMPOTENCY_LOCK_SECONDS: int = 60  # In-progress key is taken over after this
     
     # Admin
     SUPER_ADMIN_EMAIL: str
@@ -38,10 +46,69 @@ class Settings(BaseSettings):
     # Razorpay
     RAZORPAY_KEY_ID: str
     RAZORPAY_KEY_SECRET: str
+    RAZORPAY_API_URL: str = "https://api.razorpay.com/v1"
+    RAZORPAY_TIMEOUT_SECONDS: float = 10.0
+    RAZORPAY_MAX_RETRIES: int = 2
+    RAZORPAY_RETRY_BACKOFF_SECONDS: float = 0.3
+    RAZORPAY_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    RAZORPAY_CIRCUIT_RESET_SECONDS: int = 30
+    RAZORPAY_WEBHOOK_SECRET: str = ""  # Dashboard webhook secret; the webhook endpoint is disabled when empty
+    RAZORPAY_WEBHOOK_BATCH_SIZE: int = 50
+    RAZORPAY_WEBHOOK_POLL_SECONDS: float = 1.0
+    RAZORPAY_WEBHOOK_MAX_ATTEMPTS: int = 10
+    RAZORPAY_WEBHOOK_RETENTION_DAYS: int = 30
     
     # Telegram Bot
     TELEGRAM_BOT_TOKEN: str
     TELEGRAM_ADMIN_CHAT_ID: str
+    TELEGRAM_MAX_MESSAGES_PER_MINUTE: int = 20  # Telegram group chat limit
+    TELEGRAM_DIGEST_THRESHOLD: int = 5  # Coalesce bursts of this many alerts
+    TELEGRAM_OUTBOX_BATCH_SIZE: int = 50
+    TELEGRAM_OUTBOX_POLL_SECONDS: float = 2.0
+    TELEGRAM_OUTBOX_MAX_ATTEMPTS: int = 5
+    TELEGRAM_OUTBOX_RETENTION_DAYS: int = 7
+    
+    # Notification push (SSE)
+    NOTIFICATION_EVENTS_POLL_SECONDS: float = 1.0
+    NOTIFICATION_STREAM_KEEPALIVE_SECONDS: int = 15
+    
+    # Scheduled jobs
+    SCHEDULER_ENABLED: bool = True
+    SUBSCRIPTION_EXPIRY_INTERVAL_SECONDS: int = 60
+    SUBSCRIPTION_EXPIRY_BATCH_SIZE: int = 500
+    SUBSCRIPTION_EXPIRY_MAX_BATCHES: int = 20
+    RENEWAL_REMINDER_DAYS: int = 3
+    RENEWAL_REMINDER_INTERVAL_SECONDS: int = 3600
+    CREDENTIAL_RECYCLE_INTERVAL_SECONDS: int = 300
+    CREDENTIAL_RECYCLE_BATCH_SIZE: int = 200
+    CREDENTIAL_RECYCLE_COOLDOWN_HOURS: float = 0  # Wait after a subscription ends before reusing its credentials
+    CREDENTIAL_RECYCLE_REQUIRE_ROTATION: bool = False  # Park recycled credentials until the password is changed
+    PENDING_PAYMENT_SWEEP_INTERVAL_SECONDS: int = 300
+    PENDING_PAYMENT_SWEEP_BATCH_SIZE: int = 500
+    PENDING_PAYMENT_TTL_HOURS: float = 24  # Unpaid Razorpay orders are archived as expired after this
+    PENDING_PAYMENT_ARCHIVE_AFTER_HOURS: float = 24  # Completed rows are moved to the archive after this
+    PENDING_PAYMENT_PROCESSING_TIMEOUT_MINUTES: float = 10  # A credit still "processing" after this was interrupted
+    PENDING_PAYMENT_MAX_RECOVERY_ATTEMPTS: int = 3
+    
+    # Bulk credential import (documents per insert_many)
+    CREDENTIAL_IMPORT_CHUNK_SIZE: int = 1000
+    
+    # Product stock derived from credential counters (per-worker cache)
+    STOCK_CACHE_SECONDS: float = 5.0
+    
+    # Product catalog snapshot (per worker)
+    CATALOG_POLL_SECONDS: float = 2.0
+    CATALOG_CACHE_MAX_AGE: int = 30  # Cache-Control max-age for GET /products
+    
+    # Referrals
+    REFERRAL_STATS_RECONCILE_MINUTES: int = 60
+    
+    # Admin-editable settings (system_settings collection) cache
+    SYSTEM_SETTINGS_CACHE_SECONDS: int = 30
+    
+    # Batched audit writes
+    AUDIT_BATCH_SIZE: int = 100
+    AUDIT_FLUSH_SECONDS: float = 0.5
     
     # OTP
     MOCK_OTP: str = "123456"
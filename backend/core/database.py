@@ -3,7 +3,7 @@ MongoDB database configuration and connection management
 """
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from .config import settings
-from typing import Optional
+from typing import Dict, Optional
 
 
 class Database:
@@ -15,6 +15,9 @@ class Database:
 
 db = Database()
 
+# Transaction support per client (checked once per process)
+_transaction_support: Dict[int, bool] = {}
+
 
 async def connect_to_mongo():
     """Connect to MongoDB on startup"""
@@ -35,3 +38,17 @@ async def close_mongo_connection():
 def get_database() -> AsyncIOMotorDatabase:
     """Get database instance for dependency injection"""
     return db.db
+
+
+async def supports_transactions(database: AsyncIOMotorDatabase) -> bool:
+    """
+    Whether multi-document transactions can be used
+    Requires a replica set or sharded cluster (a standalone mongod can't)
+    """
+    if not settings.MONGODB_TRANSACTIONS:
+        return False
+    key = id(database.client)
+    if key not in _transaction_support:
+        hello = await database.client.admin.command("hello")
+        _transaction_support[key] = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return _transaction_support[key]
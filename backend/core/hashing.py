@@ -0,0 +1,91 @@
+"""
+Bounded executor for password hashing
+
+bcrypt is CPU bound (~250ms at 12 rounds) and releases the GIL, so it runs
+on a small thread pool instead of the event loop. A semaphore caps the
+number of hashes in flight and a queue limit sheds load during login storms.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from fastapi import HTTPException, status
+from .config import settings
+
+
+class PasswordHasher:
+    """Runs blocking hash functions off the event loop with concurrency limits"""
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        # Metrics
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _ensure_started(self):
+        """Create executor and semaphore lazily inside the running loop"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="password-hash"
+            )
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+    async def run(self, func: Callable, *args):
+        """Run func(*args) on the hashing pool"""
+        self._ensure_started()
+
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again"
+            )
+
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        """Queue depth and throughput counters"""
+        return {
+            "workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self):
+        """Stop worker threads on application shutdown"""
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._semaphore = None
+
+
+# Global hasher instance
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE
+)
@@ -0,0 +1,138 @@
+"""
+Idempotency keys for retried POST requests
+
+Clients send an ``Idempotency-Key`` header on requests that must not run
+twice (orders, wallet operations). The first request claims the key in the
+``idempotency_keys`` collection and stores its response when it finishes;
+a retry with the same key gets the stored response from one lookup, or 409
+while the first request is still running. Keys expire via a TTL index.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from fastapi import HTTPException, Response
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+from .config import settings
+
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+INDEXES = {
+    "idempotency_keys": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ]
+}
+
+
+def request_fingerprint(payload: dict) -> str:
+    """Hash of the request body, to detect a key reused for a different request"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """Claims keys and stores responses in the idempotency_keys collection"""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.collection = db.idempotency_keys
+        self.lock_seconds = settings.IDEMPOTENCY_LOCK_SECONDS
+        self.ttl = timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+
+    async def begin(self, key_id: str, fingerprint: str) -> Optional[dict]:
+        """
+        Claim a key for a new request
+        Returns the stored response if the request already completed, None if claimed
+        """
+        now = datetime.utcnow()
+        try:
+            await self.collection.insert_one({
+                "_id": key_id,
+                "status": "in_progress",
+                "fingerprint": fingerprint,
+                "created_at": now.isoformat(),
+                "expires_at": now + timedelta(seconds=self.lock_seconds)
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+
+        existing = await self.collection.find_one({"_id": key_id})
+        if not existing:
+            # Expired between insert and read
+            raise HTTPException(status_code=409, detail="Request with this Idempotency-Key is in progress, retry shortly")
+
+        if existing["fingerprint"] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+
+        if existing["status"] == "completed":
+            return existing["response"]
+
+        # Take over the lock of a request that died without finishing
+        taken = await self.collection.find_one_and_update(
+            {"_id": key_id, "status": "in_progress", "expires_at": {"$lte": now}},
+            {"$set": {"expires_at": now + timedelta(seconds=self.lock_seconds)}}
+        )
+        if taken:
+            return None
+
+        raise HTTPException(status_code=409, detail="Request with this Idempotency-Key is in progress, retry shortly")
+
+    async def complete(self, key_id: str, response: dict):
+        """Store the response for replay"""
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"_id": key_id},
+            {"$set": {
+                "status": "completed",
+                "response": response,
+                "completed_at": now.isoformat(),
+                "expires_at": now + self.ttl
+            }}
+        )
+
+    async def abandon(self, key_id: str):
+        """Release the key after a failed request so the client can retry"""
+        await self.collection.delete_one({"_id": key_id, "status": "in_progress"})
+
+
+async def run_idempotent(
+    db: AsyncIOMotorDatabase,
+    key: Optional[str],
+    user_id: str,
+    scope: str,
+    payload: dict,
+    handler: Callable[[], Awaitable[dict]],
+    response: Optional[Response] = None
+) -> dict:
+    """
+    Run handler at most once per (user, scope, Idempotency-Key)
+
+    - **key**: header value; without a key the handler just runs
+    - **scope**: operation name, e.g. "orders.create"
+    - **payload**: request body, a retry must send the same body
+    - **response**: if given, replays are marked with an Idempotent-Replayed header
+    """
+    if not key:
+        return await handler()
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters")
+
+    store = IdempotencyStore(db)
+    key_id = f"{user_id}:{scope}:{key}"
+    stored = await store.begin(key_id, request_fingerprint(payload))
+    if stored is not None:
+        if response is not None:
+            response.headers["Idempotent-Replayed"] = "true"
+        return stored
+
+    try:
+        result = await handler()
+    except BaseException:
+        await store.abandon(key_id)
+        raise
+
+    await store.complete(key_id, result)
+    return result
@@ -0,0 +1,115 @@
+"""
+Declarative MongoDB index registry
+
+Each feature module declares the indexes for the collections it queries in
+its own ``indexes.py`` as ``INDEXES = {"collection": [IndexModel, ...]}``.
+The registry merges them and reconciles the live database against it:
+missing indexes are created, extra ones are reported (and optionally dropped).
+"""
+import importlib
+from typing import Dict, List
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+
+# Modules that declare an INDEXES mapping
+INDEX_MODULES = [
+    "auth.indexes",
+    "orders.indexes",
+    "wallet.indexes",
+    "notifications.indexes",
+    "subscriptions.indexes",
+    "app.credentials.indexes",
+    "app.referrals.indexes",
+    "app.youtube.indexes",
+    "bots.indexes",
+    "core.idempotency",
+    "core.security",
+]
+
+
+def get_index_registry() -> Dict[str, List[IndexModel]]:
+    """Merge the index declarations of every registered module by collection"""
+    registry: Dict[str, List[IndexModel]] = {}
+    for module_name in INDEX_MODULES:
+        module = importlib.import_module(module_name)
+        for collection, models in module.INDEXES.items():
+            registry.setdefault(collection, []).extend(models)
+    return registry
+
+
+def _key_pattern(key) -> tuple:
+    """Normalize an index key spec (SON or list of pairs) for comparison"""
+    items = key.items() if hasattr(key, "items") else key
+    return tuple((field, int(direction) if isinstance(direction, (int, float)) else direction)
+                 for field, direction in items)
+
+
+async def reconcile_indexes(db: AsyncIOMotorDatabase, apply: bool = True, drop_extra: bool = False) -> dict:
+    """
+    Compare declared indexes with the database
+
+    - **apply**: create missing indexes (False = report only)
+    - **drop_extra**: drop indexes that are not declared anywhere
+    - Returns {"created", "missing", "extra", "dropped", "failed"} lists of "collection.index" names
+    """
+    report = {"created": [], "missing": [], "extra": [], "dropped": [], "failed": []}
+    existing_collections = set(await db.list_collection_names())
+
+    for collection, models in get_index_registry().items():
+        existing = {}
+        if collection in existing_collections:
+            existing = await db[collection].index_information()
+        existing_keys = {_key_pattern(info["key"]): name for name, info in existing.items()}
+
+        declared_names = set()
+        for model in models:
+            spec = model.document
+            name = spec["name"]
+            declared_names.add(name)
+
+            if name in existing:
+                continue
+            equivalent = existing_keys.get(_key_pattern(spec["key"]))
+            if equivalent:
+                # Same key pattern under a different name - treat as present
+                declared_names.add(equivalent)
+                continue
+
+            label = f"{collection}.{name}"
+            if not apply:
+                report["missing"].append(label)
+                continue
+
+            try:
+                await db[collection].create_indexes([model])
+                report["created"].append(label)
+            except OperationFailure as e:
+                report["failed"].append(f"{label}: {e}")
+
+        for name in existing:
+            if name == "_id_" or name in declared_names:
+                continue
+            label = f"{collection}.{name}"
+            if drop_extra and apply:
+                await db[collection].drop_index(name)
+                report["dropped"].append(label)
+            else:
+                report["extra"].append(label)
+
+    return report
+
+
+def print_index_report(report: dict):
+    """Print reconciliation report"""
+    for label in report["created"]:
+        print(f"  ✅ Created index {label}")
+    for label in report["missing"]:
+        print(f"  ⚠️  Missing index {label}")
+    for label in report["dropped"]:
+        print(f"  🗑️  Dropped index {label}")
+    for label in report["extra"]:
+        print(f"  ℹ️  Extra index {label} (not declared)")
+    for label in report["failed"]:
+        print(f"  ❌ Failed index {label}")
@@ -0,0 +1,53 @@
+"""
+MongoDB-backed leases for background work
+
+The API runs as several uvicorn workers; a lease makes sure only one of them
+runs a given background job at a time. Leases expire, so a crashed worker's
+job is picked up by another one after the TTL.
+"""
+import os
+import socket
+from datetime import datetime, timedelta
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+# Identifies this worker process as lease owner
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def acquire_lease(db: AsyncIOMotorDatabase, name: str, ttl_seconds: int, owner: str = WORKER_ID) -> bool:
+    """
+    Acquire or renew the named lease
+    Returns True if this owner holds the lease for the next ttl_seconds
+    """
+    now = datetime.utcnow()
+    try:
+        await db.job_leases.find_one_and_update(
+            {
+                "_id": name,
+                "$or": [
+                    {"owner": owner},
+                    {"expires_at": {"$lte": now}}
+                ]
+            },
+            {
+                "$set": {
+                    "owner": owner,
+                    "expires_at": now + timedelta(seconds=ttl_seconds),
+                    "renewed_at": now
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Lease exists, is held by another owner and hasn't expired
+        return False
+    return True
+
+
+async def release_lease(db: AsyncIOMotorDatabase, name: str, owner: str = WORKER_ID):
+    """Release the named lease if held by owner"""
+    await db.job_leases.delete_one({"_id": name, "owner": owner})
@@ -0,0 +1,95 @@
+"""
+Request-scoped batching loaders
+
+List endpoints that show the owner of each row used to look users up one
+``find_one`` at a time. A loader collects every id requested during the
+same event loop tick and resolves them with a single projected ``$in``
+query; results are cached for the loader's lifetime, so create one per
+request (``Depends(get_user_loader)``) or per service call.
+"""
+import asyncio
+from typing import Dict, Iterable, List, Optional
+from bson import ObjectId
+from fastapi import Depends
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from .database import get_database
+
+
+USER_FIELDS = ("name", "email", "phone")
+# Ids per $in query
+MAX_BATCH_SIZE = 1000
+
+
+class UserLoader:
+    """Batches user lookups by id into one query per tick"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, fields: Iterable[str] = USER_FIELDS):
+        self.db = db
+        self.projection = {field: 1 for field in fields}
+        self._cache: Dict[str, asyncio.Future] = {}
+        self._queue: List[str] = []
+        self._dispatch_task: Optional[asyncio.Task] = None
+        self.queries = 0
+
+    def load(self, user_id) -> "asyncio.Future":
+        """User document (projected) for an id, or None if it doesn't exist"""
+        key = str(user_id)
+        future = self._cache.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._cache[key] = future
+            self._queue.append(key)
+            if len(self._queue) == 1:
+                # Let the caller queue the rest of the page before querying
+                loop.call_soon(self._schedule_dispatch)
+        return future
+
+    async def load_many(self, user_ids: Iterable) -> Dict[str, Optional[dict]]:
+        """{user_id: user or None} for a batch of ids (empty ids are skipped)"""
+        keys = list(dict.fromkeys(str(user_id) for user_id in user_ids if user_id))
+        users = await asyncio.gather(*(self.load(key) for key in keys))
+        return dict(zip(keys, users))
+
+    def _schedule_dispatch(self):
+        self._dispatch_task = asyncio.ensure_future(self._dispatch())
+
+    async def _dispatch(self):
+        keys, self._queue = self._queue, []
+        try:
+            users_by_id = {}
+            object_ids = [ObjectId(key) for key in keys if ObjectId.is_valid(key)]
+            for start in range(0, len(object_ids), MAX_BATCH_SIZE):
+                batch = object_ids[start:start + MAX_BATCH_SIZE]
+                users = await self.db.users.find({"_id": {"$in": batch}}, self.projection).to_list(length=len(batch))
+                self.queries += 1
+                users_by_id.update({str(user["_id"]): user for user in users})
+        except Exception as e:
+            for key in keys:
+                # Not cached, so a later load retries
+                future = self._cache.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for key in keys:
+            future = self._cache[key]
+            if not future.done():
+                future.set_result(users_by_id.get(key))
+
+
+def user_info(user_id: str, user: Optional[dict]) -> Optional[dict]:
+    """Owner summary attached to list rows"""
+    if not user:
+        return None
+    return {
+        "user_id": user_id,
+        "name": user.get("name"),
+        "email": user.get("email"),
+        "phone": user.get("phone")
+    }
+
+
+def get_user_loader(db=Depends(get_database)) -> UserLoader:
+    """Dependency: a fresh loader per request"""
+    return UserLoader(db)
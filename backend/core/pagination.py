@@ -0,0 +1,100 @@
+"""
+Keyset (cursor) pagination
+
+List endpoints page through ``(sort_field, _id)`` in descending order. The
+``next_cursor`` token returned with a page encodes the last item's key, so the
+next page is an indexed range query instead of a skip that gets slower with
+every page. ``skip`` is still accepted as a deprecated fallback.
+"""
+import base64
+import json
+from typing import List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorCollection
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+
+
+def encode_cursor(doc: dict, sort_field: str = "created_at") -> str:
+    """Opaque token for the position after `doc`"""
+    value = None if sort_field == "_id" else doc.get(sort_field)
+    raw = json.dumps([value, str(doc["_id"])], default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[object, ObjectId]:
+    """Decode a cursor token into (sort value, _id)"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        value, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return value, ObjectId(doc_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def cursor_filter(token: str, sort_field: str = "created_at") -> dict:
+    """Query matching items after the cursor position (descending order)"""
+    value, doc_id = decode_cursor(token)
+    if sort_field == "_id":
+        return {"_id": {"$lt": doc_id}}
+    return {"$or": [
+        {sort_field: {"$lt": value}},
+        {sort_field: value, "_id": {"$lt": doc_id}}
+    ]}
+
+
+async def paginate(
+    collection: AsyncIOMotorCollection,
+    query: dict,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    sort_field: str = "created_at",
+    projection: Optional[dict] = None
+) -> Tuple[list, Optional[str]]:
+    """
+    Fetch one page, newest first
+
+    - **cursor**: next_cursor from the previous page (takes precedence over skip)
+    - **skip**: deprecated offset fallback
+    - **sort_field**: "created_at"-style field, or "_id" to page by insertion order
+    - Returns (items, next_cursor); next_cursor is None on the last page
+    """
+    if cursor:
+        query = {"$and": [query, cursor_filter(cursor, sort_field)]} if query else cursor_filter(cursor, sort_field)
+
+    sort = [("_id", -1)] if sort_field == "_id" else [(sort_field, -1), ("_id", -1)]
+    find = collection.find(query, projection).sort(sort)
+    if skip and not cursor:
+        find = find.skip(skip)
+
+    # One extra item tells whether there is another page
+    items = await find.limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1], sort_field)
+    return items, next_cursor
+
+
+def merge_pages(
+    pages: List[Tuple[list, Optional[str]]],
+    limit: int,
+    skip: int = 0,
+    sort_field: str = "created_at"
+) -> Tuple[list, Optional[str]]:
+    """
+    Merge paginate() results from several collections into one stream
+
+    Each source must be fetched with the same cursor and limit = skip + limit
+    (skip=0). Returns (items, next_cursor) for the combined stream.
+    """
+    combined = sorted(
+        (item for items, _ in pages for item in items),
+        key=lambda item: (item.get(sort_field) or "", item["_id"]),
+        reverse=True
+    )
+    items = combined[skip:skip + limit]
+    has_more = len(combined) > skip + limit or any(next_cursor for _, next_cursor in pages)
+    next_cursor = encode_cursor(items[-1], sort_field) if has_more and items else None
+    return items, next_cursor
@@ -0,0 +1,152 @@
+"""
+In-process job scheduler
+
+Every uvicorn worker runs the scheduler, but each job is guarded by a
+Mongo-backed lease (``job:<name>``) so only one worker runs it per interval;
+if that worker dies, another takes the job over once the lease expires.
+Run results (duration, items processed, lag) are recorded in the
+``scheduled_jobs`` collection so any worker can report them.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from .leases import acquire_lease, release_lease, WORKER_ID
+
+
+# A job gets the database and returns counters for the run, e.g. {"processed": 10}
+JobFunc = Callable[[AsyncIOMotorDatabase], Awaitable[dict]]
+
+
+class Job:
+    """A registered periodic job"""
+
+    def __init__(self, name: str, interval_seconds: float, func: JobFunc):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.func = func
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def lease_name(self) -> str:
+        return f"job:{self.name}"
+
+    @property
+    def lease_seconds(self) -> int:
+        # Held across the interval so other workers skip it; expires if we die
+        return int(self.interval_seconds * 2) + 30
+
+
+class Scheduler:
+    """Runs registered jobs periodically on the lease holder"""
+
+    def __init__(self):
+        self.get_db: Optional[Callable[[], AsyncIOMotorDatabase]] = None
+        self.jobs: Dict[str, Job] = {}
+
+    def add_job(self, name: str, interval_seconds: float, func: JobFunc):
+        """Register a job (before start)"""
+        self.jobs[name] = Job(name, interval_seconds, func)
+
+    def start(self, get_db: Callable[[], AsyncIOMotorDatabase]):
+        """Start a loop per job"""
+        self.get_db = get_db
+        for job in self.jobs.values():
+            if job.task is None:
+                job.task = asyncio.create_task(self._loop(job))
+
+    async def stop(self):
+        """Stop job loops and hand the leases over"""
+        for job in self.jobs.values():
+            if job.task is None:
+                continue
+            job.task.cancel()
+            try:
+                await job.task
+            except asyncio.CancelledError:
+                pass
+            job.task = None
+            try:
+                await release_lease(self.get_db(), job.lease_name)
+            except Exception as e:
+                print(f"Failed to release lease for job {job.name}: {e}")
+
+    async def _loop(self, job: Job):
+        while True:
+            try:
+                if await acquire_lease(self.get_db(), job.lease_name, ttl_seconds=job.lease_seconds):
+                    await self._execute(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Scheduler error in job {job.name}: {e}")
+            await asyncio.sleep(job.interval_seconds)
+
+    async def _execute(self, job: Job) -> dict:
+        """Run a job once and record the outcome"""
+        db = self.get_db()
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        error = None
+        result: dict = {}
+        try:
+            result = await job.func(db) or {}
+        except Exception as e:
+            error = str(e)
+            print(f"Job {job.name} failed: {e}")
+        duration_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        processed = result.get("processed", 0)
+        update = {
+            "$set": {
+                "interval_seconds": job.interval_seconds,
+                "last_run_at": started_at.isoformat(),
+                "last_duration_ms": duration_ms,
+                "last_result": result,
+                "last_error": error,
+                "last_worker": WORKER_ID,
+                "last_throughput_per_sec": round(processed / (duration_ms / 1000), 1) if processed and duration_ms else 0.0
+            },
+            "$inc": {"runs": 1, "failures": 1 if error else 0, "processed_total": processed}
+        }
+        await db.scheduled_jobs.update_one({"_id": job.name}, update, upsert=True)
+        if processed:
+            print(f"Job {job.name}: {result} in {duration_ms}ms")
+        return {"duration_ms": duration_ms, "result": result, "error": error}
+
+    async def run_now(self, name: str) -> Optional[dict]:
+        """
+        Run a job immediately if this worker can take its lease
+        Returns None if another worker holds it
+        """
+        job = self.jobs[name]
+        if not await acquire_lease(self.get_db(), job.lease_name, ttl_seconds=job.lease_seconds):
+            return None
+        return await self._execute(job)
+
+    async def status(self, db: AsyncIOMotorDatabase) -> list:
+        """Recorded state of every registered job"""
+        records = await db.scheduled_jobs.find({"_id": {"$in": list(self.jobs)}}).to_list(length=len(self.jobs))
+        by_name = {record["_id"]: record for record in records}
+        leases = await db.job_leases.find(
+            {"_id": {"$in": [job.lease_name for job in self.jobs.values()]}}
+        ).to_list(length=len(self.jobs))
+        owners = {lease["_id"]: lease for lease in leases}
+
+        jobs = []
+        for job in self.jobs.values():
+            record = by_name.get(job.name, {})
+            lease = owners.get(job.lease_name, {})
+            jobs.append({
+                "name": job.name,
+                "interval_seconds": job.interval_seconds,
+                "lease_owner": lease.get("owner"),
+                "lease_expires_at": lease["expires_at"].isoformat() if lease.get("expires_at") else None,
+                **{k: v for k, v in record.items() if k not in ("_id", "interval_seconds")}
+            })
+        return jobs
+
+
+# Global scheduler; jobs are registered in main.py
+scheduler = Scheduler()
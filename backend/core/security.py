@@ -1,35 +1,182 @@
 """
 Security utilities for JWT tokens and authentication
+
+Authenticated principals are cached per worker. ``invalidate_principal``
+drops the local entry and records the user id in ``principal_invalidations``;
+every worker's ``PrincipalInvalidationListener`` polls that collection and
+drops its own entry, so a blocked user or changed role takes effect on all
+workers within PRINCIPAL_INVALIDATION_POLL_SECONDS. If the shared write or
+the poll fails, entries still expire after PRINCIPAL_CACHE_TTL_SECONDS.
 """
+import asyncio
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Callable, Optional, Dict, Any
 from jose import JWTError, jwt
 import bcrypt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
 from .config import settings
 from .database import get_database
+from .cache import TTLCache
+from .hashing import password_hasher
 from bson import ObjectId
 
 
 security = HTTPBearer()
 
+# Fields needed by route handlers and role checks - everything else
+# (balances, refresh token, referral data) is read fresh where it is used
+PRINCIPAL_PROJECTION = {
+    "name": 1,
+    "email": 1,
+    "phone": 1,
+    "role": 1,
+    "is_active": 1,
+    "created_at": 1
+}
 
-def get_password_hash(password: str) -> str:
-    """Hash a password using bcrypt - truncate to 72 bytes"""
+# Per-worker cache of authenticated principals keyed by user id
+principal_cache = TTLCache(
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+
+# Workers' clocks may differ a little; polls overlap by this much
+INVALIDATION_CLOCK_SKEW = timedelta(seconds=5)
+
+INDEXES = {
+    "principal_invalidations": [
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ]
+}
+
+
+async def invalidate_principal(db: AsyncIOMotorDatabase, user_id: str):
+    """Drop cached principal (on every worker) after the user's role, status or profile changes"""
+    principal_cache.invalidate(str(user_id))
+    now = datetime.utcnow()
+    try:
+        await db.principal_invalidations.insert_one({
+            "user_id": str(user_id),
+            "created_at": now,
+            # Older cache entries have expired anyway
+            "expires_at": now + timedelta(seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS) + INVALIDATION_CLOCK_SKEW
+        })
+    except Exception as e:
+        print(f"Failed to publish principal invalidation for {user_id}: {e}")
+
+
+class PrincipalInvalidationListener:
+    """Background task applying other workers' invalidations to the local principal cache"""
+
+    def __init__(self, poll_seconds: float):
+        self.poll_seconds = poll_seconds
+        self._get_db: Optional[Callable[[], AsyncIOMotorDatabase]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._since: Optional[datetime] = None
+
+        # Metrics
+        self.polls = 0
+        self.invalidated = 0
+        self.failures = 0
+
+    def start(self, get_db: Callable[[], AsyncIOMotorDatabase]):
+        """Start polling for invalidations"""
+        self._get_db = get_db
+        self._since = datetime.utcnow()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop polling"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def poll(self):
+        """Drop cached principals invalidated since the last poll"""
+        started = datetime.utcnow()
+        cursor = self._get_db().principal_invalidations.find(
+            {"created_at": {"$gte": self._since - INVALIDATION_CLOCK_SKEW}},
+            {"user_id": 1}
+        )
+        async for row in cursor:
+            principal_cache.invalidate(row["user_id"])
+            self.invalidated += 1
+        self._since = started
+        self.polls += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self.poll()
+            except Exception as e:
+                self.failures += 1
+                print(f"Principal invalidation poll failed: {e}")
+
+    def stats(self) -> dict:
+        """Poll counters"""
+        return {
+            "running": self._task is not None,
+            "polls": self.polls,
+            "invalidated": self.invalidated,
+            "failures": self.failures
+        }
+
+
+principal_invalidation_listener = PrincipalInvalidationListener(settings.PRINCIPAL_INVALIDATION_POLL_SECONDS)
+
+
+def _truncate_password(password: str) -> bytes:
+    """bcrypt only uses the first 72 bytes"""
     password_bytes = password.encode('utf-8')
     if len(password_bytes) > 72:
         password_bytes = password_bytes[:72]
-    salt = bcrypt.gensalt(rounds=12)
-    return bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+    return password_bytes
+
+
+def get_password_hash(password: str) -> str:
+    """Hash a password using bcrypt - truncate to 72 bytes"""
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
+    return bcrypt.hashpw(_truncate_password(password), salt).decode('utf-8')
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
-    password_bytes = plain_password.encode('utf-8')
-    if len(password_bytes) > 72:
-        password_bytes = password_bytes[:72]
-    return bcrypt.checkpw(password_bytes, hashed_password.encode('utf-8'))
+    try:
+        return bcrypt.checkpw(_truncate_password(plain_password), hashed_password.encode('utf-8'))
+    except ValueError:
+        # Missing or malformed hash
+        return False
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Check if a stored hash was made with a different cost than BCRYPT_ROUNDS"""
+    try:
+        rounds = int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return False
+    return rounds != settings.BCRYPT_ROUNDS
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the hashing pool (use from request handlers)"""
+    return await password_hasher.run(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing pool (use from request handlers)"""
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -64,7 +211,14 @@ async def get_current_user(
     db=Depends(get_database)
 ):
     """Get current authenticated user from JWT token"""
-    token = credentials.credentials
+    return await get_principal(credentials.credentials, db)
+
+
+async def get_principal(token: str, db) -> dict:
+    """
+    Resolve an access token to the authenticated user
+    For endpoints that can't send an Authorization header (e.g. EventSource)
+    """
     payload = decode_access_token(token)
     
     user_id = payload.get("sub")
@@ -74,17 +228,28 @@ async def get_current_user(
             detail="Invalid authentication credentials"
         )
     
-    # Fetch user from database
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
+    # Warm path: cached principal, no database round trip
+    user = principal_cache.get(user_id)
     if user is None:
+        user = await db.users.find_one({"_id": ObjectId(user_id)}, PRINCIPAL_PROJECTION)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found"
+            )
+        
+        # Convert ObjectId to string for JSON serialization
+        user["_id"] = str(user["_id"])
+        principal_cache.set(user_id, user)
+    
+    if not user.get("is_active", True):
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Account is deactivated"
         )
     
-    # Convert ObjectId to string for JSON serialization
-    user["_id"] = str(user["_id"])
-    return user
+    # Copy so handlers can't mutate the cached principal
+    return dict(user)
 
 
 def require_role(allowed_roles: list):
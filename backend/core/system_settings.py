@@ -0,0 +1,56 @@
+"""
+Admin-editable runtime settings
+
+Settings the admin panel changes at runtime (e.g. the referral commission
+rate) live as ``{"key", "value"}`` documents in ``system_settings``. Reads go
+through a short per-worker cache so hot paths don't query the collection on
+every request; a change made on another worker is picked up within the TTL.
+"""
+from datetime import datetime
+from typing import Any, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from .cache import TTLCache
+from .config import settings
+
+
+# Cached marker for "no document", so missing keys are cached too
+_MISSING = object()
+
+
+class SystemSettings:
+    """Cached reads / invalidating writes of system_settings documents"""
+
+    def __init__(self, ttl_seconds: float):
+        self._cache = TTLCache(max_entries=256, ttl_seconds=ttl_seconds)
+
+    async def get(self, db: AsyncIOMotorDatabase, key: str, default: Any = None) -> Any:
+        """Value of a setting, or default if it was never set"""
+        value = self._cache.get(key)
+        if value is None:
+            doc = await db.system_settings.find_one({"key": key}, {"value": 1})
+            value = doc["value"] if doc and "value" in doc else _MISSING
+            self._cache.set(key, value)
+        return default if value is _MISSING else value
+
+    async def set(self, db: AsyncIOMotorDatabase, key: str, value: Any, updated_by: Optional[str] = None):
+        """Write a setting and drop this worker's cached copy"""
+        await db.system_settings.update_one(
+            {"key": key},
+            {
+                "$set": {
+                    "key": key,
+                    "value": value,
+                    "updated_by": updated_by,
+                    "updated_at": datetime.utcnow().isoformat()
+                }
+            },
+            upsert=True
+        )
+        self._cache.invalidate(key)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+# Global instance (one cache per worker)
+system_settings = SystemSettings(ttl_seconds=settings.SYSTEM_SETTINGS_CACHE_SECONDS)
@@ -0,0 +1,80 @@
+"""
+Local fake Razorpay API for tests and benchmarks
+Implements the subset of the Orders API used by the wallet gateway.
+
+Usage:
+    python fake_razorpay_server.py [port]
+
+Then point the backend at it:
+    RAZORPAY_API_URL=http://127.0.0.1:9010/v1
+
+Environment knobs:
+    FAKE_RAZORPAY_LATENCY_MS=150      # simulated gateway latency
+    FAKE_RAZORPAY_FAILURE_RATE=0.1    # fraction of requests answered with HTTP 503
+"""
+import asyncio
+import os
+import random
+import secrets
+import sys
+import time
+from fastapi import FastAPI, HTTPException, Request
+import uvicorn
+
+
+LATENCY_MS = float(os.getenv("FAKE_RAZORPAY_LATENCY_MS", "0"))
+FAILURE_RATE = float(os.getenv("FAKE_RAZORPAY_FAILURE_RATE", "0"))
+
+app = FastAPI(title="Fake Razorpay API")
+orders = {}
+
+
+async def simulate_gateway():
+    """Apply configured latency and random failures"""
+    if LATENCY_MS:
+        await asyncio.sleep(LATENCY_MS / 1000)
+    if FAILURE_RATE and random.random() < FAILURE_RATE:
+        raise HTTPException(status_code=503, detail="Simulated gateway failure")
+
+
+@app.post("/v1/orders")
+async def create_order(request: Request):
+    """Create order (same response shape as Razorpay)"""
+    await simulate_gateway()
+    data = await request.json()
+
+    if not isinstance(data.get("amount"), int) or data["amount"] < 100:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": {"code": "BAD_REQUEST_ERROR", "description": "The amount must be atleast INR 1.00"}}
+        )
+
+    order = {
+        "id": f"order_{secrets.token_hex(7)}",
+        "entity": "order",
+        "amount": data["amount"],
+        "amount_paid": 0,
+        "amount_due": data["amount"],
+        "currency": data.get("currency", "INR"),
+        "receipt": data.get("receipt"),
+        "status": "created",
+        "attempts": 0,
+        "notes": data.get("notes", {}),
+        "created_at": int(time.time())
+    }
+    orders[order["id"]] = order
+    return order
+
+
+@app.get("/v1/orders/{order_id}")
+async def fetch_order(order_id: str):
+    """Fetch order"""
+    await simulate_gateway()
+    if order_id not in orders:
+        raise HTTPException(status_code=400, detail={"error": {"description": "The id provided does not exist"}})
+    return orders[order_id]
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 9010
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
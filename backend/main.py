@@ -7,8 +7,25 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 # Core imports
-from core.database import connect_to_mongo, close_mongo_connection
+from core.database import connect_to_mongo, close_mongo_connection, get_database
+from core.indexes import reconcile_indexes, print_index_report
 from core.config import settings
+from core.hashing import password_hasher
+from core.security import principal_invalidation_listener
+from wallet.gateway import razorpay_gateway
+from wallet.webhooks import RazorpayWebhookWorker
+from bots.outbox import TelegramOutboxDispatcher
+from app.credentials.pool import CredentialPool, report_duplicate_credentials
+from app.credentials.counters import recompute_counters
+from notifications.events import notification_broker
+from notifications.service import NotificationService
+from products.catalog import product_catalog
+from core.scheduler import scheduler
+from app.referrals.stats import reconcile_referral_stats_job
+from subscriptions.jobs import expire_subscriptions_job, renewal_reminders_job
+from app.credentials.jobs import recycle_credentials_job
+from wallet.jobs import sweep_pending_payments_job
+from app.referrals.service import commission_audit_writer
 
 # Router imports
 from auth.routes import router as auth_router
@@ -26,6 +43,18 @@ from app.referrals.routes import router as referrals_router
 from app.admin.referrals import router as admin_referrals_router
 
 
+# Background workers
+telegram_dispatcher = TelegramOutboxDispatcher(get_database)
+razorpay_webhook_worker = RazorpayWebhookWorker(get_database)
+
+# Periodic jobs (each runs on one worker at a time)
+scheduler.add_job("subscription_expiry", settings.SUBSCRIPTION_EXPIRY_INTERVAL_SECONDS, expire_subscriptions_job)
+scheduler.add_job("renewal_reminders", settings.RENEWAL_REMINDER_INTERVAL_SECONDS, renewal_reminders_job)
+scheduler.add_job("credential_recycling", settings.CREDENTIAL_RECYCLE_INTERVAL_SECONDS, recycle_credentials_job)
+scheduler.add_job("referral_stats_reconcile", settings.REFERRAL_STATS_RECONCILE_MINUTES * 60, reconcile_referral_stats_job)
+scheduler.add_job("pending_payment_sweep", settings.PENDING_PAYMENT_SWEEP_INTERVAL_SECONDS, sweep_pending_payments_job)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -34,13 +63,48 @@ async def lifespan(app: FastAPI):
     # Startup
     print("🚀 Starting OTTSONLY backend...")
     await connect_to_mongo()
+    # platform_key first: the unique (platform_key, username) index needs it
+    pool = CredentialPool(get_database())
+    backfilled = await pool.backfill_platform_keys()
+    if backfilled:
+        print(f"Backfilled platform_key on {backfilled} credentials/products")
+    print("Reconciling MongoDB indexes...")
+    index_report = await reconcile_indexes(get_database())
+    print_index_report(index_report)
+    await report_duplicate_credentials(get_database(), index_report)
+    flagged = await pool.backfill_release_pending()
+    if flagged:
+        print(f"Flagged {flagged} ended subscriptions for credential recycling")
+    tagged = await NotificationService(get_database()).backfill_legacy_engagement()
+    if tagged:
+        print(f"Recounted engagement on {tagged} notification history entries")
+    if not await get_database().credential_counters.find_one({}):
+        counters = (await recompute_counters(get_database()))["counters"]
+        print(f"Initialized credential counters for {len(counters)} platforms")
+    telegram_dispatcher.start()
+    razorpay_webhook_worker.start()
+    if settings.SCHEDULER_ENABLED:
+        scheduler.start(get_database)
+    commission_audit_writer.start(get_database)
+    principal_invalidation_listener.start(get_database)
+    notification_broker.configure(get_database)
+    await product_catalog.start(get_database)
     print("✅ All systems ready!")
     
     yield
     
     # Shutdown
     print("🛑 Shutting down OTTSONLY backend...")
+    await telegram_dispatcher.stop()
+    await razorpay_webhook_worker.stop()
+    await scheduler.stop()
+    await commission_audit_writer.stop()
+    await principal_invalidation_listener.stop()
+    await notification_broker.stop()
+    await product_catalog.stop()
     await close_mongo_connection()
+    password_hasher.shutdown()
+    await razorpay_gateway.close()
     print("👋 Goodbye!")
 
 
@@ -114,7 +178,13 @@ async def health_check():
     """
     return {
         "status": "healthy",
-        "app": settings.APP_NAME
+        "app": settings.APP_NAME,
+        "password_hasher": password_hasher.stats(),
+        "notification_stream": notification_broker.stats(),
+        "commission_audit_writer": commission_audit_writer.stats(),
+        "principal_invalidations": principal_invalidation_listener.stats(),
+        "product_catalog": product_catalog.stats(),
+        "razorpay_webhooks": razorpay_webhook_worker.stats()
     }
 
 
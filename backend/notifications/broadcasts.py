@@ -0,0 +1,108 @@
+"""
+Broadcast notifications
+
+A bulk send stores one ``broadcasts`` document instead of a copy per user.
+Whether a broadcast reaches a user is decided at read time from the
+audience rules below; per-user state (read / clicked / deleted) lives in
+``broadcast_receipts``, written only when the user acts on a broadcast.
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+
+# How far back the "new" audience reaches
+NEW_USER_WINDOW = timedelta(days=7)
+
+# Audiences everyone qualifies for
+OPEN_AUDIENCES = ["all", "custom"]
+
+
+def audience_user_query(target_audience: str, sent_at: Optional[datetime] = None) -> dict:
+    """Users query for a target audience (used to count recipients at send time)"""
+    if target_audience == "active":
+        # Users with active subscriptions
+        return {"subscription_status": "active"}
+    if target_audience == "inactive":
+        # Users without active subscriptions
+        return {"$or": [
+            {"subscription_status": {"$ne": "active"}},
+            {"subscription_status": {"$exists": False}}
+        ]}
+    if target_audience == "premium":
+        # Premium tier users
+        return {"tier": "premium"}
+    if target_audience == "new":
+        # Users created in last 7 days
+        since = (sent_at or datetime.utcnow()) - NEW_USER_WINDOW
+        return {"created_at": {"$gte": since.isoformat()}}
+    # "all" or "custom" - no filter
+    return {}
+
+
+def user_audiences(user: dict) -> List[str]:
+    """Audiences (other than "new") the user currently belongs to"""
+    audiences = list(OPEN_AUDIENCES)
+    audiences.append("active" if user.get("subscription_status") == "active" else "inactive")
+    if user.get("tier") == "premium":
+        audiences.append("premium")
+    return audiences
+
+
+def broadcast_query(user: dict, exclude_ids: list = None) -> dict:
+    """
+    Broadcasts that reach `user`
+
+    Only broadcasts sent after the user registered (the old fan-out only
+    reached existing users), in one of the user's audiences or, for "new",
+    sent within the user's first 7 days.
+    """
+    or_clauses = [{"target_audience": {"$in": user_audiences(user)}}]
+    query = {}
+
+    created_at = user.get("created_at")
+    if created_at:
+        query["created_at"] = {"$gte": created_at}
+        try:
+            new_until = (datetime.fromisoformat(created_at) + NEW_USER_WINDOW).isoformat()
+            or_clauses.append({"target_audience": "new", "created_at": {"$lte": new_until}})
+        except ValueError:
+            pass
+
+    query["$or"] = or_clauses
+    if exclude_ids:
+        query["_id"] = {"$nin": exclude_ids}
+    return query
+
+
+def broadcast_as_notification(broadcast: dict, user_id: str, is_read: bool) -> dict:
+    """Shape a broadcast like a per-user notification"""
+    return {
+        "_id": str(broadcast["_id"]),
+        "user_id": user_id,
+        "title": broadcast["title"],
+        "message": broadcast["message"],
+        "type": broadcast.get("type", "info"),
+        "action_url": broadcast.get("action_url"),
+        "priority": broadcast.get("priority", "normal"),
+        "is_read": is_read,
+        "is_broadcast": True,
+        "created_at": broadcast["created_at"]
+    }
+
+
+def broadcast_reaches(user: dict, broadcast: dict) -> bool:
+    """In-memory version of broadcast_query for a single broadcast"""
+    created_at = user.get("created_at")
+    sent_at = broadcast.get("created_at", "")
+    if created_at and sent_at < created_at:
+        return False
+
+    audience = broadcast.get("target_audience", "all")
+    if audience in user_audiences(user):
+        return True
+    if audience == "new" and created_at:
+        try:
+            return sent_at <= (datetime.fromisoformat(created_at) + NEW_USER_WINDOW).isoformat()
+        except ValueError:
+            return False
+    return False
@@ -0,0 +1,184 @@
+"""
+Notification push events
+
+Writers call ``publish_event`` which appends to the ``notification_events``
+collection (short TTL). Each uvicorn worker runs one tailer task that polls
+that collection and fans events out to the SSE connections open on that
+worker through an in-process broker, so every worker sees every event and
+an idle connection costs no database queries. The tailer only runs while
+the worker has subscribers.
+
+Each poll pages forward by (created_at, _id) from POLL_OVERLAP before the
+newest event seen and keeps reading until a page comes back short, so a
+burst larger than one page can't stall it. Ids dispatched within the
+overlap window are remembered to skip the re-read events.
+"""
+import asyncio
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Set
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from core.config import settings
+
+
+# Events are only needed until every worker's tailer has seen them
+EVENT_RETENTION = timedelta(minutes=10)
+
+# Re-read this far back on each poll: ObjectIds/clocks from different
+# workers aren't strictly ordered, duplicates are filtered by id
+POLL_OVERLAP = timedelta(seconds=5)
+
+# Events per tailer query
+POLL_PAGE_SIZE = 500
+
+
+async def publish_event(db: AsyncIOMotorDatabase, event_type: str, data: dict, user_id: Optional[str] = None):
+    """
+    Publish a notification event
+
+    - **user_id**: recipient, None for broadcasts (every connection decides
+      whether the broadcast reaches its user)
+    """
+    now = datetime.utcnow()
+    try:
+        await db.notification_events.insert_one({
+            "user_id": user_id,
+            "type": event_type,
+            "data": data,
+            "created_at": now,
+            "expires_at": now + EVENT_RETENTION
+        })
+    except Exception as e:
+        # Push is best effort, clients resync unread counts on reconnect
+        print(f"Failed to publish notification event: {e}")
+
+
+class NotificationBroker:
+    """In-process pub/sub for SSE connections, fed by a polling tailer"""
+
+    def __init__(self, poll_seconds: float, queue_size: int = 100):
+        self.poll_seconds = poll_seconds
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._broadcast_subscribers: Set[asyncio.Queue] = set()
+        self._get_db: Optional[Callable[[], AsyncIOMotorDatabase]] = None
+        self._task: Optional[asyncio.Task] = None
+        # (created_at, _id) of events dispatched within the overlap window
+        self._seen = deque()
+        self._seen_ids: Set = set()
+
+        # Metrics
+        self.events_delivered = 0
+        self.events_dropped = 0
+
+    def configure(self, get_db: Callable[[], AsyncIOMotorDatabase]):
+        """Set database accessor (called at startup)"""
+        self._get_db = get_db
+
+    @property
+    def connections(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        """Register a connection for the user's events (and broadcasts)"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        self._broadcast_subscribers.add(queue)
+        if self._task is None and self._get_db is not None:
+            self._task = asyncio.create_task(self._tail())
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        """Remove a connection; the tailer stops with the last one"""
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+        self._broadcast_subscribers.discard(queue)
+
+    def _deliver(self, queue: asyncio.Queue, event: dict):
+        try:
+            queue.put_nowait(event)
+            self.events_delivered += 1
+        except asyncio.QueueFull:
+            # Slow client: drop, it resyncs the count on reconnect
+            self.events_dropped += 1
+
+    def dispatch(self, event: dict):
+        """Fan an event out to this worker's connections"""
+        user_id = event.get("user_id")
+        targets = self._broadcast_subscribers if user_id is None else self._subscribers.get(user_id, ())
+        for queue in list(targets):
+            self._deliver(queue, event)
+
+    def _mark_seen(self, event: dict) -> bool:
+        """Returns False if the event was already dispatched"""
+        if event["_id"] in self._seen_ids:
+            return False
+        self._seen.append((event["created_at"], event["_id"]))
+        self._seen_ids.add(event["_id"])
+        return True
+
+    def _forget_seen(self, before: datetime):
+        """Drop ids older than the next poll's window, they can't be read again"""
+        while self._seen and self._seen[0][0] < before:
+            self._seen_ids.discard(self._seen.popleft()[1])
+
+    async def poll(self, since: datetime) -> datetime:
+        """Dispatch events newer than `since` - POLL_OVERLAP, returns the new `since`"""
+        collection = self._get_db().notification_events
+        query = {"created_at": {"$gte": since - POLL_OVERLAP}}
+        while True:
+            events = await collection.find(query).sort(
+                [("created_at", 1), ("_id", 1)]
+            ).limit(POLL_PAGE_SIZE).to_list(length=POLL_PAGE_SIZE)
+            for event in events:
+                since = max(since, event["created_at"])
+                if self._mark_seen(event):
+                    self.dispatch(event)
+            if len(events) < POLL_PAGE_SIZE:
+                break
+            last = events[-1]
+            query = {"$or": [
+                {"created_at": {"$gt": last["created_at"]}},
+                {"created_at": last["created_at"], "_id": {"$gt": last["_id"]}}
+            ]}
+        self._forget_seen(since - POLL_OVERLAP)
+        return since
+
+    async def _tail(self):
+        """Poll notification_events while there are subscribers"""
+        since = datetime.utcnow()
+        try:
+            while self._broadcast_subscribers:
+                try:
+                    since = await self.poll(since)
+                except Exception as e:
+                    print(f"Notification event tailer error: {e}")
+                await asyncio.sleep(self.poll_seconds)
+        finally:
+            self._task = None
+
+    async def stop(self):
+        """Stop the tailer on shutdown"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        """Broker counters"""
+        return {
+            "connections": self.connections,
+            "tailer_running": self._task is not None,
+            "events_delivered": self.events_delivered,
+            "events_dropped": self.events_dropped
+        }
+
+
+# Global broker instance (one per worker)
+notification_broker = NotificationBroker(poll_seconds=settings.NOTIFICATION_EVENTS_POLL_SECONDS)
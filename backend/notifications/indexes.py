@@ -0,0 +1,47 @@
+"""
+Notification indexes
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+
+INDEXES = {
+    "notifications": [
+        # Notification list, unread filter and unread count
+        IndexModel(
+            [("user_id", ASCENDING), ("is_read", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="user_id_is_read_created_at_id"
+        ),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_id_created_at_id"),
+        # Engagement recount of per-user campaign copies
+        IndexModel(
+            [("campaign_id", ASCENDING)],
+            name="campaign_id",
+            partialFilterExpression={"campaign_id": {"$type": "string"}}
+        ),
+    ],
+    "notification_history": [
+        IndexModel([("sent_at", DESCENDING), ("_id", DESCENDING)], name="sent_at_id"),
+        # Counter increments on open / click
+        IndexModel(
+            [("campaign_id", ASCENDING)],
+            name="campaign_id_unique",
+            unique=True,
+            partialFilterExpression={"campaign_id": {"$type": "string"}}
+        ),
+    ],
+    "notification_events": [
+        # Tailer poll (SSE push)
+        IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at_id"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "broadcasts": [
+        # Merged into the notification list newest first
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+    ],
+    "broadcast_receipts": [
+        # One receipt per user and broadcast (upserted)
+        IndexModel([("user_id", ASCENDING), ("broadcast_id", ASCENDING)], name="user_id_broadcast_id_unique", unique=True),
+        # Open / click counts per broadcast
+        IndexModel([("broadcast_id", ASCENDING), ("is_read", ASCENDING)], name="broadcast_id_is_read"),
+    ],
+}
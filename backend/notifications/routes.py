@@ -1,9 +1,16 @@
 """
 Notification API routes
 """
-from fastapi import APIRouter, Depends, Query
+from typing import Optional
+import asyncio
+import json
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from core.config import settings
 from core.database import get_database
-from core.security import get_current_user, require_role
+from core.security import get_current_user, get_principal, require_role
+from .broadcasts import broadcast_reaches
+from .events import notification_broker
 from .schemas import NotificationOut, BulkNotificationRequest
 from .service import NotificationService
 
@@ -13,7 +20,8 @@ router = APIRouter(prefix="/notifications", tags=["Notifications"])
 
 @router.get("/", summary="Get my notifications")
 async def get_notifications(
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
     limit: int = Query(100, ge=1, le=1000),
     unread_only: bool = Query(False, description="Show only unread notifications"),
     current_user: dict = Depends(get_current_user),
@@ -21,11 +29,12 @@ async def get_notifications(
 ):
     """Get authenticated user's notifications"""
     service = NotificationService(db)
-    notifications = await service.get_user_notifications(
+    notifications, next_cursor = await service.get_user_notifications(
         current_user["_id"], 
         skip, 
         limit, 
-        unread_only
+        unread_only,
+        cursor
     )
     
     return {
@@ -37,11 +46,14 @@ async def get_notifications(
                 "message": n["message"],
                 "type": n["type"],
                 "is_read": n["is_read"],
+                "action_url": n.get("action_url"),
+                "is_broadcast": n.get("is_broadcast", False),
                 "created_at": n["created_at"]
             }
             for n in notifications
         ],
-        "count": len(notifications)
+        "count": len(notifications),
+        "next_cursor": next_cursor
     }
 
 
@@ -56,6 +68,64 @@ async def get_unread_count(
     return {"unread_count": count}
 
 
+@router.get("/stream", summary="Notification push stream (SSE)")
+async def notification_stream(
+    request: Request,
+    token: str = Query(..., description="Access token (EventSource can't send an Authorization header)"),
+    db=Depends(get_database)
+):
+    """
+    Server-Sent Events stream of the user's notifications
+    
+    - **unread_count**: full count, sent on connect (and after mark-all-read)
+    - **notification**: new notification or broadcast
+    - **unread_delta**: unread count change, e.g. -1 after a read
+    
+    Replaces polling /notifications/unread-count; reconnect to resync.
+    """
+    current_user = await get_principal(token, db)
+    user_id = current_user["_id"]
+    service = NotificationService(db)
+    unread_count = await service.get_unread_count(user_id)
+    audience_user = await service.get_audience_user(user_id)
+    queue = notification_broker.subscribe(user_id)
+    
+    def sse(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+    
+    async def events():
+        try:
+            yield sse("unread_count", {"unread_count": unread_count})
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(), timeout=settings.NOTIFICATION_STREAM_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                
+                data = event["data"]
+                if event["type"] == "broadcast":
+                    if not broadcast_reaches(audience_user, data):
+                        continue
+                    data = {k: v for k, v in data.items() if k != "target_audience"}
+                    data["user_id"] = user_id
+                    yield sse("notification", data)
+                else:
+                    yield sse(event["type"], data)
+        finally:
+            notification_broker.unsubscribe(user_id, queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/{notification_id}/read", summary="Mark notification as read")
 async def mark_as_read(
     notification_id: str,
@@ -75,6 +145,26 @@ async def mark_as_read(
     }
 
 
+@router.post("/{notification_id}/click", summary="Record notification click")
+async def mark_as_clicked(
+    notification_id: str,
+    current_user: dict = Depends(get_current_user),
+    db=Depends(get_database)
+):
+    """Record that the user opened the notification's action link"""
+    service = NotificationService(db)
+    notification = await service.mark_as_clicked(notification_id, current_user["_id"])
+    
+    return {
+        "message": "Notification click recorded",
+        "notification": {
+            "id": notification["_id"],
+            "is_read": notification["is_read"],
+            "action_url": notification.get("action_url")
+        }
+    }
+
+
 @router.post("/mark-all-read", summary="Mark all notifications as read")
 async def mark_all_as_read(
     current_user: dict = Depends(get_current_user),
@@ -132,18 +222,20 @@ async def send_bulk_notification(
 
 @router.get("/admin/history", summary="Get notification history (Admin only)")
 async def get_notification_history(
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
     limit: int = Query(50, ge=1, le=100),
     current_user: dict = Depends(require_role(["admin"])),
     db=Depends(get_database)
 ):
     """Get notification send history for admin"""
     service = NotificationService(db)
-    history = await service.get_notification_history(skip, limit)
+    history, next_cursor = await service.get_notification_history(skip, limit, cursor)
     
     return {
         "history": history,
-        "count": len(history)
+        "count": len(history),
+        "next_cursor": next_cursor
     }
 
 
@@ -157,3 +249,15 @@ async def get_notification_stats(
     stats = await service.get_notification_stats()
     
     return stats
+
+
+@router.post("/admin/stats/recompute", summary="Recompute engagement counters (Admin only)")
+async def recompute_notification_stats(
+    current_user: dict = Depends(require_role(["admin"])),
+    db=Depends(get_database)
+):
+    """Rebuild open/click counters on notification history from receipts"""
+    service = NotificationService(db)
+    updated = await service.recompute_engagement()
+    
+    return {"message": "Engagement counters recomputed", "updated": updated}
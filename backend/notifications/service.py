@@ -5,6 +5,15 @@ from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from fastapi import HTTPException, status
+from pymongo import ReturnDocument, UpdateMany, UpdateOne
+from core.leases import acquire_lease, release_lease
+from core.pagination import paginate, merge_pages
+from .broadcasts import audience_user_query, broadcast_query, broadcast_as_notification
+from .events import publish_event
+
+
+# Startup tagging of pre-campaign history (one worker at a time)
+LEGACY_ENGAGEMENT_LEASE = "notification_legacy_engagement"
 
 
 class NotificationService:
@@ -27,6 +36,8 @@ class NotificationService:
         result = await self.db.notifications.insert_one(notification)
         notification["_id"] = str(result.inserted_id)
         
+        await publish_event(self.db, "notification", notification, user_id=user_id)
+        
         return notification
     
     async def get_user_notifications(
@@ -34,55 +45,189 @@ class NotificationService:
         user_id: str, 
         skip: int = 0, 
         limit: int = 100, 
-        unread_only: bool = False
-    ) -> list:
-        """Get user's notifications"""
+        unread_only: bool = False,
+        cursor: str = None
+    ) -> tuple:
+        """
+        Get user's notifications, returns (notifications, next_cursor)
+        Personal notifications and broadcasts are merged newest first
+        """
         query = {"user_id": user_id}
         if unread_only:
             query["is_read"] = False
         
-        cursor = self.db.notifications.find(query).sort("created_at", -1).skip(skip).limit(limit)
-        notifications = await cursor.to_list(length=limit)
+        # Both sources are read with the same cursor, the deprecated skip is
+        # applied to the merged stream
+        fetch_limit = limit if cursor else skip + limit
+        personal = await paginate(self.db.notifications, query, fetch_limit, cursor)
+        
+        receipts = await self._get_receipts(user_id)
+        hidden = [
+            broadcast_id for broadcast_id, receipt in receipts.items()
+            if receipt.get("deleted") or (unread_only and receipt.get("is_read"))
+        ]
+        user = await self.get_audience_user(user_id)
+        broadcasts = await paginate(self.db.broadcasts, broadcast_query(user, hidden), fetch_limit, cursor)
+        
+        items, next_cursor = merge_pages([personal, broadcasts], limit, 0 if cursor else skip)
         
-        for notif in notifications:
-            notif["_id"] = str(notif["_id"])
+        notifications = []
+        for item in items:
+            if "target_audience" in item:
+                receipt = receipts.get(item["_id"], {})
+                notifications.append(broadcast_as_notification(item, user_id, receipt.get("is_read", False)))
+            else:
+                item["_id"] = str(item["_id"])
+                notifications.append(item)
         
-        return notifications
+        return notifications, next_cursor
     
-    async def mark_as_read(self, notification_id: str, user_id: str) -> dict:
-        """Mark notification as read"""
+    async def get_audience_user(self, user_id: str) -> dict:
+        """User fields that decide which broadcasts reach them"""
+        user = await self.db.users.find_one(
+            {"_id": ObjectId(user_id)},
+            {"created_at": 1, "subscription_status": 1, "tier": 1}
+        )
+        return user or {}
+    
+    async def _get_receipts(self, user_id: str) -> dict:
+        """User's broadcast receipts by broadcast id"""
+        receipts = await self.db.broadcast_receipts.find(
+            {"user_id": user_id},
+            {"broadcast_id": 1, "is_read": 1, "clicked": 1, "deleted": 1}
+        ).to_list(length=None)
+        return {r["broadcast_id"]: r for r in receipts}
+    
+    async def _find_broadcast_for_user(self, notification_id: str, user_id: str) -> dict:
+        """Broadcast with this id if it reaches the user (404 otherwise)"""
         try:
-            result = await self.db.notifications.update_one(
-                {"_id": ObjectId(notification_id), "user_id": user_id},
-                {"$set": {"is_read": True}}
-            )
+            broadcast_id = ObjectId(notification_id)
         except:
             raise HTTPException(status_code=400, detail="Invalid notification ID")
         
-        if result.matched_count == 0:
+        user = await self.get_audience_user(user_id)
+        query = broadcast_query(user)
+        query["_id"] = broadcast_id
+        broadcast = await self.db.broadcasts.find_one(query)
+        if not broadcast:
             raise HTTPException(status_code=404, detail="Notification not found")
+        return broadcast
+    
+    async def _set_receipt(self, broadcast_id: ObjectId, user_id: str, fields: dict) -> dict:
+        """Record per-user state for a broadcast, returns the previous receipt"""
+        previous = await self.db.broadcast_receipts.find_one_and_update(
+            {"broadcast_id": broadcast_id, "user_id": user_id},
+            {"$set": {**fields, "updated_at": datetime.utcnow().isoformat()}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        return previous or {}
+    
+    async def _count_engagement(self, campaign_id: str, previous: dict, fields: dict):
+        """
+        Increment the campaign's materialized open/click counters
+        Only for state that changed (previous is the document before the update)
+        """
+        inc = {}
+        if fields.get("is_read") and not previous.get("is_read"):
+            inc["opened_count"] = 1
+        if fields.get("clicked") and not previous.get("clicked"):
+            inc["clicked_count"] = 1
+        if campaign_id and inc:
+            await self.db.notification_history.update_one({"campaign_id": campaign_id}, {"$inc": inc})
+    
+    async def _publish_read(self, user_id: str, notification_id: str, previous: dict, fields: dict):
+        """Push an unread count delta when a notification stops being unread"""
+        if previous.get("is_read") or previous.get("deleted"):
+            return
+        if fields.get("is_read") or fields.get("deleted"):
+            await publish_event(
+                self.db, "unread_delta", {"delta": -1, "notification_id": notification_id}, user_id=user_id
+            )
+    
+    async def _update_engagement(self, notification_id: str, user_id: str, fields: dict) -> dict:
+        """Set read/clicked on a notification or broadcast receipt and count it"""
+        try:
+            previous = await self.db.notifications.find_one_and_update(
+                {"_id": ObjectId(notification_id), "user_id": user_id},
+                {"$set": fields},
+                return_document=ReturnDocument.BEFORE
+            )
+        except:
+            raise HTTPException(status_code=400, detail="Invalid notification ID")
         
-        notification = await self.db.notifications.find_one({"_id": ObjectId(notification_id)})
-        notification["_id"] = str(notification["_id"])
+        if previous:
+            await self._count_engagement(previous.get("campaign_id"), previous, fields)
+            await self._publish_read(user_id, notification_id, previous, fields)
+            notification = {**previous, **fields, "_id": str(previous["_id"])}
+            return notification
         
-        return notification
+        broadcast = await self._find_broadcast_for_user(notification_id, user_id)
+        previous = await self._set_receipt(broadcast["_id"], user_id, fields)
+        await self._count_engagement(str(broadcast["_id"]), previous, fields)
+        await self._publish_read(user_id, notification_id, previous, fields)
+        return broadcast_as_notification(broadcast, user_id, True)
+    
+    async def mark_as_read(self, notification_id: str, user_id: str) -> dict:
+        """Mark notification (or broadcast) as read"""
+        return await self._update_engagement(notification_id, user_id, {"is_read": True})
+    
+    async def mark_as_clicked(self, notification_id: str, user_id: str) -> dict:
+        """Record a click on a notification's action (also marks it read)"""
+        return await self._update_engagement(notification_id, user_id, {"is_read": True, "clicked": True})
     
     async def mark_all_as_read(self, user_id: str) -> int:
-        """Mark all notifications as read for a user"""
+        """Mark all notifications and broadcasts as read for a user"""
+        # Campaign copies about to be opened, counted per campaign
+        opened_by_campaign = await self.db.notifications.aggregate([
+            {"$match": {"user_id": user_id, "is_read": False, "campaign_id": {"$exists": True}}},
+            {"$group": {"_id": "$campaign_id", "opened": {"$sum": 1}}}
+        ]).to_list(length=None)
+        
         result = await self.db.notifications.update_many(
             {"user_id": user_id, "is_read": False},
             {"$set": {"is_read": True}}
         )
         
-        return result.modified_count
+        receipts = await self._get_receipts(user_id)
+        seen = [bid for bid, r in receipts.items() if r.get("is_read") or r.get("deleted")]
+        user = await self.get_audience_user(user_id)
+        unread = await self.db.broadcasts.find(broadcast_query(user, seen), {"_id": 1}).to_list(length=None)
+        
+        now = datetime.utcnow().isoformat()
+        if unread:
+            await self.db.broadcast_receipts.bulk_write([
+                UpdateOne(
+                    {"broadcast_id": b["_id"], "user_id": user_id},
+                    {"$set": {"is_read": True, "updated_at": now}},
+                    upsert=True
+                )
+                for b in unread
+            ], ordered=False)
+        
+        counters = [UpdateOne({"campaign_id": c["_id"]}, {"$inc": {"opened_count": c["opened"]}}) for c in opened_by_campaign]
+        counters += [UpdateOne({"campaign_id": str(b["_id"])}, {"$inc": {"opened_count": 1}}) for b in unread]
+        if counters:
+            await self.db.notification_history.bulk_write(counters, ordered=False)
+        
+        marked = result.modified_count + len(unread)
+        if marked:
+            await publish_event(self.db, "unread_count", {"unread_count": 0}, user_id=user_id)
+        
+        return marked
     
     async def get_unread_count(self, user_id: str) -> int:
-        """Get count of unread notifications"""
+        """Get count of unread notifications (including broadcasts)"""
         count = await self.db.notifications.count_documents({
             "user_id": user_id,
             "is_read": False
         })
         
+        receipts = await self._get_receipts(user_id)
+        seen = [bid for bid, r in receipts.items() if r.get("is_read") or r.get("deleted")]
+        user = await self.get_audience_user(user_id)
+        count += await self.db.broadcasts.count_documents(broadcast_query(user, seen))
+        
         return count
     
     async def send_bulk_notification(
@@ -94,95 +239,85 @@ class NotificationService:
         action_url: str = None,
         priority: str = "normal"
     ) -> int:
-        """Send notification to users based on target audience"""
-        # Build user query based on target audience
-        user_query = {}
-        
-        if target_audience == "active":
-            # Users with active subscriptions
-            user_query = {"subscription_status": "active"}
-        elif target_audience == "inactive":
-            # Users without active subscriptions
-            user_query = {"$or": [
-                {"subscription_status": {"$ne": "active"}},
-                {"subscription_status": {"$exists": False}}
-            ]}
-        elif target_audience == "premium":
-            # Premium tier users
-            user_query = {"tier": "premium"}
-        elif target_audience == "new":
-            # Users created in last 7 days
-            from datetime import timedelta
-            seven_days_ago = (datetime.utcnow() - timedelta(days=7)).isoformat()
-            user_query = {"created_at": {"$gte": seven_days_ago}}
-        # else "all" or "custom" - no filter
-        
-        # Get target users
-        cursor = self.db.users.find(user_query, {"_id": 1})
-        users = await cursor.to_list(length=None)
-        
-        if not users:
+        """
+        Send notification to users based on target audience
+        Stores one broadcast (audience is resolved when users read it)
+        """
+        now = datetime.utcnow()
+        recipients_count = await self.db.users.count_documents(audience_user_query(target_audience, now))
+        
+        if not recipients_count:
             return 0
         
-        # Create notifications for all target users
-        notifications = [
-            {
-                "user_id": str(user["_id"]),
-                "title": title,
-                "message": message,
-                "type": type,
-                "action_url": action_url,
-                "priority": priority,
-                "is_read": False,
-                "created_at": datetime.utcnow().isoformat()
-            }
-            for user in users
-        ]
+        broadcast = {
+            "title": title,
+            "message": message,
+            "type": type,
+            "action_url": action_url,
+            "priority": priority,
+            "target_audience": target_audience,
+            "recipients_count": recipients_count,
+            "created_at": now.isoformat()
+        }
+        result = await self.db.broadcasts.insert_one(broadcast)
         
-        result = await self.db.notifications.insert_many(notifications)
+        # Every open stream checks whether the broadcast reaches its user
+        await publish_event(self.db, "broadcast", {
+            **broadcast_as_notification(broadcast, None, False),
+            "target_audience": target_audience
+        })
         
-        # Store notification send history
+        # Store notification send history (engagement counters are
+        # incremented as recipients open / click)
         history_entry = {
+            "campaign_id": str(result.inserted_id),
+            "broadcast_id": str(result.inserted_id),
             "title": title,
             "message": message,
             "type": type,
             "target_audience": target_audience,
             "action_url": action_url,
             "priority": priority,
-            "recipients_count": len(result.inserted_ids),
-            "sent_at": datetime.utcnow().isoformat()
+            "recipients_count": recipients_count,
+            "opened_count": 0,
+            "clicked_count": 0,
+            "sent_at": now.isoformat()
         }
         await self.db.notification_history.insert_one(history_entry)
         
-        return len(result.inserted_ids)
+        return recipients_count
     
-    async def get_notification_history(self, skip: int = 0, limit: int = 50) -> list:
-        """Get notification send history"""
-        cursor = self.db.notification_history.find({}).sort("sent_at", -1).skip(skip).limit(limit)
-        history = await cursor.to_list(length=limit)
+    async def get_notification_history(self, skip: int = 0, limit: int = 50, cursor: str = None) -> tuple:
+        """
+        Get notification send history, returns (history, next_cursor)
+        Open/click counts are materialized on each entry (one query per page)
+        """
+        history, next_cursor = await paginate(
+            self.db.notification_history, {}, limit, cursor, skip, sort_field="sent_at"
+        )
         
         for entry in history:
             entry["_id"] = str(entry["_id"])
-            
-            # Calculate open and click rates
-            notifications = await self.db.notifications.find({
-                "title": entry["title"],
-                "created_at": entry["sent_at"]
-            }).to_list(length=None)
-            
-            opened_count = sum(1 for n in notifications if n.get("is_read", False))
-            clicked_count = sum(1 for n in notifications if n.get("clicked", False))
-            
-            entry["opened_count"] = opened_count
-            entry["clicked_count"] = clicked_count
-        
-        return history
+            entry.setdefault("opened_count", 0)
+            entry.setdefault("clicked_count", 0)
+        
+        return history, next_cursor
     
     async def get_notification_stats(self) -> dict:
-        """Get notification statistics"""
-        total_sent = await self.db.notifications.count_documents({})
-        total_opened = await self.db.notifications.count_documents({"is_read": True})
-        total_clicked = await self.db.notifications.count_documents({"clicked": True})
+        """Get notification statistics (one aggregation over send history)"""
+        totals = await self.db.notification_history.aggregate([
+            {"$group": {
+                "_id": None,
+                "total_sent": {"$sum": {"$ifNull": ["$recipients_count", 0]}},
+                "total_opened": {"$sum": {"$ifNull": ["$opened_count", 0]}},
+                "total_clicked": {"$sum": {"$ifNull": ["$clicked_count", 0]}}
+            }}
+        ]).to_list(length=1)
+        totals = totals[0] if totals else {}
+        
+        total_sent = totals.get("total_sent", 0)
+        total_opened = totals.get("total_opened", 0)
+        total_clicked = totals.get("total_clicked", 0)
         
         open_rate = (total_opened / total_sent * 100) if total_sent > 0 else 0
         click_rate = (total_clicked / total_sent * 100) if total_sent > 0 else 0
@@ -195,17 +330,94 @@ class NotificationService:
             "click_rate": round(click_rate, 1)
         }
     
+    async def recompute_engagement(self) -> int:
+        """
+        Rebuild the materialized open/click counters from source data
+        
+        Tags per-user copies from before broadcasts with their campaign id,
+        then recounts with one $group per source. Returns entries updated.
+        """
+        # Legacy history rows: copies were matched by title + send time
+        legacy = await self.db.notification_history.find(
+            {"campaign_id": {"$exists": False}},
+            {"title": 1, "sent_at": 1}
+        ).to_list(length=None)
+        for entry in legacy:
+            campaign_id = str(entry["_id"])
+            await self.db.notifications.update_many(
+                {"title": entry["title"], "created_at": entry["sent_at"], "campaign_id": {"$exists": False}},
+                {"$set": {"campaign_id": campaign_id}}
+            )
+            await self.db.notification_history.update_one(
+                {"_id": entry["_id"]}, {"$set": {"campaign_id": campaign_id}}
+            )
+        
+        counts = {}
+        receipt_counts = await self.db.broadcast_receipts.aggregate([
+            {"$group": {
+                "_id": "$broadcast_id",
+                "opened": {"$sum": {"$cond": [{"$eq": ["$is_read", True]}, 1, 0]}},
+                "clicked": {"$sum": {"$cond": [{"$eq": ["$clicked", True]}, 1, 0]}}
+            }}
+        ]).to_list(length=None)
+        copy_counts = await self.db.notifications.aggregate([
+            {"$match": {"campaign_id": {"$exists": True}}},
+            {"$group": {
+                "_id": "$campaign_id",
+                "opened": {"$sum": {"$cond": [{"$eq": ["$is_read", True]}, 1, 0]}},
+                "clicked": {"$sum": {"$cond": [{"$eq": ["$clicked", True]}, 1, 0]}}
+            }}
+        ]).to_list(length=None)
+        for row in receipt_counts + copy_counts:
+            counts[str(row["_id"])] = row
+        
+        updates = [
+            UpdateOne(
+                {"campaign_id": campaign_id},
+                {"$set": {"opened_count": row["opened"], "clicked_count": row["clicked"]}}
+            )
+            for campaign_id, row in counts.items()
+        ]
+        updates.append(UpdateMany(
+            {"campaign_id": {"$nin": list(counts)}},
+            {"$set": {"opened_count": 0, "clicked_count": 0}}
+        ))
+        result = await self.db.notification_history.bulk_write(updates, ordered=False)
+        
+        return result.modified_count
+    
+    async def backfill_legacy_engagement(self) -> int:
+        """
+        Tag and recount history sent before campaign counters (startup)
+        Without a campaign_id their copies' opens / clicks are never counted.
+        Runs recompute_engagement once, on one worker; a no-op afterwards.
+        Returns entries updated.
+        """
+        if not await self.db.notification_history.find_one({"campaign_id": {"$exists": False}}, {"_id": 1}):
+            return 0
+        if not await acquire_lease(self.db, LEGACY_ENGAGEMENT_LEASE, ttl_seconds=600):
+            # Another worker is on it
+            return 0
+        try:
+            return await self.recompute_engagement()
+        finally:
+            await release_lease(self.db, LEGACY_ENGAGEMENT_LEASE)
+    
     async def delete_notification(self, notification_id: str, user_id: str) -> bool:
         """Delete a notification"""
         try:
-            result = await self.db.notifications.delete_one({
+            deleted = await self.db.notifications.find_one_and_delete({
                 "_id": ObjectId(notification_id),
                 "user_id": user_id
-            })
+            }, projection={"is_read": 1})
         except:
             raise HTTPException(status_code=400, detail="Invalid notification ID")
         
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=404, detail="Notification not found")
+        if deleted is None:
+            # Broadcasts are hidden for this user only
+            broadcast = await self._find_broadcast_for_user(notification_id, user_id)
+            deleted = await self._set_receipt(broadcast["_id"], user_id, {"deleted": True})
+        
+        await self._publish_read(user_id, notification_id, deleted, {"deleted": True})
         
         return True
@@ -0,0 +1,208 @@
+"""
+Order engine
+
+Runs a wallet purchase as a single pass over the database:
+
+    reserve stock -> debit wallet -> claim credentials + insert subscription
+    -> insert ledger entry -> insert completed order
+
+On a replica set every stage runs inside one multi-document transaction, so
+a failure anywhere leaves nothing behind. On a standalone server (local
+development) the same stages run with compensating actions instead.
+Ids are allocated up front, each write returns the document the next stage
+needs, and per-stage timings are recorded on the order.
+"""
+import time
+from datetime import datetime
+from typing import Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from core.database import supports_transactions
+from app.credentials.pool import CredentialPool, is_pooled
+from subscriptions.service import SubscriptionService, buyer_info
+from products.catalog import product_catalog
+
+
+class OrderEngine:
+    """Single-pass wallet purchase pipeline"""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        self.subscription_service = SubscriptionService(db)
+
+    async def place_order(self, user_id: str, product_id: str) -> Tuple[dict, dict, dict]:
+        """
+        Buy a product with wallet balance
+        Returns (order, subscription, product)
+        """
+        try:
+            product_oid = ObjectId(product_id)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid product ID")
+
+        if await supports_transactions(self.db):
+            async with await self.db.client.start_session() as session:
+                # with_transaction retries the whole pass on transient errors
+                # (e.g. write conflicts between concurrent buyers)
+                return await session.with_transaction(
+                    lambda s: self._run(user_id, product_oid, s)
+                )
+        return await self._run(user_id, product_oid, None)
+
+    async def _run(self, user_id: str, product_oid: ObjectId, session) -> Tuple[dict, dict, dict]:
+        """Run all stages; without a session, undo completed stages on failure"""
+        order_id = ObjectId()
+        subscription_id = ObjectId()
+        timings = {}
+        undo = []
+        clock = time.perf_counter()
+
+        def lap(stage: str):
+            nonlocal clock
+            now = time.perf_counter()
+            timings[stage] = round((now - clock) * 1000, 2)
+            clock = now
+
+        try:
+            product = await self._reserve_stock(product_oid, session)
+            if not is_pooled(product):
+                undo.append(("restore stock", lambda: self.db.products.update_one(
+                    {"_id": product_oid}, {"$inc": {"stock": 1}}
+                )))
+            lap("reserve_stock")
+
+            price = product["price"]
+            user = await self._debit_wallet(user_id, price, session)
+            undo.append(("refund wallet", lambda: self.db.users.update_one(
+                {"_id": ObjectId(user_id)}, {"$inc": {"wallet_balance": price}}
+            )))
+            lap("debit_wallet")
+
+            subscription = await self.subscription_service.create_subscription(
+                user_id,
+                str(product_oid),
+                str(order_id),
+                product=product,
+                user_info=buyer_info(user),
+                subscription_id=subscription_id,
+                session=session
+            )
+            undo.append(("delete subscription", lambda: self.db.subscriptions.delete_one(
+                {"_id": subscription_id}
+            )))
+            undo.append(("release credentials", lambda: CredentialPool(self.db).release_subscription(
+                str(subscription_id)
+            )))
+            lap("create_subscription")
+
+            now = datetime.utcnow().isoformat()
+            product_name = f"{product['platform_name']} - {product['plan_name']}"
+            wallet_txn = {
+                "user_id": user_id,
+                "type": "debit",
+                "amount": price,
+                "balance_after": user["wallet_balance"],
+                "reference_type": "order",
+                "reference_id": str(order_id),
+                "description": f"Payment for {product_name}",
+                "created_at": now
+            }
+            txn_result = await self.db.wallet_transactions.insert_one(wallet_txn, session=session)
+            undo.append(("delete ledger entry", lambda: self.db.wallet_transactions.delete_one(
+                {"_id": txn_result.inserted_id}
+            )))
+            lap("insert_ledger")
+
+            # Order is written once, already completed (no pending -> paid -> completed updates)
+            order = {
+                "_id": order_id,
+                "user_id": user_id,
+                "product_id": str(product_oid),
+                "product_name": product_name,
+                "amount": price,
+                "status": "completed",
+                "subscription_id": str(subscription_id),
+                "pipeline_timings_ms": timings,
+                "transactional": session is not None,
+                "created_at": now,
+                "paid_at": now,
+                "updated_at": now
+            }
+            await self.db.orders.insert_one(order, session=session)
+            lap("insert_order")
+        except Exception:
+            if session is None:
+                await self._compensate(undo)
+            raise
+
+        order["_id"] = str(order_id)
+        product["_id"] = str(product_oid)
+        return order, subscription, product
+
+    async def _reserve_stock(self, product_oid: ObjectId, session) -> dict:
+        """
+        Take one unit of stock, returns the product
+
+        Credential-backed products have no stored stock to take: the
+        credential claim in create_subscription is the reservation. Other
+        products atomically decrement products.stock.
+        """
+        # Catalog snapshot saves the read; unknown ids (e.g. created on
+        # another worker since the last poll) fall back to the database
+        cached = product_catalog.get(str(product_oid))
+        if cached is not None:
+            product = {**cached, "_id": product_oid}
+        else:
+            product = await self.db.products.find_one({"_id": product_oid}, session=session)
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        if not product.get("is_active", False):
+            raise HTTPException(status_code=400, detail="Product is not available")
+        if is_pooled(product):
+            return product
+
+        product = await self.db.products.find_one_and_update(
+            {"_id": product_oid, "is_active": True, "stock": {"$gte": 1}},
+            {"$inc": {"stock": -1}},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if not product:
+            raise HTTPException(status_code=400, detail="Product out of stock")
+        return product
+
+    async def _debit_wallet(self, user_id: str, amount: float, session) -> dict:
+        """Atomically deduct wallet balance, returns buyer info and new balance"""
+        user = await self.db.users.find_one_and_update(
+            {
+                "_id": ObjectId(user_id),
+                "wallet_balance": {"$gte": amount}  # Atomic balance check
+            },
+            {
+                "$inc": {"wallet_balance": -amount},
+                "$set": {"updated_at": datetime.utcnow().isoformat()}
+            },
+            projection={"name": 1, "email": 1, "phone": 1, "wallet_balance": 1},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if user:
+            return user
+
+        existing = await self.db.users.find_one({"_id": ObjectId(user_id)}, {"wallet_balance": 1}, session=session)
+        if not existing:
+            raise HTTPException(status_code=404, detail="User not found")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient wallet balance. Required: ₹{amount}, Available: ₹{existing.get('wallet_balance', 0.0)}"
+        )
+
+    async def _compensate(self, undo: list):
+        """Undo completed stages in reverse order (no-transaction mode)"""
+        for name, action in reversed(undo):
+            try:
+                await action()
+            except Exception as e:
+                print(f"Order rollback step '{name}' failed: {e}")
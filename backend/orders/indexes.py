@@ -0,0 +1,14 @@
+"""
+Order indexes
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+
+INDEXES = {
+    "orders": [
+        # My orders page
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_id_created_at_id"),
+        # Admin order list
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+    ]
+}
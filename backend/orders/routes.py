@@ -1,8 +1,10 @@
 """
 Order API routes
 """
-from fastapi import APIRouter, Depends, Query
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, Query, Response
 from core.database import get_database
+from core.idempotency import run_idempotent, IDEMPOTENCY_HEADER
 from core.security import get_current_user, require_role
 from .schemas import OrderCreate, OrderOut, RefundRequest
 from .service import OrderService
@@ -14,6 +16,8 @@ router = APIRouter(prefix="/orders", tags=["Orders"])
 @router.post("/", response_model=OrderOut, summary="Create order")
 async def create_order(
     request: OrderCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
     current_user: dict = Depends(get_current_user),
     db=Depends(get_database)
 ):
@@ -25,33 +29,41 @@ async def create_order(
     - Reduces stock
     - Creates subscription
     - Returns order details
+    - Retries with the same Idempotency-Key header return the original order
     """
     service = OrderService(db)
-    order = await service.create_order(current_user["_id"], request.product_id)
     
-    return {
-        "id": order["_id"],
-        "user_id": order["user_id"],
-        "product_id": order["product_id"],
-        "product_name": order["product_name"],
-        "amount": order["amount"],
-        "status": order["status"],
-        "subscription_id": order.get("subscription_id"),
-        "created_at": order["created_at"],
-        "paid_at": order.get("paid_at")
-    }
+    async def place_order() -> dict:
+        order = await service.create_order(current_user["_id"], request.product_id)
+        return {
+            "id": order["_id"],
+            "user_id": order["user_id"],
+            "product_id": order["product_id"],
+            "product_name": order["product_name"],
+            "amount": order["amount"],
+            "status": order["status"],
+            "subscription_id": order.get("subscription_id"),
+            "created_at": order["created_at"],
+            "paid_at": order.get("paid_at")
+        }
+    
+    return await run_idempotent(
+        db, idempotency_key, current_user["_id"], "orders.create",
+        request.model_dump(), place_order, response
+    )
 
 
 @router.get("/my-orders", summary="Get my orders")
 async def get_my_orders(
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
     limit: int = Query(100, ge=1, le=1000),
     current_user: dict = Depends(get_current_user),
     db=Depends(get_database)
 ):
     """Get authenticated user's orders"""
     service = OrderService(db)
-    orders = await service.list_user_orders(current_user["_id"], skip, limit)
+    orders, next_cursor = await service.list_user_orders(current_user["_id"], skip, limit, cursor)
     
     return {
         "orders": [
@@ -67,20 +79,22 @@ async def get_my_orders(
             }
             for o in orders
         ],
-        "count": len(orders)
+        "count": len(orders),
+        "next_cursor": next_cursor
     }
 
 
 @router.get("/", summary="List all orders (Admin only)")
 async def list_orders(
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
     limit: int = Query(100, ge=1, le=1000),
     current_user: dict = Depends(require_role(["admin", "support"])),
     db=Depends(get_database)
 ):
     """List all orders (admin/support only)"""
     service = OrderService(db)
-    orders = await service.list_all_orders(skip, limit)
+    orders, next_cursor = await service.list_all_orders(skip, limit, cursor)
     
     return {
         "orders": [
@@ -96,7 +110,8 @@ async def list_orders(
             }
             for o in orders
         ],
-        "count": len(orders)
+        "count": len(orders),
+        "next_cursor": next_cursor
     }
 
 
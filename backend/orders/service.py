@@ -5,9 +5,12 @@ from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from fastapi import HTTPException, status
+from core.pagination import paginate
 from products.service import ProductService
-from subscriptions.service import SubscriptionService
-from bots.telegram import telegram_service
+from products.catalog import product_catalog
+from app.credentials.pool import NON_POOLED_PLATFORMS, is_pooled
+from .engine import OrderEngine
+from bots.outbox import enqueue_alert, enqueue_alerts
 
 
 class OrderService:
@@ -20,163 +23,44 @@ class OrderService:
     async def create_order(self, user_id: str, product_id: str) -> dict:
         """
         Create order and process payment from wallet
+        Stock, wallet debit, subscription, ledger and order are written in one
+        pass (one transaction on a replica set), see OrderEngine
         """
-        # Get product details
-        product = await self.product_service.get_product_by_id(product_id)
+        order, subscription, product = await OrderEngine(self.db).place_order(user_id, product_id)
+        order_id = order["_id"]
+        if not is_pooled(product):
+            # Stored stock changed
+            await product_catalog.changed(self.db)
         
-        # Check if product is active
-        if not product.get("is_active", False):
-            raise HTTPException(status_code=400, detail="Product is not available")
-        
-        # Check user exists before creating order
-        user = await self.db.users.find_one({"_id": ObjectId(user_id)}, {"wallet_balance": 1})
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Check wallet balance (non-atomic check for early validation)
-        wallet_balance = user.get("wallet_balance", 0.0)
-        if wallet_balance < product["price"]:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Insufficient wallet balance. Required: ₹{product['price']}, Available: ₹{wallet_balance}"
-            )
-        
-        # Create order
-        order = {
-            "user_id": user_id,
-            "product_id": product_id,
-            "product_name": f"{product['platform_name']} - {product['plan_name']}",
-            "amount": product["price"],
-            "status": "pending",
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
-        }
-        
-        result = await self.db.orders.insert_one(order)
-        order_id = str(result.inserted_id)
-        
-        # Atomically decrease stock FIRST to prevent overselling under concurrent requests
-        try:
-            await self.product_service.decrease_stock(product_id)
-        except HTTPException:
-            # Stock unavailable - rollback order and re-raise
-            await self.db.orders.delete_one({"_id": ObjectId(order_id)})
-            raise HTTPException(status_code=400, detail="Product out of stock")
-        
-        # Create subscription after stock is reserved
-        subscription_service = SubscriptionService(self.db)
-        try:
-            subscription = await subscription_service.create_subscription(user_id, product_id, order_id)
-        except HTTPException as e:
-            # If subscription creation fails, rollback order and stock
-            await self.db.orders.delete_one({"_id": ObjectId(order_id)})
-            # Restore stock since we decremented it earlier
-            await self.db.products.update_one(
-                {"_id": ObjectId(product_id)},
-                {"$inc": {"stock": 1}}
-            )
-            raise e
-        
-        # Atomically deduct wallet balance with balance check to prevent race conditions
-        updated_user = await self.db.users.find_one_and_update(
-            {
-                "_id": ObjectId(user_id),
-                "wallet_balance": {"$gte": product["price"]}  # Atomic balance check
-            },
-            {
-                "$inc": {"wallet_balance": -product["price"]},
-                "$set": {"updated_at": datetime.utcnow().isoformat()}
-            },
-            return_document=True
-        )
-        
-        if not updated_user:
-            # Balance check failed or user not found (rollback subscription, order, and stock)
-            await self.db.subscriptions.delete_one({"_id": ObjectId(subscription["_id"])})
-            await self.db.orders.delete_one({"_id": ObjectId(order_id)})
-            # Restore stock since we decremented it earlier
-            await self.db.products.update_one(
-                {"_id": ObjectId(product_id)},
-                {"$inc": {"stock": 1}}
-            )
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient wallet balance. Please add money to your wallet."
-            )
-        
-        new_balance = updated_user["wallet_balance"]
-        
-        # Add wallet transaction (debit)
-        wallet_txn = {
-            "user_id": user_id,
-            "type": "debit",
-            "amount": product["price"],
-            "balance_after": new_balance,
-            "reference_type": "order",
-            "reference_id": order_id,
-            "description": f"Payment for {order['product_name']}",
-            "created_at": datetime.utcnow().isoformat()
-        }
-        await self.db.wallet_transactions.insert_one(wallet_txn)
-        
-        # Update order status to paid
-        await self.db.orders.update_one(
-            {"_id": ObjectId(order_id)},
-            {
-                "$set": {
-                    "status": "paid",
-                    "paid_at": datetime.utcnow().isoformat(),
-                    "updated_at": datetime.utcnow().isoformat()
-                }
-            }
-        )
-        
-        # Update order to completed and store subscription_id
-        await self.db.orders.update_one(
-            {"_id": ObjectId(order_id)},
-            {"$set": {
-                "status": "completed",
-                "subscription_id": subscription["_id"],
-                "updated_at": datetime.utcnow().isoformat()
-            }}
-        )
-        
-        # Fetch updated order
-        order = await self.db.orders.find_one({"_id": ObjectId(order_id)})
-        order["_id"] = order_id
-        
-        # Send Telegram notifications to admin
+        # Queue Telegram notifications to admin (delivered in background)
         try:
-            # Notify new order
-            await telegram_service.notify_new_order({
-                "order_id": order_id,
-                "user_id": user_id,
-                "product_name": order["product_name"],
-                "amount": order["amount"],
-                "status": order["status"],
-                "created_at": order["created_at"]
-            })
-            
-            # Notify payment success
-            await telegram_service.notify_payment_success({
-                "order_id": order_id,
-                "user_id": user_id,
-                "amount": order["amount"],
-                "payment_id": order_id,
-                "paid_at": order.get("paid_at")
-            })
-            
-            # Notify subscription activation
-            await telegram_service.notify_subscription_activated({
-                "subscription_id": subscription["_id"],
-                "user_id": user_id,
-                "platform_name": product["platform_name"],
-                "plan_name": product["plan_name"],
-                "duration_days": product["duration_days"],
-                "end_date": subscription["end_date"]
-            })
+            await enqueue_alerts(self.db, [
+                ("new_order", {
+                    "order_id": order_id,
+                    "user_id": user_id,
+                    "product_name": order["product_name"],
+                    "amount": order["amount"],
+                    "status": order["status"],
+                    "created_at": order["created_at"]
+                }),
+                ("payment_success", {
+                    "order_id": order_id,
+                    "user_id": user_id,
+                    "amount": order["amount"],
+                    "payment_id": order_id,
+                    "paid_at": order.get("paid_at")
+                }),
+                ("subscription_activated", {
+                    "subscription_id": subscription["_id"],
+                    "user_id": user_id,
+                    "platform_name": product["platform_name"],
+                    "plan_name": product["plan_name"],
+                    "duration_days": product["duration_days"],
+                    "end_date": subscription["end_date"]
+                })
+            ])
         except Exception as e:
-            print(f"Failed to send Telegram notification: {e}")
+            print(f"Failed to queue Telegram notification: {e}")
         
         return order
     
@@ -193,25 +77,23 @@ class OrderService:
         order["_id"] = str(order["_id"])
         return order
     
-    async def list_user_orders(self, user_id: str, skip: int = 0, limit: int = 100) -> list:
-        """List user's orders"""
-        cursor = self.db.orders.find({"user_id": user_id}).sort("created_at", -1).skip(skip).limit(limit)
-        orders = await cursor.to_list(length=limit)
+    async def list_user_orders(self, user_id: str, skip: int = 0, limit: int = 100, cursor: str = None) -> tuple:
+        """List user's orders, returns (orders, next_cursor)"""
+        orders, next_cursor = await paginate(self.db.orders, {"user_id": user_id}, limit, cursor, skip)
         
         for order in orders:
             order["_id"] = str(order["_id"])
         
-        return orders
+        return orders, next_cursor
     
-    async def list_all_orders(self, skip: int = 0, limit: int = 100) -> list:
-        """List all orders (admin)"""
-        cursor = self.db.orders.find().sort("created_at", -1).skip(skip).limit(limit)
-        orders = await cursor.to_list(length=limit)
+    async def list_all_orders(self, skip: int = 0, limit: int = 100, cursor: str = None) -> tuple:
+        """List all orders (admin), returns (orders, next_cursor)"""
+        orders, next_cursor = await paginate(self.db.orders, {}, limit, cursor, skip)
         
         for order in orders:
             order["_id"] = str(order["_id"])
         
-        return orders
+        return orders, next_cursor
     
     async def refund_order(self, order_id: str, reason: str = None) -> dict:
         """Process order refund"""
@@ -265,21 +147,28 @@ class OrderService:
         # Cancel associated subscription
         await self.db.subscriptions.update_many(
             {"order_id": order_id},
-            {"$set": {"status": "cancelled", "updated_at": datetime.utcnow().isoformat()}}
+            {"$set": {
+                "status": "cancelled",
+                "credentials_release_pending": True,
+                "updated_at": datetime.utcnow().isoformat()
+            }}
         )
         
-        # Restore stock
+        # Restore stock (credential-backed products get theirs back when
+        # the credential is recycled)
         try:
-            await self.db.products.update_one(
-                {"_id": ObjectId(order["product_id"])},
+            restored = await self.db.products.update_one(
+                {"_id": ObjectId(order["product_id"]), "platform_key": {"$in": list(NON_POOLED_PLATFORMS)}},
                 {"$inc": {"stock": 1}}
             )
+            if restored.modified_count:
+                await product_catalog.changed(self.db)
         except:
             pass  # Product might be deleted
         
-        # Send Telegram notification
+        # Queue Telegram notification
         try:
-            await telegram_service.notify_refund_issued({
+            await enqueue_alert(self.db, "refund_issued", {
                 "order_id": order_id,
                 "user_id": order["user_id"],
                 "amount": order["amount"],
@@ -287,6 +176,6 @@ class OrderService:
                 "refunded_at": datetime.utcnow().isoformat()
             })
         except Exception as e:
-            print(f"Failed to send Telegram notification: {e}")
+            print(f"Failed to queue Telegram notification: {e}")
         
         return await self.get_order_by_id(order_id)
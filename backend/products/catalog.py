@@ -0,0 +1,172 @@
+"""
+In-memory product catalog
+
+The catalog changes a few times a day but ``GET /products`` is the most hit
+endpoint, so every worker serves it from a snapshot loaded at startup.
+Admin writes bump a version number in ``catalog_state``; each worker polls
+that one document and reloads its snapshot when the version moves, so all
+workers converge within CATALOG_POLL_SECONDS (the writing worker reloads
+immediately). Stock of credential-backed products comes from the credential
+counters cache, which the poller keeps warm.
+
+Rendered responses are cached per query together with a strong ETag, so a
+request with a matching ``If-None-Match`` is answered 304 from memory.
+"""
+import asyncio
+import hashlib
+import json
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from core.config import settings
+from app.credentials.pool import product_stock
+from app.credentials.counters import stock_cache
+
+
+CATALOG_STATE_ID = "products"
+
+
+def product_out(product: dict) -> dict:
+    """Public representation of a product"""
+    return {
+        "id": str(product["_id"]),
+        "platform_name": product["platform_name"],
+        "plan_name": product["plan_name"],
+        "price": product["price"],
+        "duration_days": product["duration_days"],
+        "stock": product["stock"],
+        "is_active": product["is_active"],
+        "description": product.get("description"),
+        "created_at": product["created_at"]
+    }
+
+
+async def bump_catalog_version(db: AsyncIOMotorDatabase) -> int:
+    """Record a catalog change so every worker reloads its snapshot"""
+    state = await db.catalog_state.find_one_and_update(
+        {"_id": CATALOG_STATE_ID},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow().isoformat()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return state["version"]
+
+
+class ProductCatalog:
+    """Per-worker snapshot of the products collection"""
+
+    def __init__(self, poll_seconds: float):
+        self.poll_seconds = poll_seconds
+        self.version: Optional[int] = None
+        self._products: List[dict] = []
+        self._by_id: Dict[str, dict] = {}
+        self._rendered: Dict[tuple, Tuple[bytes, str]] = {}
+        self._get_db: Optional[Callable[[], AsyncIOMotorDatabase]] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.reloads = 0
+        self.not_modified = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.version is not None
+
+    async def start(self, get_db: Callable[[], AsyncIOMotorDatabase]):
+        """Load the snapshot and start polling for changes"""
+        self._get_db = get_db
+        await self.reload()
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        """Stop polling"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def reload(self):
+        """Load every product (the catalog is small)"""
+        db = self._get_db()
+        state = await db.catalog_state.find_one({"_id": CATALOG_STATE_ID})
+        products = await db.products.find({}).sort("_id", 1).to_list(length=None)
+        for product in products:
+            product["_id"] = str(product["_id"])
+        self._products = products
+        self._by_id = {product["_id"]: product for product in products}
+        self._rendered = {}
+        self.version = state["version"] if state else 0
+        self.reloads += 1
+
+    async def changed(self, db: AsyncIOMotorDatabase):
+        """Call after an admin write: bump the shared version and reload here"""
+        await bump_catalog_version(db)
+        if self.loaded:
+            await self.reload()
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                db = self._get_db()
+                state = await db.catalog_state.find_one({"_id": CATALOG_STATE_ID}, {"version": 1})
+                if (state["version"] if state else 0) != self.version:
+                    await self.reload()
+                # Keep stock counters warm so requests don't load them
+                await stock_cache.get(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Product catalog poll error: {e}")
+
+    def get(self, product_id: str) -> Optional[dict]:
+        """Stored product document (without live stock), or None"""
+        return self._by_id.get(product_id)
+
+    async def render(self, db: AsyncIOMotorDatabase, key: tuple, build: Callable[[List[dict]], object]) -> Tuple[bytes, str]:
+        """
+        JSON body and strong ETag for a view of the catalog
+        `build` gets the products (with live stock) and returns the payload;
+        results are cached until the catalog or stock changes.
+        """
+        counters = await stock_cache.get(db)
+        products = [{**product, "stock": product_stock(product, counters)} for product in self._products]
+        stock_key = tuple(product["stock"] for product in products)
+
+        cache_key = (key, self.version, stock_key)
+        cached = self._rendered.get(cache_key)
+        if cached is None:
+            body = json.dumps(build(products), default=str, separators=(",", ":")).encode()
+            cached = (body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+            if len(self._rendered) > 256:
+                self._rendered = {}
+            self._rendered[cache_key] = cached
+        return cached
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "version": self.version,
+            "products": len(self._products),
+            "reloads": self.reloads,
+            "not_modified": self.not_modified
+        }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (comma separated list, weak validators compare equal)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+# Global catalog (one snapshot per worker)
+product_catalog = ProductCatalog(poll_seconds=settings.CATALOG_POLL_SECONDS)
@@ -1,16 +1,32 @@
 """
 Product API routes
 """
-from fastapi import APIRouter, Depends, Query
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from bson import ObjectId
+from core.config import settings
 from core.database import get_database
 from core.security import get_current_user, require_role
 from .schemas import ProductCreate, ProductUpdate, ProductOut
 from .service import ProductService
+from .catalog import product_catalog, product_out, etag_matches
 
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
 
+def catalog_response(body: bytes, etag: str, if_none_match: Optional[str]) -> Response:
+    """Cached catalog JSON, or 304 if the client already has this version"""
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.CATALOG_CACHE_MAX_AGE}, must-revalidate"
+    }
+    if etag_matches(if_none_match, etag):
+        product_catalog.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.post("/", response_model=ProductOut, summary="Create product (Admin only)")
 async def create_product(
     product: ProductCreate,
@@ -20,17 +36,8 @@ async def create_product(
     """Create new OTT plan (admin only)"""
     service = ProductService(db)
     result = await service.create_product(product.model_dump())
-    return {
-        "id": result["_id"],
-        "platform_name": result["platform_name"],
-        "plan_name": result["plan_name"],
-        "price": result["price"],
-        "duration_days": result["duration_days"],
-        "stock": result["stock"],
-        "is_active": result["is_active"],
-        "description": result.get("description"),
-        "created_at": result["created_at"]
-    }
+    await product_catalog.changed(db)
+    return product_out(result)
 
 
 @router.get("/", summary="List all products")
@@ -38,51 +45,51 @@ async def list_products(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     active_only: bool = Query(False, description="Show only active products"),
+    if_none_match: Optional[str] = Header(None),
     db=Depends(get_database)
 ):
     """
     List OTT plans with pagination
     - Public endpoint, no authentication required
     - Use active_only=true to show only available plans
+    - Served from the in-memory catalog with an ETag (send If-None-Match for 304)
     """
-    service = ProductService(db)
-    products = await service.list_products(skip, limit, active_only)
-    
-    return {
-        "products": [
-            {
-                "id": p["_id"],
-                "platform_name": p["platform_name"],
-                "plan_name": p["plan_name"],
-                "price": p["price"],
-                "duration_days": p["duration_days"],
-                "stock": p["stock"],
-                "is_active": p["is_active"],
-                "description": p.get("description"),
-                "created_at": p["created_at"]
-            }
-            for p in products
-        ],
-        "count": len(products)
-    }
+    if not product_catalog.loaded:
+        service = ProductService(db)
+        products = await service.list_products(skip, limit, active_only)
+        return {"products": [product_out(p) for p in products], "count": len(products)}
+
+    def build(products: list) -> dict:
+        if active_only:
+            products = [p for p in products if p.get("is_active")]
+        page = [product_out(p) for p in products[skip:skip + limit]]
+        return {"products": page, "count": len(page)}
+
+    body, etag = await product_catalog.render(db, ("list", skip, limit, active_only), build)
+    return catalog_response(body, etag, if_none_match)
 
 
 @router.get("/{product_id}", response_model=ProductOut, summary="Get product by ID")
-async def get_product(product_id: str, db=Depends(get_database)):
+async def get_product(
+    product_id: str,
+    if_none_match: Optional[str] = Header(None),
+    db=Depends(get_database)
+):
     """Get specific OTT plan details"""
-    service = ProductService(db)
-    product = await service.get_product_by_id(product_id)
-    return {
-        "id": product["_id"],
-        "platform_name": product["platform_name"],
-        "plan_name": product["plan_name"],
-        "price": product["price"],
-        "duration_days": product["duration_days"],
-        "stock": product["stock"],
-        "is_active": product["is_active"],
-        "description": product.get("description"),
-        "created_at": product["created_at"]
-    }
+    if not product_catalog.loaded:
+        service = ProductService(db)
+        return product_out(await service.get_product_by_id(product_id))
+
+    if not ObjectId.is_valid(product_id):
+        raise HTTPException(status_code=400, detail="Invalid product ID")
+    if product_catalog.get(product_id) is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    def build(products: list) -> dict:
+        return next(product_out(p) for p in products if p["_id"] == product_id)
+
+    body, etag = await product_catalog.render(db, ("product", product_id), build)
+    return catalog_response(body, etag, if_none_match)
 
 
 @router.patch("/{product_id}", response_model=ProductOut, summary="Update product (Admin only)")
@@ -95,17 +102,8 @@ async def update_product(
     """Update OTT plan (admin only)"""
     service = ProductService(db)
     product = await service.update_product(product_id, update_data.model_dump())
-    return {
-        "id": product["_id"],
-        "platform_name": product["platform_name"],
-        "plan_name": product["plan_name"],
-        "price": product["price"],
-        "duration_days": product["duration_days"],
-        "stock": product["stock"],
-        "is_active": product["is_active"],
-        "description": product.get("description"),
-        "created_at": product["created_at"]
-    }
+    await product_catalog.changed(db)
+    return product_out(product)
 
 
 @router.delete("/{product_id}", summary="Delete product (Admin only)")
@@ -117,4 +115,5 @@ async def delete_product(
     """Delete OTT plan (admin only)"""
     service = ProductService(db)
     await service.delete_product(product_id)
+    await product_catalog.changed(db)
     return {"message": "Product deleted successfully"}
@@ -5,18 +5,33 @@ from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from fastapi import HTTPException, status
+from app.credentials.pool import platform_key, product_stock
+from app.credentials.counters import stock_cache
 
 
 class ProductService:
-    """Product management service"""
+    """
+    Product management service
+    
+    Stock of credential-backed products is derived from the credential
+    pool counters; products.stock is only used for non-pooled platforms.
+    """
     
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
     
+    async def _with_live_stock(self, products: list) -> list:
+        """Replace stored stock with stock derived from credential counters"""
+        counters = await stock_cache.get(self.db)
+        for product in products:
+            product["stock"] = product_stock(product, counters)
+        return products
+    
     async def create_product(self, product_data: dict) -> dict:
         """Create new product"""
         product = {
             **product_data,
+            "platform_key": platform_key(product_data["platform_name"]),
             "created_at": datetime.utcnow().isoformat(),
             "updated_at": datetime.utcnow().isoformat()
         }
@@ -36,6 +51,7 @@ class ProductService:
             raise HTTPException(status_code=404, detail="Product not found")
         
         product["_id"] = str(product["_id"])
+        await self._with_live_stock([product])
         return product
     
     async def list_products(self, skip: int = 0, limit: int = 100, active_only: bool = False) -> list:
@@ -50,7 +66,7 @@ class ProductService:
         for product in products:
             product["_id"] = str(product["_id"])
         
-        return products
+        return await self._with_live_stock(products)
     
     async def update_product(self, product_id: str, update_data: dict) -> dict:
         """Update product"""
@@ -61,6 +77,8 @@ class ProductService:
             raise HTTPException(status_code=400, detail="No data to update")
         
         update_data["updated_at"] = datetime.utcnow().isoformat()
+        if "platform_name" in update_data:
+            update_data["platform_key"] = platform_key(update_data["platform_name"])
         
         try:
             result = await self.db.products.update_one(
@@ -88,7 +106,7 @@ class ProductService:
         return True
     
     async def decrease_stock(self, product_id: str, quantity: int = 1) -> bool:
-        """Decrease product stock (for order processing)"""
+        """Decrease stored product stock (non-pooled products only, see OrderEngine)"""
         try:
             result = await self.db.products.update_one(
                 {"_id": ObjectId(product_id), "stock": {"$gte": quantity}},
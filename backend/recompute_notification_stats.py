@@ -0,0 +1,27 @@
+"""
+Rebuild materialized notification engagement counters
+Old per-user copies are tagged with their campaign id at startup; run this
+whenever counters look off.
+
+Usage:
+    python recompute_notification_stats.py
+"""
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from core.config import settings
+from notifications.service import NotificationService
+
+
+async def recompute():
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.DATABASE_NAME]
+
+    print(f"🔄 Recomputing notification engagement on {settings.DATABASE_NAME}...")
+    updated = await NotificationService(db).recompute_engagement()
+    print(f"✅ Updated {updated} history entries")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(recompute())
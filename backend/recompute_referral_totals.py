@@ -0,0 +1,27 @@
+"""
+Rebuild denormalized referral totals (total_earnings, active_referrals)
+Referrers are backfilled lazily on their first dashboard load; run this to
+backfill everyone at once, or whenever totals look off.
+
+Usage:
+    python recompute_referral_totals.py
+"""
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from core.config import settings
+from app.referrals.service import ReferralService
+
+
+async def recompute():
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.DATABASE_NAME]
+
+    print(f"🔄 Recomputing referral totals on {settings.DATABASE_NAME}...")
+    updated = await ReferralService(db).recompute_referral_totals()
+    print(f"✅ Updated {updated} referrers")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(recompute())
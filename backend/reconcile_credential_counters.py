@@ -0,0 +1,34 @@
+"""
+Recompute per-platform credential counters (product stock) from credentials
+Run after editing credentials outside the API (scripts, mongo shell), or
+whenever product stock looks off. One aggregation over credentials.
+
+Usage:
+    python reconcile_credential_counters.py
+"""
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from core.config import settings
+from app.credentials.counters import recompute_counters
+
+
+async def reconcile():
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.DATABASE_NAME]
+
+    print(f"🔄 Recomputing credential counters on {settings.DATABASE_NAME}...")
+    result = await recompute_counters(db)
+    for key, available in sorted(result["counters"].items()):
+        print(f"   {key}: {available} available")
+    if result["drift"]:
+        for key, (counter, actual) in sorted(result["drift"].items()):
+            print(f"   ⚠️  {key}: counter was {counter}, actual {actual}")
+    else:
+        print("   No drift")
+    print("✅ Counters reconciled")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(reconcile())
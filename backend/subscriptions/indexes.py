@@ -0,0 +1,24 @@
+"""
+Subscription indexes
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+
+INDEXES = {
+    "subscriptions": [
+        # My subscriptions page
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_id_created_at_id"),
+        # Refund cancels subscriptions by order
+        IndexModel([("order_id", ASCENDING)], name="order_id"),
+        # Admin list filtered by status
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="status_created_at_id"),
+        # Expiry sweep
+        IndexModel([("status", ASCENDING), ("end_date", ASCENDING)], name="status_end_date"),
+        # Credential recycling of ended subscriptions
+        IndexModel(
+            [("credentials_release_pending", ASCENDING), ("updated_at", ASCENDING)],
+            name="credentials_release_pending_updated_at",
+            partialFilterExpression={"credentials_release_pending": True}
+        ),
+    ]
+}
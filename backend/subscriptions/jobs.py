@@ -0,0 +1,19 @@
+"""
+Scheduled subscription jobs (registered with core.scheduler in main.py)
+"""
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from core.config import settings
+from .service import SubscriptionService
+
+
+async def expire_subscriptions_job(db: AsyncIOMotorDatabase) -> dict:
+    """Mark active subscriptions past end_date as expired"""
+    return await SubscriptionService(db).expire_due_subscriptions(
+        batch_size=settings.SUBSCRIPTION_EXPIRY_BATCH_SIZE,
+        max_batches=settings.SUBSCRIPTION_EXPIRY_MAX_BATCHES
+    )
+
+
+async def renewal_reminders_job(db: AsyncIOMotorDatabase) -> dict:
+    """Remind users RENEWAL_REMINDER_DAYS before their subscription ends"""
+    return await SubscriptionService(db).send_renewal_reminders(settings.RENEWAL_REMINDER_DAYS)
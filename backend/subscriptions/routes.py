@@ -1,6 +1,7 @@
 """
 Subscription API routes
 """
+from typing import Optional
 from fastapi import APIRouter, Depends, Query, HTTPException
 from core.database import get_database
 from core.security import get_current_user, require_role
@@ -13,14 +14,15 @@ router = APIRouter(prefix="/subscriptions", tags=["Subscriptions"])
 
 @router.get("/my-subscriptions", summary="Get my subscriptions")
 async def get_my_subscriptions(
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
     limit: int = Query(100, ge=1, le=1000),
     current_user: dict = Depends(get_current_user),
     db=Depends(get_database)
 ):
     """Get authenticated user's subscriptions"""
     service = SubscriptionService(db)
-    subscriptions = await service.list_user_subscriptions(current_user["_id"], skip, limit)
+    subscriptions, next_cursor = await service.list_user_subscriptions(current_user["_id"], skip, limit, cursor)
     
     return {
         "subscriptions": [
@@ -42,13 +44,15 @@ async def get_my_subscriptions(
             }
             for s in subscriptions
         ],
-        "count": len(subscriptions)
+        "count": len(subscriptions),
+        "next_cursor": next_cursor
     }
 
 
 @router.get("/", summary="List all subscriptions (Admin only)")
 async def list_subscriptions(
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
     limit: int = Query(100, ge=1, le=1000),
     status: str = Query(None, description="Filter by status: active, expired, cancelled"),
     current_user: dict = Depends(require_role(["admin", "support"])),
@@ -56,7 +60,7 @@ async def list_subscriptions(
 ):
     """List all subscriptions (admin/support only)"""
     service = SubscriptionService(db)
-    subscriptions = await service.list_all_subscriptions(skip, limit, status)
+    subscriptions, next_cursor = await service.list_all_subscriptions(skip, limit, status, cursor)
     
     return {
         "subscriptions": [
@@ -75,7 +79,8 @@ async def list_subscriptions(
             }
             for s in subscriptions
         ],
-        "count": len(subscriptions)
+        "count": len(subscriptions),
+        "next_cursor": next_cursor
     }
 
 
@@ -1,10 +1,24 @@
 """
 Subscription service
 """
+import math
 from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from fastapi import HTTPException, status
+from core.pagination import paginate
+from app.credentials.pool import CredentialPool, platform_key, COMBO_COMPONENTS, NON_POOLED_PLATFORMS
+
+
+def buyer_info(user: dict) -> dict:
+    """Buyer details stored on claimed credentials"""
+    if not user:
+        return None
+    return {
+        "name": user.get("name", "N/A"),
+        "email": user.get("email", "N/A"),
+        "phone": user.get("phone", "N/A")
+    }
 
 
 class SubscriptionService:
@@ -13,148 +27,88 @@ class SubscriptionService:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
     
-    async def create_subscription(self, user_id: str, product_id: str, order_id: str, youtube_email: str = None) -> dict:
-        """Create subscription after successful payment"""
-        # Get product details
-        product = await self.db.products.find_one({"_id": ObjectId(product_id)})
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
+    async def create_subscription(
+        self,
+        user_id: str,
+        product_id: str,
+        order_id: str,
+        youtube_email: str = None,
+        product: dict = None,
+        user_info: dict = None,
+        subscription_id: ObjectId = None,
+        session=None
+    ) -> dict:
+        """
+        Create subscription after successful payment
+
+        The order engine passes the product and buyer info it already holds,
+        a pre-allocated subscription id and its transaction session.
+        """
+        # Get product details (callers that already hold the product pass it in)
+        if product is None:
+            product = await self.db.products.find_one({"_id": ObjectId(product_id)})
+            if not product:
+                raise HTTPException(status_code=404, detail="Product not found")
         
         # Calculate dates
         start_date = datetime.utcnow()
         end_date = start_date + timedelta(days=product["duration_days"])
         
         # Check if it's a YouTube subscription or Combo plan
-        is_youtube = "youtube" in product["platform_name"].lower()
-        is_combo = "combo" in product["platform_name"].lower()
+        key = product.get("platform_key") or platform_key(product["platform_name"])
+        is_youtube = key == "youtube"
+        is_combo = key == "combo"
         
-        # Get credentials from IDP database (credentials collection)
-        # Find an active credential matching the platform
+        # Subscription id is allocated up front so credentials are claimed
+        # for it directly (no follow-up update to link them)
+        subscription_id = subscription_id or ObjectId()
         credentials = None
-        platform_credential = None
-        
-        # Handle combo plan credentials
-        if is_combo:
-            # Fetch credentials for Netflix, Prime, and Pornhub
-            platforms_needed = ["Netflix", "Prime", "Pornhub"]
-            combo_credentials = {}
-            combo_credential_ids = []
+        claimed_ids = []
+        
+        if key not in NON_POOLED_PLATFORMS:
+            # Buyer details stored on claimed credentials for admin tracking
+            if user_info is None:
+                user = await self.db.users.find_one(
+                    {"_id": ObjectId(user_id)},
+                    {"name": 1, "email": 1, "phone": 1}
+                )
+                user_info = buyer_info(user)
+            pool = CredentialPool(self.db)
             
-            for platform in platforms_needed:
-                platform_variations = [platform]
-                if platform == "Prime":
-                    platform_variations.extend(["Amazon Prime", "Prime Video", "Amazon Prime Video"])
-                
-                cred = None
-                for variation in platform_variations:
-                    cred = await self.db.credentials.find_one({
-                        "platform": {"$regex": f"^{variation}", "$options": "i"},
-                        "is_active": True,
-                        "used_by": {"$exists": False}
-                    })
-                    if cred:
-                        break
-                
-                if not cred:
+            if is_combo:
+                # Claim Netflix, Prime and Pornhub concurrently; if one is out
+                # of stock the others are released back to the pool
+                claimed, missing = await pool.claim_all(
+                    list(COMBO_COMPONENTS), user_id, str(subscription_id), user_info, session=session
+                )
+                if missing:
                     raise HTTPException(
                         status_code=400,
-                        detail=f"{platform} is currently out of stock. Please try again later or contact support."
+                        detail=f"{COMBO_COMPONENTS[missing[0]]} is currently out of stock. Please try again later or contact support."
+                    )
+                claimed_ids = [cred["_id"] for cred in claimed.values()]
+                credentials = {
+                    component_key: {
+                        "email": cred["username"],
+                        "password": cred["password"]
+                    }
+                    for component_key, cred in claimed.items()
+                }
+            else:
+                cred = await pool.claim(key, user_id, str(subscription_id), user_info, session=session)
+                if not cred:
+                    raise HTTPException(
+                        status_code=400, 
+                        detail=f"{product['platform_name']} is currently out of stock. Please try again later or contact support."
                     )
-                
-                # Store credentials
-                combo_credentials[platform.lower()] = {
+                claimed_ids = [cred["_id"]]
+                credentials = {
                     "email": cred["username"],
                     "password": cred["password"]
                 }
-                combo_credential_ids.append({"id": cred["_id"], "platform": platform})
-                
-                # Get user details for tracking
-                user = await self.db.users.find_one({"_id": ObjectId(user_id)})
-                
-                # Mark credential as used
-                await self.db.credentials.update_one(
-                    {"_id": cred["_id"]},
-                    {
-                        "$set": {
-                            "used_by": user_id,
-                            "used_at": datetime.utcnow().isoformat(),
-                            "subscription_id": None,  # Will update after subscription creation
-                            "user_info": {
-                                "name": user.get("name", "N/A"),
-                                "email": user.get("email", "N/A"),
-                                "phone": user.get("phone", "N/A")
-                            } if user else None,
-                            "updated_at": datetime.utcnow().isoformat()
-                        }
-                    }
-                )
-            
-            credentials = combo_credentials
-            
-        # Only fetch credentials for non-YouTube and non-Combo platforms
-        elif not is_youtube:
-            # Try multiple platform name variations for better matching
-            platform_variations = [
-                product["platform_name"],  # Full name (e.g., "Amazon Prime Video")
-                product["platform_name"].split()[0],  # First word (e.g., "Amazon")
-            ]
-            
-            # Add common variations
-            platform_lower = product["platform_name"].lower()
-            if "prime" in platform_lower:
-                platform_variations.extend(["Prime", "Amazon Prime", "Prime Video"])
-            elif "netflix" in platform_lower:
-                platform_variations.append("Netflix")
-            elif "pornhub" in platform_lower:
-                platform_variations.append("Pornhub")
-            elif "hotstar" in platform_lower:
-                platform_variations.extend(["Hotstar", "Disney+ Hotstar"])
-            elif "zee" in platform_lower:
-                platform_variations.append("ZEE5")
-            
-            # Try to find credentials with any variation
-            for variation in platform_variations:
-                platform_credential = await self.db.credentials.find_one({
-                    "platform": {"$regex": f"^{variation}", "$options": "i"},
-                    "is_active": True,
-                    "used_by": {"$exists": False}  # Get unused credentials
-                })
-                if platform_credential:
-                    credentials = {
-                        "email": platform_credential["username"],
-                        "password": platform_credential["password"]
-                    }
-                    
-                    # Get user details for tracking
-                    user = await self.db.users.find_one({"_id": ObjectId(user_id)})
-                    
-                    # Mark credential as used
-                    await self.db.credentials.update_one(
-                        {"_id": platform_credential["_id"]},
-                        {
-                            "$set": {
-                                "used_by": user_id,
-                                "used_at": datetime.utcnow().isoformat(),
-                                "subscription_id": None,  # Will update after subscription creation
-                                "user_info": {
-                                    "name": user.get("name", "N/A"),
-                                    "email": user.get("email", "N/A"),
-                                    "phone": user.get("phone", "N/A")
-                                } if user else None,
-                                "updated_at": datetime.utcnow().isoformat()
-                            }
-                        }
-                    )
-                    break
-            
-            # Check if credentials were found (only for non-YouTube platforms)
-            if not credentials:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"{product['platform_name']} is currently out of stock. Please try again later or contact support."
-                )
         
         subscription = {
+            "_id": subscription_id,
             "user_id": user_id,
             "product_id": product_id,
             "order_id": order_id,
@@ -175,30 +129,18 @@ class SubscriptionService:
             subscription["youtube_email_edit_count"] = 0
             subscription["youtube_email_max_edits"] = 1
         
-        result = await self.db.subscriptions.insert_one(subscription)
-        subscription["_id"] = str(result.inserted_id)
-        
-        # Update credential with subscription_id if credentials were assigned
-        if is_combo and combo_credential_ids:
-            # Update all combo credentials with subscription_id
-            for cred_info in combo_credential_ids:
-                await self.db.credentials.update_one(
-                    {"_id": cred_info["id"]},
-                    {
-                        "$set": {
-                            "subscription_id": str(result.inserted_id)
-                        }
-                    }
-                )
-        elif credentials and platform_credential:
-            await self.db.credentials.update_one(
-                {"_id": platform_credential["_id"]},
-                {
-                    "$set": {
-                        "subscription_id": str(result.inserted_id)
-                    }
-                }
-            )
+        try:
+            await self.db.subscriptions.insert_one(subscription, session=session)
+        except Exception:
+            if session is not None:
+                # Transaction abort undoes the claims
+                raise
+            # Don't leave credentials claimed by a subscription that doesn't exist
+            pool = CredentialPool(self.db)
+            for credential_id in claimed_ids:
+                await pool.release(credential_id, str(subscription_id))
+            raise
+        subscription["_id"] = str(subscription_id)
         
         return subscription
     
@@ -215,29 +157,27 @@ class SubscriptionService:
         subscription["_id"] = str(subscription["_id"])
         return subscription
     
-    async def list_user_subscriptions(self, user_id: str, skip: int = 0, limit: int = 100) -> list:
-        """List user's subscriptions"""
-        cursor = self.db.subscriptions.find({"user_id": user_id}).sort("created_at", -1).skip(skip).limit(limit)
-        subscriptions = await cursor.to_list(length=limit)
+    async def list_user_subscriptions(self, user_id: str, skip: int = 0, limit: int = 100, cursor: str = None) -> tuple:
+        """List user's subscriptions, returns (subscriptions, next_cursor)"""
+        subscriptions, next_cursor = await paginate(self.db.subscriptions, {"user_id": user_id}, limit, cursor, skip)
         
         for sub in subscriptions:
             sub["_id"] = str(sub["_id"])
         
-        return subscriptions
+        return subscriptions, next_cursor
     
-    async def list_all_subscriptions(self, skip: int = 0, limit: int = 100, status: str = None) -> list:
-        """List all subscriptions (admin)"""
+    async def list_all_subscriptions(self, skip: int = 0, limit: int = 100, status: str = None, cursor: str = None) -> tuple:
+        """List all subscriptions (admin), returns (subscriptions, next_cursor)"""
         query = {}
         if status:
             query["status"] = status
         
-        cursor = self.db.subscriptions.find(query).sort("created_at", -1).skip(skip).limit(limit)
-        subscriptions = await cursor.to_list(length=limit)
+        subscriptions, next_cursor = await paginate(self.db.subscriptions, query, limit, cursor, skip)
         
         for sub in subscriptions:
             sub["_id"] = str(sub["_id"])
         
-        return subscriptions
+        return subscriptions, next_cursor
     
     async def assign_credentials(self, subscription_id: str, credentials: dict) -> dict:
         """Assign OTT credentials to subscription (admin only)"""
@@ -328,6 +268,7 @@ class SubscriptionService:
                 {
                     "$set": {
                         "status": "cancelled",
+                        "credentials_release_pending": True,
                         "updated_at": datetime.utcnow().isoformat()
                     }
                 }
@@ -342,19 +283,93 @@ class SubscriptionService:
     
     async def check_and_expire_subscriptions(self):
         """Background task to expire subscriptions"""
-        now = datetime.utcnow().isoformat()
+        result = await self.expire_due_subscriptions()
+        return result["processed"]
+    
+    async def expire_due_subscriptions(self, batch_size: int = 500, max_batches: int = 20) -> dict:
+        """
+        Expire active subscriptions past end_date in bounded batches
+        
+        Walks the (status, end_date) index oldest first so a backlog is worked
+        off over several runs instead of one huge update. Returns counters:
+        processed, batches and lag_seconds (how overdue the oldest one was).
+        """
+        now = datetime.utcnow()
+        now_iso = now.isoformat()
+        expired = 0
+        batches = 0
+        lag_seconds = 0.0
+        
+        for _ in range(max_batches):
+            due = await self.db.subscriptions.find(
+                {"status": "active", "end_date": {"$lt": now_iso}},
+                {"end_date": 1}
+            ).sort("end_date", 1).limit(batch_size).to_list(length=batch_size)
+            if not due:
+                break
+            
+            if batches == 0:
+                try:
+                    lag_seconds = round((now - datetime.fromisoformat(due[0]["end_date"])).total_seconds(), 1)
+                except (TypeError, ValueError):
+                    pass
+            
+            result = await self.db.subscriptions.update_many(
+                {"_id": {"$in": [sub["_id"] for sub in due]}, "status": "active"},
+                {
+                    "$set": {
+                        "status": "expired",
+                        "credentials_release_pending": True,
+                        "expired_at": now_iso,
+                        "updated_at": now_iso
+                    }
+                }
+            )
+            expired += result.modified_count
+            batches += 1
+            if len(due) < batch_size:
+                break
         
-        result = await self.db.subscriptions.update_many(
+        return {"processed": expired, "batches": batches, "lag_seconds": lag_seconds}
+    
+    async def send_renewal_reminders(self, days_before: int, batch_size: int = 200) -> dict:
+        """
+        Notify users whose subscription ends within `days_before` days
+        Each subscription is reminded once (renewal_reminder_sent_at).
+        """
+        from notifications.service import NotificationService
+        
+        now = datetime.utcnow()
+        due = await self.db.subscriptions.find(
             {
                 "status": "active",
-                "end_date": {"$lt": now}
+                "end_date": {"$gte": now.isoformat(), "$lte": (now + timedelta(days=days_before)).isoformat()},
+                "renewal_reminder_sent_at": {"$exists": False}
             },
-            {
-                "$set": {
-                    "status": "expired",
-                    "updated_at": now
-                }
-            }
-        )
+            {"user_id": 1, "platform_name": 1, "plan_name": 1, "end_date": 1}
+        ).sort("end_date", 1).limit(batch_size).to_list(length=batch_size)
+        if not due:
+            return {"processed": 0}
+        
+        notification_service = NotificationService(self.db)
+        sent = 0
+        for sub in due:
+            # Claim each subscription first so an overlapping run can't remind twice
+            claimed = await self.db.subscriptions.update_one(
+                {"_id": sub["_id"], "renewal_reminder_sent_at": {"$exists": False}},
+                {"$set": {"renewal_reminder_sent_at": now.isoformat()}}
+            )
+            if not claimed.modified_count:
+                continue
+            
+            days_left = math.ceil((datetime.fromisoformat(sub["end_date"]) - now).total_seconds() / 86400)
+            when = f"in {days_left} day{'s' if days_left != 1 else ''}" if days_left > 0 else "today"
+            await notification_service.create_notification(
+                sub["user_id"],
+                "Subscription expiring soon",
+                f"Your {sub['platform_name']} {sub['plan_name']} subscription ends {when}. Renew to keep access.",
+                type="warning"
+            )
+            sent += 1
         
-        return result.modified_count
+        return {"processed": sent, "skipped": len(due) - sent}
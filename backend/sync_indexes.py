@@ -0,0 +1,47 @@
+"""
+Reconcile MongoDB indexes with the declared index registry
+Run before deploys to build indexes ahead of the application starting.
+Legacy credentials/products get their platform_key first (the unique
+credential index is built on it); duplicate credentials that still block
+that index are listed for an admin to remove.
+
+Usage:
+    python sync_indexes.py              # create missing indexes, report extras
+    python sync_indexes.py --check      # report only, exit 1 if anything is missing
+    python sync_indexes.py --drop-extra # also drop undeclared indexes
+"""
+import asyncio
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+from core.config import settings
+from core.indexes import reconcile_indexes, print_index_report
+from app.credentials.pool import CredentialPool, report_duplicate_credentials
+
+
+async def sync_indexes(check_only: bool, drop_extra: bool) -> int:
+    """Reconcile indexes and return process exit code"""
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.DATABASE_NAME]
+
+    if not check_only:
+        backfilled = await CredentialPool(db).backfill_platform_keys()
+        if backfilled:
+            print(f"🔑 Backfilled platform_key on {backfilled} credentials/products")
+
+    print(f"🔍 Reconciling indexes on {settings.DATABASE_NAME}...")
+    report = await reconcile_indexes(db, apply=not check_only, drop_extra=drop_extra)
+    print_index_report(report)
+    await report_duplicate_credentials(db, report)
+
+    client.close()
+
+    if report["failed"] or (check_only and report["missing"]):
+        return 1
+    print("✅ Indexes in sync")
+    return 0
+
+
+if __name__ == "__main__":
+    check_only = "--check" in sys.argv
+    drop_extra = "--drop-extra" in sys.argv
+    sys.exit(asyncio.run(sync_indexes(check_only, drop_extra)))
@@ -0,0 +1,147 @@
+"""
+Test script for the transactional order pipeline (OrderEngine)
+
+Transactions need a replica set. A single-node replica set is enough:
+
+    mongod --replSet rs0 --port 27018 --dbpath /tmp/rs0
+    ORDER_TEST_MONGODB_URL="mongodb://localhost:27018/?directConnection=true" python test_order_pipeline.py
+
+The script initiates the replica set if needed. Against a standalone server
+it still runs, exercising the compensation (no-transaction) path.
+"""
+import asyncio
+import os
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo.errors import OperationFailure
+from core.config import settings
+from core.database import supports_transactions
+from app.credentials.counters import recompute_counters
+from orders.engine import OrderEngine
+
+
+MONGODB_URL = os.getenv("ORDER_TEST_MONGODB_URL", settings.MONGODB_URL)
+
+
+async def ensure_replica_set(client: AsyncIOMotorClient):
+    """Initiate a single-node replica set on a fresh `mongod --replSet` server"""
+    try:
+        await client.admin.command("replSetInitiate")
+        print("   Initiated single-node replica set, waiting for primary...")
+        for _ in range(30):
+            hello = await client.admin.command("hello")
+            if hello.get("isWritablePrimary"):
+                break
+            await asyncio.sleep(0.5)
+    except OperationFailure:
+        # Already initiated, or not started with --replSet (standalone)
+        pass
+
+
+async def test_order_pipeline():
+    client = AsyncIOMotorClient(MONGODB_URL)
+    await ensure_replica_set(client)
+    db = client[settings.DATABASE_NAME]
+
+    transactional = await supports_transactions(db)
+    print(f"\n   Transactions: {'yes (replica set)' if transactional else 'no (standalone, compensations)'}")
+
+    suffix = ObjectId()
+    product = {
+        "platform_name": "Pipeline Test Netflix",
+        "platform_key": f"pipelinetest{suffix}",
+        "plan_name": "Test Plan",
+        "price": 100.0,
+        "duration_days": 30,
+        "stock": 3,
+        "is_active": True,
+        "created_at": datetime.utcnow().isoformat()
+    }
+    product_id = str((await db.products.insert_one(product)).inserted_id)
+    user_id = str((await db.users.insert_one({
+        "name": "Pipeline Test",
+        "email": f"pipeline-{suffix}@test.local",
+        "wallet_balance": 250.0
+    })).inserted_id)
+    await db.credentials.insert_many([
+        {"platform": "Pipeline Test", "platform_key": product["platform_key"],
+         "username": f"user{i}", "password": "pw", "is_active": True}
+        for i in range(2)
+    ])
+    # Credentials inserted directly: bring the stock counters up to date
+    await recompute_counters(db)
+
+    engine = OrderEngine(db)
+    passed = True
+
+    # Test 1: successful purchase
+    print("\n🧪 TEST 1: Successful purchase")
+    order, subscription, _ = await engine.place_order(user_id, product_id)
+    print(f"   Order {order['_id']} status={order['status']}")
+    print(f"   Stage timings (ms): {order['pipeline_timings_ms']}")
+    stored = await db.orders.find_one({"_id": ObjectId(order["_id"])})
+    ok = stored["status"] == "completed" and stored["subscription_id"] == subscription["_id"]
+    passed &= ok
+    print(f"   {'✅ PASS' if ok else '❌ FAIL'}: order stored completed with subscription")
+
+    # Test 2: insufficient balance leaves nothing behind
+    print("\n🧪 TEST 2: Second purchase passes, third fails on balance (₹50 left)")
+    await engine.place_order(user_id, product_id)
+    try:
+        await engine.place_order(user_id, product_id)
+        print("   ❌ FAIL: purchase with insufficient balance succeeded")
+        passed = False
+    except HTTPException as e:
+        print(f"   Rejected: {e.detail}")
+
+    counter = await db.credential_counters.find_one({"_id": product["platform_key"]})
+    user_after = await db.users.find_one({"_id": ObjectId(user_id)})
+    orders = await db.orders.count_documents({"user_id": user_id})
+    subscriptions = await db.subscriptions.count_documents({"user_id": user_id})
+    ledger = await db.wallet_transactions.count_documents({"user_id": user_id})
+    ok = (counter["available"] == 0 and user_after["wallet_balance"] == 50.0
+          and orders == subscriptions == ledger == 2)
+    passed &= ok
+    print(f"   available={counter['available']} balance={user_after['wallet_balance']} "
+          f"orders={orders} subscriptions={subscriptions} ledger={ledger}")
+    print(f"   {'✅ PASS' if ok else '❌ FAIL'}: failed purchase left no partial writes")
+
+    # Test 3: out of credentials rolls back the debit
+    print("\n🧪 TEST 3: No credentials left - debit is rolled back")
+    await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"wallet_balance": 500.0}})
+    try:
+        await engine.place_order(user_id, product_id)
+        print("   ❌ FAIL: purchase without credentials succeeded")
+        passed = False
+    except HTTPException as e:
+        print(f"   Rejected: {e.detail}")
+    counter = await db.credential_counters.find_one({"_id": product["platform_key"]})
+    user_after = await db.users.find_one({"_id": ObjectId(user_id)})
+    ok = counter["available"] == 0 and user_after["wallet_balance"] == 500.0
+    passed &= ok
+    print(f"   {'✅ PASS' if ok else '❌ FAIL'}: available={counter['available']} balance={user_after['wallet_balance']}")
+
+    # Cleanup
+    await db.products.delete_one({"_id": ObjectId(product_id)})
+    await db.users.delete_one({"_id": ObjectId(user_id)})
+    await db.credentials.delete_many({"platform_key": product["platform_key"]})
+    await db.credential_counters.delete_one({"_id": product["platform_key"]})
+    await db.orders.delete_many({"user_id": user_id})
+    await db.subscriptions.delete_many({"user_id": user_id})
+    await db.wallet_transactions.delete_many({"user_id": user_id})
+    print("\n🧹 Cleaned up test data")
+    client.close()
+
+    print("\n" + "="*60)
+    print("✅ ORDER PIPELINE TEST PASSED" if passed else "❌ ORDER PIPELINE TEST FAILED")
+    print("="*60)
+
+
+if __name__ == "__main__":
+    print("="*60)
+    print("ORDER PIPELINE TEST")
+    print("="*60)
+
+    asyncio.run(test_order_pipeline())
@@ -0,0 +1,155 @@
+"""
+Test script for the async Razorpay gateway client
+Start the fake gateway first:
+    FAKE_RAZORPAY_LATENCY_MS=150 python fake_razorpay_server.py
+Then run:
+    RAZORPAY_API_URL=http://127.0.0.1:9010/v1 python test_razorpay_gateway.py
+"""
+import asyncio
+import time
+import httpx
+from wallet.gateway import RazorpayGateway, CircuitBreaker, CircuitOpenError, PaymentGatewayError, razorpay_gateway
+
+
+async def test_concurrent_order_creation():
+    """Concurrent order creation shares pooled connections and doesn't block the loop"""
+    print("\n🧪 TEST 1: 100 concurrent order creations")
+
+    latencies = []
+
+    async def create(i: int):
+        started = time.perf_counter()
+        order = await razorpay_gateway.create_order({
+            "amount": 10000,
+            "currency": "INR",
+            "receipt": f"bench_{i}"
+        })
+        latencies.append((time.perf_counter() - started) * 1000)
+        return order
+
+    started = time.perf_counter()
+    orders = await asyncio.gather(*[create(i) for i in range(100)], return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    ok = [o for o in orders if isinstance(o, dict)]
+    latencies.sort()
+    print(f"   Created: {len(ok)}/100 in {elapsed:.2f}s")
+    if latencies:
+        print(f"   p50: {latencies[len(latencies) // 2]:.0f}ms  p95: {latencies[int(len(latencies) * 0.95) - 1]:.0f}ms")
+
+    if len(ok) == 100:
+        print("   ✅ PASS: All orders created")
+    else:
+        print(f"   ⚠️  WARNING: {100 - len(ok)} orders failed")
+
+
+async def test_circuit_breaker():
+    """Gateway that is down trips the breaker and then fails fast"""
+    print("\n🧪 TEST 2: Circuit breaker against unreachable gateway")
+
+    gateway = RazorpayGateway(
+        base_url="http://127.0.0.1:9/v1",  # nothing listens here
+        key_id="rzp_test",
+        key_secret="secret",
+        timeout=1.0,
+        max_retries=0,
+        backoff_seconds=0.0,
+        breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    )
+
+    for _ in range(3):
+        try:
+            await gateway.create_order({"amount": 10000, "currency": "INR"})
+        except PaymentGatewayError:
+            pass
+
+    started = time.perf_counter()
+    try:
+        await gateway.create_order({"amount": 10000, "currency": "INR"})
+        print("   ❌ FAIL: Call went through with circuit open")
+    except CircuitOpenError:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"   ✅ PASS: Circuit open, failed fast in {elapsed_ms:.1f}ms")
+
+    await gateway.close()
+
+
+def mock_gateway(handler, max_retries: int = 0, breaker: CircuitBreaker = None) -> RazorpayGateway:
+    """Gateway whose HTTP calls are answered by `handler` (no server needed)"""
+    gateway = RazorpayGateway(
+        base_url="http://razorpay.test/v1",
+        key_id="rzp_test",
+        key_secret="secret",
+        timeout=1.0,
+        max_retries=max_retries,
+        backoff_seconds=0.0,
+        breaker=breaker or CircuitBreaker(failure_threshold=100, reset_timeout=60)
+    )
+    gateway._client = httpx.AsyncClient(base_url=gateway.base_url, transport=httpx.MockTransport(handler))
+    return gateway
+
+
+async def test_half_open_single_probe():
+    """After the reset timeout only one trial call reaches the gateway"""
+    print("\n🧪 TEST 3: Half-open circuit lets exactly one probe through")
+
+    calls = 0
+
+    async def handler(request):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return httpx.Response(200, json={"id": "order_probe"})
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.2)
+    breaker.record_failure()
+    gateway = mock_gateway(handler, breaker=breaker)
+    await asyncio.sleep(0.25)
+
+    results = await asyncio.gather(*[gateway.fetch_order("order_probe") for _ in range(5)], return_exceptions=True)
+    rejected = sum(isinstance(r, CircuitOpenError) for r in results)
+    print(f"   Gateway calls: {calls}, failed fast: {rejected}, circuit: {breaker.state}")
+    if calls == 1 and rejected == 4 and breaker.state == "closed":
+        print("   ✅ PASS: One probe, circuit closed again")
+    else:
+        print("   ❌ FAIL: Expected one probe and four fast failures")
+
+    await gateway.close()
+
+
+async def test_post_not_retried_after_send():
+    """Order creation is retried when it couldn't connect, never after a read timeout"""
+    print("\n🧪 TEST 4: POST retries only on connect errors")
+
+    for error, expected_calls in ((httpx.ConnectError, 4), (httpx.ReadTimeout, 1)):
+        calls = 0
+
+        def handler(request):
+            nonlocal calls
+            calls += 1
+            raise error("simulated", request=request)
+
+        gateway = mock_gateway(handler, max_retries=3)
+        try:
+            await gateway.create_order({"amount": 10000, "currency": "INR"})
+        except PaymentGatewayError:
+            pass
+        await gateway.close()
+
+        status = "✅ PASS" if calls == expected_calls else "❌ FAIL"
+        print(f"   {status}: {error.__name__} -> {calls} attempt(s) (expected {expected_calls})")
+
+
+async def main():
+    await test_concurrent_order_creation()
+    await test_circuit_breaker()
+    await test_half_open_single_probe()
+    await test_post_not_retried_after_send()
+    await razorpay_gateway.close()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("RAZORPAY GATEWAY TEST SUITE")
+    print("=" * 60)
+    asyncio.run(main())
@@ -0,0 +1,264 @@
+"""
+Test script for Razorpay webhooks and the pending payment sweeper
+Checks that every path that can credit a wallet credits each payment once:
+
+- a webhook with a bad signature is rejected and nothing is queued
+- a redelivered webhook event is a no-op
+- /verify-payment racing the webhook worker on one order credits once
+- a captured amount that doesn't match the order fails the event and alerts
+- the sweeper recovers stuck payments without crediting them twice
+
+Transactions need a replica set (see test_order_pipeline.py):
+
+    WEBHOOK_TEST_MONGODB_URL="mongodb://localhost:27018/?directConnection=true" python test_razorpay_webhooks.py
+
+Against a standalone server the sweeper parks stuck payments as needs_review
+instead of re-crediting them, and the script checks that instead.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+from datetime import datetime, timedelta
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from core.config import settings
+from core.database import get_database, supports_transactions
+from wallet.pending import recover_stuck_processing
+from wallet.service import WalletService
+from wallet.webhooks import RazorpayWebhookWorker
+from test_order_pipeline import ensure_replica_set
+
+
+MONGODB_URL = os.getenv("WEBHOOK_TEST_MONGODB_URL", settings.MONGODB_URL)
+
+if not settings.RAZORPAY_WEBHOOK_SECRET:
+    settings.RAZORPAY_WEBHOOK_SECRET = "test_webhook_secret"
+
+
+def webhook_request(event_id: str, order_id: str, payment_id: str, amount_paise: int) -> tuple:
+    """(body, headers) of a signed payment.captured webhook"""
+    body = json.dumps({
+        "event": "payment.captured",
+        "payload": {"payment": {"entity": {
+            "id": payment_id,
+            "order_id": order_id,
+            "amount": amount_paise,
+            "currency": "INR"
+        }}}
+    }).encode()
+    signature = hmac.new(settings.RAZORPAY_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return body, {"X-Razorpay-Signature": signature, "X-Razorpay-Event-Id": event_id}
+
+
+def payment_signature(order_id: str, payment_id: str) -> str:
+    """Checkout signature the frontend sends to /verify-payment"""
+    return hmac.new(
+        settings.RAZORPAY_KEY_SECRET.encode(),
+        f"{order_id}|{payment_id}".encode(),
+        hashlib.sha256
+    ).hexdigest()
+
+
+async def create_payment(db, user_id: str, tag: str, amount: float = 500.0, **fields) -> dict:
+    """Pending wallet recharge as created by /wallet/create-order"""
+    suffix = ObjectId()
+    pending = {
+        "user_id": user_id,
+        "type": "credit",
+        "amount": amount,
+        "status": "pending",
+        "razorpay_order_id": f"order_{tag}_{suffix}",
+        "razorpay_payment_id": None,
+        "created_at": datetime.utcnow().isoformat(),
+        **fields
+    }
+    await db.wallet_pending_transactions.insert_one(pending)
+    pending["payment_id"] = f"pay_{tag}_{suffix}"
+    return pending
+
+
+async def drain(worker: RazorpayWebhookWorker, db, order_ids: list, rounds: int = 5):
+    """Process queued events, making retries due immediately"""
+    for _ in range(rounds):
+        await db.razorpay_webhook_events.update_many(
+            {"order_id": {"$in": order_ids}, "status": "queued"},
+            {"$set": {"next_attempt_at": datetime.utcnow()}}
+        )
+        if not await worker.process_batch():
+            break
+
+
+async def wallet_state(db, user_id: str) -> tuple:
+    """(balance, ledger entries)"""
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, {"wallet_balance": 1})
+    ledger = await db.wallet_transactions.count_documents({"user_id": user_id, "reference_type": "razorpay"})
+    return user["wallet_balance"], ledger
+
+
+async def test_razorpay_webhooks():
+    import main
+
+    client = AsyncIOMotorClient(MONGODB_URL)
+    await ensure_replica_set(client)
+    db = client[settings.DATABASE_NAME]
+
+    transactional = await supports_transactions(db)
+    print(f"\n   Transactions: {'yes (replica set)' if transactional else 'no (standalone)'}")
+
+    user_id = str((await db.users.insert_one({
+        "name": "Webhook Test User",
+        "email": f"webhook-{ObjectId()}@test.local",
+        "role": "user",
+        "wallet_balance": 0.0,
+        "is_active": True,
+        "created_at": datetime.utcnow().isoformat()
+    })).inserted_id)
+
+    main.app.dependency_overrides[get_database] = lambda: db
+    http = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+    worker = RazorpayWebhookWorker(lambda: db)
+    service = WalletService(db)
+    order_ids = []
+    passed = True
+
+    # Test 1: bad signature
+    print("\n🧪 TEST 1: Webhook with a bad signature is rejected")
+    payment = await create_payment(db, user_id, "badsig")
+    order_ids.append(payment["razorpay_order_id"])
+    body, headers = webhook_request(f"evt_badsig_{ObjectId()}", payment["razorpay_order_id"], payment["payment_id"], 50000)
+    headers["X-Razorpay-Signature"] = "0" * 64
+    response = await http.post("/wallet/webhooks/razorpay", content=body, headers=headers)
+    queued = await db.razorpay_webhook_events.count_documents({"order_id": payment["razorpay_order_id"]})
+    ok = response.status_code == 400 and queued == 0
+    passed &= ok
+    print(f"   status={response.status_code} queued={queued}")
+    print(f"   {'✅ PASS' if ok else '❌ FAIL'}: forged webhook rejected")
+
+    # Test 2: redelivery
+    print("\n🧪 TEST 2: Redelivered event is a no-op")
+    payment = await create_payment(db, user_id, "redeliver")
+    order_ids.append(payment["razorpay_order_id"])
+    body, headers = webhook_request(f"evt_redeliver_{ObjectId()}", payment["razorpay_order_id"], payment["payment_id"], 50000)
+    statuses = []
+    for _ in range(3):
+        response = await http.post("/wallet/webhooks/razorpay", content=body, headers=headers)
+        statuses.append(response.json().get("status"))
+    await drain(worker, db, order_ids)
+    # Redelivered after processing as well
+    response = await http.post("/wallet/webhooks/razorpay", content=body, headers=headers)
+    statuses.append(response.json().get("status"))
+    await drain(worker, db, order_ids)
+    balance, ledger = await wallet_state(db, user_id)
+    ok = statuses == ["queued", "duplicate", "duplicate", "duplicate"] and balance == 500.0 and ledger == 1
+    passed &= ok
+    print(f"   responses={statuses} balance={balance} ledger={ledger}")
+    print(f"   {'✅ PASS' if ok else '❌ FAIL'}: credited once for four deliveries")
+
+    # Test 3: verify and webhook race
+    print("\n🧪 TEST 3: /verify-payment racing the webhook worker credits once")
+    for attempt in range(5):
+        payment = await create_payment(db, user_id, f"race{attempt}")
+        order_ids.append(payment["razorpay_order_id"])
+        body, headers = webhook_request(f"evt_race_{ObjectId()}", payment["razorpay_order_id"], payment["payment_id"], 50000)
+        await http.post("/wallet/webhooks/razorpay", content=body, headers=headers)
+        await asyncio.gather(
+            service.verify_and_credit_wallet(
+                user_id, payment["razorpay_order_id"], payment["payment_id"],
+                payment_signature(payment["razorpay_order_id"], payment["payment_id"])
+            ),
+            worker.process_batch(),
+            return_exceptions=True
+        )
+    await drain(worker, db, order_ids)
+    balance, ledger = await wallet_state(db, user_id)
+    completed = await db.wallet_pending_transactions.count_documents(
+        {"razorpay_order_id": {"$in": order_ids}, "status": "completed"}
+    )
+    ok = balance == 3000.0 and ledger == 6 and completed == 6
+    passed &= ok
+    print(f"   balance={balance} ledger={ledger} completed={completed} (expected 3000.0 / 6 / 6)")
+    print(f"   {'✅ PASS' if ok else '❌ FAIL'}: each raced payment credited exactly once")
+
+    # Test 4: amount mismatch
+    print("\n🧪 TEST 4: Captured amount that doesn't match the order is failed and alerted")
+    payment = await create_payment(db, user_id, "mismatch")
+    order_ids.append(payment["razorpay_order_id"])
+    body, headers = webhook_request(f"evt_mismatch_{ObjectId()}", payment["razorpay_order_id"], payment["payment_id"], 100)
+    await http.post("/wallet/webhooks/razorpay", content=body, headers=headers)
+    await drain(worker, db, order_ids)
+    event = await db.razorpay_webhook_events.find_one({"order_id": payment["razorpay_order_id"]})
+    alert = await db.telegram_outbox.find_one(
+        {"kind": "payment_needs_review", "payload.razorpay_order_id": payment["razorpay_order_id"]}
+    )
+    row = await db.wallet_pending_transactions.find_one({"razorpay_order_id": payment["razorpay_order_id"]})
+    balance, ledger = await wallet_state(db, user_id)
+    ok = event["status"] == "failed" and alert is not None and row["status"] == "pending" and balance == 3000.0
+    passed &= ok
+    print(f"   event={event['status']} ({event.get('result')}) alert={'yes' if alert else 'no'} row={row['status']} balance={balance}")
+    print(f"   {'✅ PASS' if ok else '❌ FAIL'}: mismatched payment not credited")
+
+    # Test 5: sweeper
+    print("\n🧪 TEST 5: Sweeper recovers stuck payments without double-crediting")
+    stuck_since = (datetime.utcnow() - timedelta(hours=1)).isoformat()
+    # Interrupted before anything was credited
+    uncredited = await create_payment(db, user_id, "stuck", status="processing", processing_started_at=stuck_since)
+    await db.wallet_pending_transactions.update_one({"_id": uncredited["_id"]}, {"$set": {
+        "razorpay_payment_id": uncredited["payment_id"],
+        "razorpay_signature": payment_signature(uncredited["razorpay_order_id"], uncredited["payment_id"])
+    }})
+    # Credited, but the completion update was lost
+    credited = await create_payment(db, user_id, "lost", status="processing", processing_started_at=stuck_since)
+    await db.wallet_pending_transactions.update_one(
+        {"_id": credited["_id"]}, {"$set": {"razorpay_payment_id": credited["payment_id"]}}
+    )
+    await db.users.update_one({"_id": ObjectId(user_id)}, {"$inc": {"wallet_balance": 500.0}})
+    await db.wallet_transactions.insert_one({
+        "user_id": user_id, "type": "credit", "amount": 500.0, "reference_type": "razorpay",
+        "reference_id": credited["payment_id"], "created_at": datetime.utcnow().isoformat()
+    })
+    order_ids += [uncredited["razorpay_order_id"], credited["razorpay_order_id"]]
+
+    counts = []
+    for _ in range(2):
+        counts.append(await recover_stuck_processing(db, timedelta(minutes=10), 3, 100))
+    balance, ledger = await wallet_state(db, user_id)
+    uncredited_row = await db.wallet_pending_transactions.find_one({"_id": uncredited["_id"]})
+    credited_row = await db.wallet_pending_transactions.find_one({"_id": credited["_id"]})
+    print(f"   first sweep={counts[0]} second sweep={counts[1]}")
+    print(f"   balance={balance} ledger={ledger} stuck row={uncredited_row['status']} lost row={credited_row['status']}")
+    if transactional:
+        ok = balance == 4000.0 and ledger == 8 and uncredited_row["status"] == "completed"
+    else:
+        ok = balance == 3500.0 and ledger == 7 and uncredited_row["status"] == "needs_review"
+    ok = ok and credited_row["status"] == "completed"
+    passed &= ok
+    print(f"   {'✅ PASS' if ok else '❌ FAIL'}: every stuck payment credited at most once")
+
+    # Cleanup
+    await http.aclose()
+    main.app.dependency_overrides.clear()
+    await db.users.delete_one({"_id": ObjectId(user_id)})
+    await db.wallet_pending_transactions.delete_many({"user_id": user_id})
+    await db.wallet_transactions.delete_many({"user_id": user_id})
+    await db.razorpay_webhook_events.delete_many({"order_id": {"$in": order_ids}})
+    await db.telegram_outbox.delete_many({"$or": [
+        {"payload.user_id": user_id},
+        {"payload.razorpay_order_id": {"$in": order_ids}}
+    ]})
+    print("\n🧹 Cleaned up test data")
+    client.close()
+
+    print("\n" + "="*60)
+    print("✅ RAZORPAY WEBHOOK TEST PASSED" if passed else "❌ RAZORPAY WEBHOOK TEST FAILED")
+    print("="*60)
+
+
+if __name__ == "__main__":
+    print("="*60)
+    print("RAZORPAY WEBHOOK AND SWEEPER TEST")
+    print("="*60)
+
+    asyncio.run(test_razorpay_webhooks())
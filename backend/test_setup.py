@@ -25,7 +25,7 @@ def test_imports():
         ("motor", "Motor (MongoDB driver)"),
         ("pydantic", "Pydantic"),
         ("jose", "Python-JOSE (JWT)"),
-        ("razorpay", "Razorpay"),
+        ("httpx", "HTTPX (Razorpay gateway client)"),
         ("telegram", "Python Telegram Bot"),
     ]
     
@@ -17,7 +17,7 @@ async def test_wallet_service():
     wallet_service = WalletService(db)
     
     print("\n✅ WalletService initialized")
-    print(f"Razorpay client: {wallet_service.razorpay_client}")
+    print(f"Razorpay gateway: {wallet_service.gateway.base_url}")
     
     # Try to create an order
     try:
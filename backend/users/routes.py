@@ -1,9 +1,10 @@
 """
 User API routes
 """
+from typing import Optional
 from fastapi import APIRouter, Depends, Query
 from core.database import get_database
-from core.security import get_current_user, require_role
+from core.security import get_current_user, require_role, invalidate_principal
 from .schemas import UserUpdate, UserOut
 from .service import UserService
 
@@ -12,16 +13,22 @@ router = APIRouter(prefix="/users", tags=["Users"])
 
 
 @router.get("/me", response_model=UserOut, summary="Get my profile")
-async def get_my_profile(current_user: dict = Depends(get_current_user)):
+async def get_my_profile(
+    current_user: dict = Depends(get_current_user),
+    db=Depends(get_database)
+):
     """Get authenticated user's profile"""
+    # Principal is cached without balances, read the live profile
+    service = UserService(db)
+    user = await service.get_user_by_id(current_user["_id"])
     return {
-        "id": current_user["_id"],
-        "phone": current_user["phone"],
-        "name": current_user.get("name"),
-        "email": current_user.get("email"),
-        "role": current_user["role"],
-        "wallet_balance": current_user.get("wallet_balance", 0.0),
-        "created_at": current_user.get("created_at")
+        "id": user["_id"],
+        "phone": user["phone"],
+        "name": user.get("name"),
+        "email": user.get("email"),
+        "role": user["role"],
+        "wallet_balance": user.get("wallet_balance", 0.0),
+        "created_at": user.get("created_at")
     }
 
 
@@ -34,6 +41,7 @@ async def update_my_profile(
     """Update authenticated user's profile"""
     service = UserService(db)
     user = await service.update_user_profile(current_user["_id"], update_data.model_dump())
+    await invalidate_principal(db, current_user["_id"])
     return {
         "id": user["_id"],
         "phone": user["phone"],
@@ -47,15 +55,16 @@ async def update_my_profile(
 
 @router.get("/", summary="List all users (Admin only)")
 async def list_users(
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
     limit: int = Query(100, ge=1, le=1000),
     current_user: dict = Depends(require_role(["admin"])),
     db=Depends(get_database)
 ):
     """List all users with pagination (admin only)"""
     service = UserService(db)
-    users = await service.list_users(skip, limit)
-    return {"users": users, "count": len(users)}
+    users, next_cursor = await service.list_users(skip, limit, cursor)
+    return {"users": users, "count": len(users), "next_cursor": next_cursor}
 
 
 @router.get("/{user_id}", response_model=UserOut, summary="Get user by ID (Admin only)")
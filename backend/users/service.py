@@ -5,6 +5,7 @@ from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from fastapi import HTTPException, status
+from core.pagination import paginate
 
 
 class UserService:
@@ -49,12 +50,11 @@ class UserService:
         
         return await self.get_user_by_id(user_id)
     
-    async def list_users(self, skip: int = 0, limit: int = 100) -> list:
-        """List all users (admin only)"""
-        cursor = self.db.users.find().skip(skip).limit(limit)
-        users = await cursor.to_list(length=limit)
+    async def list_users(self, skip: int = 0, limit: int = 100, cursor: str = None) -> tuple:
+        """List all users (admin only), newest first, returns (users, next_cursor)"""
+        users, next_cursor = await paginate(self.db.users, {}, limit, cursor, skip, sort_field="_id")
         
         for user in users:
             user["_id"] = str(user["_id"])
         
-        return users
+        return users, next_cursor
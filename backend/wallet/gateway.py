@@ -0,0 +1,199 @@
+"""
+Async Razorpay payment gateway client
+
+One process-wide HTTP client with keep-alive connection pooling replaces the
+per-request synchronous ``razorpay.Client``. Calls have timeouts, retry
+transient failures with exponential backoff (POSTs only when the request
+never reached the gateway), and a circuit breaker fails fast while the
+gateway is down instead of tying up request handlers.
+"""
+import asyncio
+import random
+import time
+from typing import Optional
+import httpx
+from core.config import settings
+
+
+class PaymentGatewayError(Exception):
+    """Gateway call failed (after retries)"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(PaymentGatewayError):
+    """Circuit breaker is open - gateway calls are short-circuited"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    closed -> open after `failure_threshold` failures; after `reset_timeout`
+    seconds exactly one trial call is let through (half-open) and closes the
+    circuit on success or re-opens it on failure. Other callers keep failing
+    fast while the trial is in flight (a trial that never reports back is
+    replaced after another `reset_timeout`).
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_started_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        """Raise if calls are currently blocked (admits the single half-open trial call)"""
+        state = self.state
+        if state == "open":
+            raise CircuitOpenError("Payment gateway temporarily unavailable")
+        if state == "half_open":
+            now = time.monotonic()
+            if self.probe_started_at is not None and now - self.probe_started_at < self.reset_timeout:
+                raise CircuitOpenError("Payment gateway temporarily unavailable")
+            self.probe_started_at = now
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self.probe_started_at = None
+
+
+class RazorpayGateway:
+    """Razorpay REST API adapter"""
+
+    # Responses worth retrying (rate limited / gateway side errors)
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+    # Failures where the request never reached the gateway
+    NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+    # Safe to repeat whatever happened to the first attempt
+    IDEMPOTENT_METHODS = {"GET", "HEAD"}
+
+    def __init__(
+        self,
+        base_url: str,
+        key_id: str,
+        key_secret: str,
+        timeout: float,
+        max_retries: int,
+        backoff_seconds: float,
+        breaker: CircuitBreaker
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.breaker = breaker
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared pooled client, created on first use"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=(self.key_id, self.key_secret),
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+            )
+        return self._client
+
+    async def _request(self, method: str, path: str, json: dict = None) -> dict:
+        """
+        Send request with retry/backoff behind the circuit breaker
+        Non-idempotent calls (POST) are only retried when the request was
+        never sent; after a read timeout or a 5xx the gateway may already
+        have acted on it (e.g. created the order)
+        """
+        self.breaker.before_call()
+        idempotent = method.upper() in self.IDEMPOTENT_METHODS
+
+        last_error: Optional[PaymentGatewayError] = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                delay = self.backoff_seconds * (2 ** (attempt - 1))
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+            try:
+                response = await self.client.request(method, path, json=json)
+            except httpx.TransportError as e:
+                last_error = PaymentGatewayError(f"Gateway connection error: {e.__class__.__name__}")
+                if idempotent or isinstance(e, self.NOT_SENT_ERRORS):
+                    continue
+                break
+
+            if response.status_code in self.RETRY_STATUS_CODES:
+                last_error = PaymentGatewayError(
+                    f"Gateway returned HTTP {response.status_code}",
+                    status_code=response.status_code
+                )
+                if idempotent:
+                    continue
+                break
+
+            if response.status_code >= 400:
+                # Client error (bad request / auth) - retrying won't help and
+                # the gateway itself is healthy
+                self.breaker.record_success()
+                try:
+                    description = response.json().get("error", {}).get("description")
+                except ValueError:
+                    description = None
+                raise PaymentGatewayError(
+                    description or f"Gateway returned HTTP {response.status_code}",
+                    status_code=response.status_code
+                )
+
+            self.breaker.record_success()
+            return response.json()
+
+        self.breaker.record_failure()
+        raise last_error
+
+    async def create_order(self, order_data: dict) -> dict:
+        """Create a Razorpay order (amount in paise)"""
+        return await self._request("POST", "/orders", json=order_data)
+
+    async def fetch_order(self, order_id: str) -> dict:
+        """Fetch a Razorpay order"""
+        return await self._request("GET", f"/orders/{order_id}")
+
+    async def close(self):
+        """Close pooled connections on application shutdown"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Global gateway instance
+razorpay_gateway = RazorpayGateway(
+    base_url=settings.RAZORPAY_API_URL,
+    key_id=settings.RAZORPAY_KEY_ID,
+    key_secret=settings.RAZORPAY_KEY_SECRET,
+    timeout=settings.RAZORPAY_TIMEOUT_SECONDS,
+    max_retries=settings.RAZORPAY_MAX_RETRIES,
+    backoff_seconds=settings.RAZORPAY_RETRY_BACKOFF_SECONDS,
+    breaker=CircuitBreaker(
+        failure_threshold=settings.RAZORPAY_CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=settings.RAZORPAY_CIRCUIT_RESET_SECONDS
+    )
+)
@@ -0,0 +1,36 @@
+"""
+Wallet indexes
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+
+INDEXES = {
+    "wallet_transactions": [
+        # Transaction history
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_id_created_at_id"),
+        # Pending payment recovery: was this Razorpay payment credited?
+        IndexModel(
+            [("reference_id", ASCENDING)],
+            name="razorpay_reference_id",
+            partialFilterExpression={"reference_type": "razorpay"}
+        ),
+    ],
+    "wallet_pending_transactions": [
+        # Payment verification lock (pending -> processing)
+        IndexModel([("razorpay_order_id", ASCENDING)], name="razorpay_order_id"),
+        # Pending payment sweeper (stale pending / stuck processing / old completed)
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+    ],
+    "wallet_pending_transactions_archive": [
+        # Late payments for expired orders
+        IndexModel([("razorpay_order_id", ASCENDING)], name="razorpay_order_id"),
+    ],
+    "razorpay_webhook_events": [
+        # Webhook worker due-event scan
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt_at"),
+        # Events claimed by one worker pass
+        IndexModel([("batch_id", ASCENDING)], name="batch_id", sparse=True),
+        # Processed events are purged after retention
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
@@ -0,0 +1,28 @@
+"""
+Scheduled wallet jobs (registered with core.scheduler in main.py)
+"""
+from datetime import timedelta
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from core.config import settings
+from .pending import expire_stale_pending, archive_completed, recover_stuck_processing
+
+
+async def sweep_pending_payments_job(db: AsyncIOMotorDatabase) -> dict:
+    """Expire abandoned checkouts, archive completed rows and recover stuck credits"""
+    batch_size = settings.PENDING_PAYMENT_SWEEP_BATCH_SIZE
+    recovered = await recover_stuck_processing(
+        db,
+        timeout=timedelta(minutes=settings.PENDING_PAYMENT_PROCESSING_TIMEOUT_MINUTES),
+        max_attempts=settings.PENDING_PAYMENT_MAX_RECOVERY_ATTEMPTS,
+        batch_size=batch_size
+    )
+    stale = await expire_stale_pending(db, timedelta(hours=settings.PENDING_PAYMENT_TTL_HOURS), batch_size)
+    archived = await archive_completed(db, timedelta(hours=settings.PENDING_PAYMENT_ARCHIVE_AFTER_HOURS), batch_size)
+    needs_review = recovered.pop("needs_review") + stale["needs_review"]
+    return {
+        "processed": stale["expired"] + archived + needs_review + sum(recovered.values()),
+        "expired": stale["expired"],
+        "archived": archived,
+        "needs_review": needs_review,
+        **recovered
+    }
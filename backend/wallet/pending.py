@@ -0,0 +1,213 @@
+"""
+Pending Razorpay payment housekeeping
+
+``wallet_pending_transactions`` holds one row per Razorpay order
+(pending -> processing -> completed). The sweeper keeps it small:
+
+- pending rows older than PENDING_PAYMENT_TTL_HOURS with no payment id are
+  abandoned checkouts; they are marked ``expired`` and moved to the archive
+  collection. A late payment for one is still honoured: ``restore_expired``
+  moves it back. Stale pending rows that do carry a payment id were paid
+  but never credited and go to ``needs_review``.
+- completed rows are archived after PENDING_PAYMENT_ARCHIVE_AFTER_HOURS.
+- processing rows older than PENDING_PAYMENT_PROCESSING_TIMEOUT_MINUTES were
+  interrupted mid-credit. If the ledger (``wallet_transactions``) has the
+  payment the row is completed; otherwise it is put back to pending and
+  credited again from its stored (already verified) payment details, or
+  left for the webhook worker to retry if a webhook claimed it. After
+  PENDING_PAYMENT_MAX_RECOVERY_ATTEMPTS it is parked as ``needs_review``
+  and the admin is alerted.
+
+Crediting writes the balance and ledger entry in one transaction where
+supported. Without transactions a crash between the two can't be told
+apart from "not credited", so stuck rows are never re-credited there: they
+go straight to ``needs_review``.
+"""
+from datetime import datetime, timedelta
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from core.database import supports_transactions
+from bots.outbox import enqueue_alert
+
+
+ARCHIVE_COLLECTION = "wallet_pending_transactions_archive"
+DUPLICATE_KEY = 11000
+# Batches per sweep and status
+MAX_BATCHES = 10
+
+
+async def _archive(db: AsyncIOMotorDatabase, query: dict, batch_size: int) -> int:
+    """Move rows matching `query` (which must pin a final status) to the archive"""
+    moved = 0
+    for _ in range(MAX_BATCHES):
+        rows = await db.wallet_pending_transactions.find(query).limit(batch_size).to_list(length=batch_size)
+        if not rows:
+            break
+        now = datetime.utcnow().isoformat()
+        for row in rows:
+            row["archived_at"] = now
+        try:
+            await db[ARCHIVE_COLLECTION].insert_many(rows, ordered=False)
+        except BulkWriteError as e:
+            # Rows copied by an interrupted sweep are already there
+            if any(error.get("code") != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                raise
+        result = await db.wallet_pending_transactions.delete_many(
+            {"_id": {"$in": [row["_id"] for row in rows]}, "status": query["status"]}
+        )
+        moved += result.deleted_count
+        if len(rows) < batch_size:
+            break
+    return moved
+
+
+async def _park_for_review(db: AsyncIOMotorDatabase, row: dict, query: dict, attempts: int, error: str) -> bool:
+    """Move a row to needs_review and alert the admin, returns whether this call parked it"""
+    result = await db.wallet_pending_transactions.update_one(
+        query, {"$set": {"status": "needs_review", "review_reason": error, "updated_at": datetime.utcnow().isoformat()}}
+    )
+    if not result.modified_count:
+        return False
+    await enqueue_alert(db, "payment_needs_review", {
+        "user_id": row["user_id"],
+        "amount": row.get("amount"),
+        "razorpay_order_id": row.get("razorpay_order_id"),
+        "razorpay_payment_id": row.get("razorpay_payment_id"),
+        "attempts": attempts,
+        "error": error
+    })
+    return True
+
+
+async def expire_stale_pending(db: AsyncIOMotorDatabase, ttl: timedelta, batch_size: int) -> dict:
+    """
+    Expire and archive abandoned checkouts
+    Stale rows that already carry a payment id were paid (requeued by recovery
+    but never credited) and go to needs_review instead
+    Returns {"expired", "needs_review"}
+    """
+    cutoff = (datetime.utcnow() - ttl).isoformat()
+
+    paid = await db.wallet_pending_transactions.find(
+        {"status": "pending", "created_at": {"$lt": cutoff}, "razorpay_payment_id": {"$ne": None}}
+    ).limit(batch_size).to_list(length=batch_size)
+    needs_review = 0
+    for row in paid:
+        query = {"_id": row["_id"], "status": "pending"}
+        reason = row.get("recovery_error") or "payment captured but never credited"
+        if await _park_for_review(db, row, query, row.get("recovery_attempts", 0), reason):
+            needs_review += 1
+
+    # Expired rows can no longer be claimed, so moving them can't race a verify
+    await db.wallet_pending_transactions.update_many(
+        {"status": "pending", "created_at": {"$lt": cutoff}, "razorpay_payment_id": None},
+        {"$set": {"status": "expired", "expired_at": datetime.utcnow().isoformat()}}
+    )
+    expired = await _archive(db, {"status": "expired"}, batch_size)
+    return {"expired": expired, "needs_review": needs_review}
+
+
+async def archive_completed(db: AsyncIOMotorDatabase, older_than: timedelta, batch_size: int) -> int:
+    """Archive rows completed before the cutoff, returns rows archived"""
+    cutoff = (datetime.utcnow() - older_than).isoformat()
+    return await _archive(db, {"status": "completed", "completed_at": {"$lt": cutoff}}, batch_size)
+
+
+async def restore_expired(db: AsyncIOMotorDatabase, razorpay_order_id: str, user_id: str = None) -> bool:
+    """Put an expired order back to pending (its payment arrived late), returns whether one was found"""
+    query = {"razorpay_order_id": razorpay_order_id, "status": "expired"}
+    if user_id:
+        query["user_id"] = user_id
+    reopen = {"$set": {"status": "pending"}, "$unset": {"expired_at": ""}}
+
+    # Not moved to the archive yet
+    result = await db.wallet_pending_transactions.update_one(query, reopen)
+    if result.modified_count:
+        return True
+
+    archived = await db[ARCHIVE_COLLECTION].find_one_and_delete(query)
+    if not archived:
+        return False
+    archived.pop("archived_at", None)
+    archived.pop("expired_at", None)
+    archived["status"] = "pending"
+    try:
+        await db.wallet_pending_transactions.insert_one(archived)
+    except DuplicateKeyError:
+        # Copy left behind by an interrupted sweep
+        await db.wallet_pending_transactions.update_one({"_id": archived["_id"], "status": "expired"}, reopen)
+    print(f"Restored expired wallet payment {razorpay_order_id}")
+    return True
+
+
+async def recover_stuck_processing(
+    db: AsyncIOMotorDatabase,
+    timeout: timedelta,
+    max_attempts: int,
+    batch_size: int
+) -> dict:
+    """Complete or re-credit rows stuck in processing, returns counters"""
+    from .service import WalletService
+
+    counts = {"completed": 0, "credited": 0, "requeued": 0, "needs_review": 0}
+    cutoff = (datetime.utcnow() - timeout).isoformat()
+    rows = await db.wallet_pending_transactions.find(
+        {"status": "processing", "processing_started_at": {"$lt": cutoff}}
+    ).limit(batch_size).to_list(length=batch_size)
+    if not rows:
+        return counts
+
+    # Without transactions the balance may have moved without a ledger entry
+    can_recredit = await supports_transactions(db)
+    service = WalletService(db)
+    for row in rows:
+        stuck = {"_id": row["_id"], "status": "processing", "processing_started_at": row["processing_started_at"]}
+        now = datetime.utcnow().isoformat()
+
+        credited = await db.wallet_transactions.find_one(
+            {"reference_type": "razorpay", "reference_id": row.get("razorpay_payment_id"), "user_id": row["user_id"]},
+            {"_id": 1}
+        )
+        if credited:
+            # Credited before the interruption, only the status update was lost
+            result = await db.wallet_pending_transactions.update_one(
+                stuck, {"$set": {"status": "completed", "completed_at": now, "recovered_at": now}}
+            )
+            counts["completed"] += result.modified_count
+            continue
+
+        attempts = row.get("recovery_attempts", 0) + 1
+        if not can_recredit:
+            reason = "interrupted credit without transactions: balance may already include it"
+            if await _park_for_review(db, row, stuck, attempts - 1, reason):
+                counts["needs_review"] += 1
+            continue
+        if attempts > max_attempts:
+            if await _park_for_review(db, row, stuck, attempts - 1, row.get("recovery_error") or "recovery attempts exhausted"):
+                counts["needs_review"] += 1
+            continue
+
+        # Re-queue, then credit through the normal verify path
+        result = await db.wallet_pending_transactions.update_one(
+            stuck,
+            {"$set": {"status": "pending", "recovery_attempts": attempts}, "$unset": {"processing_started_at": ""}}
+        )
+        if not result.modified_count:
+            continue
+        if not row.get("razorpay_signature"):
+            # Claimed by the webhook worker, which retries its event
+            counts["requeued"] += 1
+            continue
+        try:
+            await service.verify_and_credit_wallet(
+                row["user_id"], row["razorpay_order_id"], row["razorpay_payment_id"], row["razorpay_signature"]
+            )
+            counts["credited"] += 1
+        except Exception as e:
+            print(f"Wallet payment {row['razorpay_order_id']} recovery failed: {e}")
+            await db.wallet_pending_transactions.update_one(
+                {"_id": row["_id"]}, {"$set": {"recovery_error": str(getattr(e, "detail", e))}}
+            )
+            counts["requeued"] += 1
+
+    return counts
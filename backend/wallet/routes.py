@@ -1,11 +1,16 @@
 """
 Wallet API routes
 """
-from fastapi import APIRouter, Depends, Query
+from typing import Optional
+import json
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from core.config import settings
 from core.database import get_database
+from core.idempotency import run_idempotent, IDEMPOTENCY_HEADER
 from core.security import get_current_user, require_role
 from .schemas import AddMoneyRequest, VerifyPaymentRequest, AdminWalletOperation, WalletTransactionOut
 from .service import WalletService
+from .webhooks import verify_webhook_signature, enqueue_webhook_event
 
 
 router = APIRouter(prefix="/wallet", tags=["Wallet"])
@@ -25,6 +30,8 @@ async def get_balance(
 @router.post("/add-money", summary="Initiate add money to wallet")
 async def add_money(
     request: AddMoneyRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
     current_user: dict = Depends(get_current_user),
     db=Depends(get_database)
 ):
@@ -32,15 +39,21 @@ async def add_money(
     Create Razorpay order to add money to wallet
     
     Returns Razorpay order details for payment processing
+    (the same order again for a retry with the same Idempotency-Key)
     """
     service = WalletService(db)
-    order = await service.create_razorpay_order(current_user["_id"], request.amount)
-    return order
+    return await run_idempotent(
+        db, idempotency_key, current_user["_id"], "wallet.add_money", request.model_dump(),
+        lambda: service.create_razorpay_order(current_user["_id"], request.amount),
+        response
+    )
 
 
 @router.post("/verify-payment", summary="Verify Razorpay payment")
 async def verify_payment(
     request: VerifyPaymentRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
     current_user: dict = Depends(get_current_user),
     db=Depends(get_database)
 ):
@@ -50,27 +63,65 @@ async def verify_payment(
     - Verifies payment signature
     - Credits wallet with amount
     - Creates transaction record
+    - Retries with the same Idempotency-Key header return the original result
     """
     service = WalletService(db)
-    result = await service.verify_and_credit_wallet(
-        current_user["_id"],
-        request.razorpay_order_id,
-        request.razorpay_payment_id,
-        request.razorpay_signature
+    return await run_idempotent(
+        db, idempotency_key, current_user["_id"], "wallet.verify_payment", request.model_dump(),
+        lambda: service.verify_and_credit_wallet(
+            current_user["_id"],
+            request.razorpay_order_id,
+            request.razorpay_payment_id,
+            request.razorpay_signature
+        ),
+        response
     )
-    return result
+
+
+@router.post("/webhooks/razorpay", summary="Razorpay webhook")
+async def razorpay_webhook(
+    request: Request,
+    x_razorpay_signature: Optional[str] = Header(None),
+    x_razorpay_event_id: Optional[str] = Header(None),
+    db=Depends(get_database)
+):
+    """
+    Razorpay payment webhook (called by Razorpay, not the frontend)
+    
+    - Verifies the X-Razorpay-Signature against RAZORPAY_WEBHOOK_SECRET
+    - Queues `payment.captured` events; wallets are credited by a background worker
+    - Redelivered events are acknowledged without being queued twice
+    """
+    if not settings.RAZORPAY_WEBHOOK_SECRET:
+        raise HTTPException(status_code=503, detail="Webhook not configured")
+    
+    body = await request.body()
+    if not verify_webhook_signature(body, x_razorpay_signature):
+        raise HTTPException(status_code=400, detail="Invalid webhook signature")
+    
+    try:
+        event = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
+    
+    if not isinstance(event, dict) or event.get("event") != "payment.captured":
+        return {"status": "ignored"}
+    
+    queued = await enqueue_webhook_event(db, x_razorpay_event_id, event)
+    return {"status": "queued" if queued else "duplicate"}
 
 
 @router.get("/transactions", summary="Get wallet transactions")
 async def get_transactions(
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
     limit: int = Query(100, ge=1, le=1000),
     current_user: dict = Depends(get_current_user),
     db=Depends(get_database)
 ):
     """Get authenticated user's wallet transaction history"""
     service = WalletService(db)
-    transactions = await service.get_wallet_transactions(current_user["_id"], skip, limit)
+    transactions, next_cursor = await service.get_wallet_transactions(current_user["_id"], skip, limit, cursor)
     
     return {
         "transactions": [
@@ -87,13 +138,16 @@ async def get_transactions(
             }
             for t in transactions
         ],
-        "count": len(transactions)
+        "count": len(transactions),
+        "next_cursor": next_cursor
     }
 
 
 @router.post("/admin-operation", summary="Admin wallet operation (Admin only)")
 async def admin_operation(
     request: AdminWalletOperation,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
     current_user: dict = Depends(require_role(["admin"])),
     db=Depends(get_database)
 ):
@@ -105,10 +159,13 @@ async def admin_operation(
     - **description**: Reason for operation
     """
     service = WalletService(db)
-    result = await service.admin_wallet_operation(
-        request.user_id,
-        request.amount,
-        request.operation,
-        request.description
+    return await run_idempotent(
+        db, idempotency_key, current_user["_id"], "wallet.admin_operation", request.model_dump(),
+        lambda: service.admin_wallet_operation(
+            request.user_id,
+            request.amount,
+            request.operation,
+            request.description
+        ),
+        response
     )
-    return result
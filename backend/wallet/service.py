@@ -5,11 +5,14 @@ from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from fastapi import HTTPException, status
-import razorpay
 import hmac
 import hashlib
 from core.config import settings
-from bots.telegram import telegram_service
+from core.database import supports_transactions
+from core.pagination import paginate
+from bots.outbox import enqueue_alert
+from .gateway import razorpay_gateway, PaymentGatewayError, CircuitOpenError
+from .pending import restore_expired, ARCHIVE_COLLECTION
 
 
 class WalletService:
@@ -17,24 +20,16 @@ class WalletService:
     
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
-        # Initialize Razorpay client
-        self.razorpay_client = razorpay.Client(
-            auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
-        )
+        # Shared async gateway client (pooled connections, process-wide)
+        self.gateway = razorpay_gateway
     
     async def create_razorpay_order(self, user_id: str, amount: float) -> dict:
         """
         Create Razorpay order for adding money to wallet
         """
-        print(f"\n🔍 DEBUG: Creating Razorpay order")
-        print(f"  User ID: {user_id}")
-        print(f"  Amount: {amount}")
-        print(f"  Razorpay client: {self.razorpay_client}")
-        
         # Create Razorpay order
         # Receipt must be <= 40 chars, so use short timestamp
         receipt = f"wlt_{user_id[:8]}_{int(datetime.utcnow().timestamp())}"
-        print(f"  Receipt: {receipt} (length: {len(receipt)})")
         
         order_data = {
             "amount": int(amount * 100),  # Convert to paise
@@ -46,14 +41,12 @@ class WalletService:
             }
         }
         
-        print(f"  Order data: {order_data}")
-        
         try:
-            print("  📤 Calling Razorpay API...")
-            razorpay_order = self.razorpay_client.order.create(data=order_data)
-            print(f"  ✅ Razorpay order created: {razorpay_order['id']}")
-        except Exception as e:
-            print(f"  ❌ Razorpay API failed: {str(e)}")
+            razorpay_order = await self.gateway.create_order(order_data)
+        except CircuitOpenError:
+            raise HTTPException(status_code=503, detail="Payment gateway temporarily unavailable. Please try again shortly.")
+        except PaymentGatewayError as e:
+            print(f"Razorpay order creation failed for user {user_id}: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to create Razorpay order: {str(e)}")
         
         # Store pending wallet transaction
@@ -93,17 +86,70 @@ class WalletService:
             hashlib.sha256
         ).hexdigest()
         
-        if generated_signature != razorpay_signature:
+        if not hmac.compare_digest(generated_signature, razorpay_signature):
             raise HTTPException(status_code=400, detail="Invalid payment signature")
         
-        # Atomically lock transaction by changing status from pending to processing
-        # This prevents duplicate credits if multiple verify requests come simultaneously
-        pending_txn = await self.db.wallet_pending_transactions.find_one_and_update(
-            {
-                "razorpay_order_id": razorpay_order_id,
-                "user_id": user_id,
-                "status": "pending"  # Only proceed if status is still pending
-            },
+        pending_txn = await self.claim_pending_payment(
+            razorpay_order_id, razorpay_payment_id, razorpay_signature, user_id=user_id
+        )
+        if not pending_txn and await restore_expired(self.db, razorpay_order_id, user_id=user_id):
+            # Paid after the pending row was swept as abandoned
+            pending_txn = await self.claim_pending_payment(
+                razorpay_order_id, razorpay_payment_id, razorpay_signature, user_id=user_id
+            )
+        
+        if not pending_txn:
+            # The webhook worker (or an earlier verify) may have credited this payment already
+            completed = await self._find_completed_payment(user_id, razorpay_order_id, razorpay_payment_id)
+            if completed:
+                return {
+                    "message": "Wallet credited successfully",
+                    "amount": completed["amount"],
+                    "new_balance": await self.get_wallet_balance(user_id)
+                }
+            
+            # Transaction either doesn't exist, already processed, or belongs to different user
+            raise HTTPException(
+                status_code=400, 
+                detail="Transaction already processed or not found"
+            )
+        
+        return await self.credit_claimed_payment(pending_txn, razorpay_payment_id)
+    
+    async def _find_completed_payment(self, user_id: str, razorpay_order_id: str, razorpay_payment_id: str) -> dict:
+        """Completed pending row for this payment (live or archived), or None"""
+        query = {
+            "razorpay_order_id": razorpay_order_id,
+            "razorpay_payment_id": razorpay_payment_id,
+            "user_id": user_id,
+            "status": "completed"
+        }
+        return (
+            await self.db.wallet_pending_transactions.find_one(query, {"amount": 1})
+            or await self.db[ARCHIVE_COLLECTION].find_one(query, {"amount": 1})
+        )
+    
+    async def claim_pending_payment(
+        self,
+        razorpay_order_id: str,
+        razorpay_payment_id: str,
+        razorpay_signature: str = None,
+        user_id: str = None
+    ) -> dict:
+        """
+        Atomically lock a pending payment by changing status from pending to processing
+        This prevents duplicate credits if several verify calls (or the sweeper) race
+        Returns the pending document, or None if it is not pending (or not this user's)
+        """
+        query = {
+            "razorpay_order_id": razorpay_order_id,
+            "status": "pending"  # Only proceed if status is still pending
+        }
+        if user_id:
+            query["user_id"] = user_id
+        
+        return await self.db.wallet_pending_transactions.find_one_and_update(
+            query,
             {
                 "$set": {
                     "status": "processing",
@@ -114,21 +160,67 @@ class WalletService:
             },
             return_document=False  # Return original document before update
         )
+    
+    async def credit_claimed_payment(self, pending_txn: dict, razorpay_payment_id: str) -> dict:
+        """
+        Credit the wallet for a payment locked by claim_pending_payment
+        Balance, ledger entry and completion are written in one transaction when
+        the deployment supports it, so a processing row without a ledger entry
+        means nothing was credited (what the pending payment sweeper relies on)
+        """
+        user_id = pending_txn["user_id"]
+        amount = pending_txn["amount"]
         
-        if not pending_txn:
-            # Transaction either doesn't exist, already processed, or belongs to different user
-            raise HTTPException(
-                status_code=400, 
-                detail="Transaction already processed or not found"
+        if await supports_transactions(self.db):
+            async with await self.db.client.start_session() as session:
+                new_balance, transaction_id = await session.with_transaction(
+                    lambda s: self._apply_credit(pending_txn, razorpay_payment_id, s)
+                )
+        else:
+            new_balance, transaction_id = await self._apply_credit(pending_txn, razorpay_payment_id, None)
+        
+        # ✅ REFERRAL COMMISSION: Credit referrer if user was referred
+        try:
+            from app.referrals.service import ReferralService
+            referral_service = ReferralService(self.db)
+            await referral_service.credit_referral_commission(
+                referred_user_id=user_id,
+                topup_amount=amount,
+                transaction_id=transaction_id
             )
+        except Exception as e:
+            # Log error but don't fail the wallet credit
+            print(f"Referral commission error: {e}")
         
-        # Credit wallet atomically to prevent race conditions
+        # Queue Telegram notification
+        try:
+            await enqueue_alert(self.db, "wallet_recharge", {
+                "user_id": user_id,
+                "amount": amount,
+                "new_balance": new_balance,
+                "payment_id": razorpay_payment_id,
+                "created_at": datetime.utcnow().isoformat()
+            })
+        except Exception as e:
+            print(f"Failed to queue Telegram notification: {e}")
+        
+        return {
+            "message": "Wallet credited successfully",
+            "amount": amount,
+            "new_balance": new_balance
+        }
+    
+    async def _apply_credit(self, pending_txn: dict, razorpay_payment_id: str, session) -> tuple:
+        """Credit balance, write the ledger entry and complete the pending row, returns (new_balance, transaction_id)"""
+        user_id = pending_txn["user_id"]
         amount = pending_txn["amount"]
         
+        # Credit wallet atomically to prevent race conditions
         updated_user = await self.db.users.find_one_and_update(
             {"_id": ObjectId(user_id)},
             {"$inc": {"wallet_balance": amount}},
-            return_document=True
+            return_document=True,
+            session=session
         )
         
         if not updated_user:
@@ -148,22 +240,9 @@ class WalletService:
             "created_at": datetime.utcnow().isoformat()
         }
         
-        txn_result = await self.db.wallet_transactions.insert_one(wallet_txn)
+        txn_result = await self.db.wallet_transactions.insert_one(wallet_txn, session=session)
         
-        # ✅ REFERRAL COMMISSION: Credit referrer if user was referred
-        try:
-            from app.referrals.service import ReferralService
-            referral_service = ReferralService(self.db)
-            await referral_service.credit_referral_commission(
-                referred_user_id=user_id,
-                topup_amount=amount,
-                transaction_id=str(txn_result.inserted_id)
-            )
-        except Exception as e:
-            # Log error but don't fail the wallet credit
-            print(f"Referral commission error: {e}")
-        
-        # Mark transaction as completed (was already set to "processing" earlier)
+        # Mark transaction as completed (was already set to "processing" by the claim)
         await self.db.wallet_pending_transactions.update_one(
             {"_id": pending_txn["_id"]},
             {
@@ -171,36 +250,22 @@ class WalletService:
                     "status": "completed",
                     "completed_at": datetime.utcnow().isoformat()
                 }
-            }
+            },
+            session=session
         )
         
-        # Send Telegram notification
-        try:
-            await telegram_service.notify_wallet_recharge({
-                "user_id": user_id,
-                "amount": amount,
-                "new_balance": new_balance,
-                "payment_id": razorpay_payment_id,
-                "created_at": datetime.utcnow().isoformat()
-            })
-        except Exception as e:
-            print(f"Failed to send Telegram notification: {e}")
-        
-        return {
-            "message": "Wallet credited successfully",
-            "amount": amount,
-            "new_balance": new_balance
-        }
+        return new_balance, str(txn_result.inserted_id)
     
-    async def get_wallet_transactions(self, user_id: str, skip: int = 0, limit: int = 100) -> list:
-        """Get user's wallet transaction history"""
-        cursor = self.db.wallet_transactions.find({"user_id": user_id}).sort("created_at", -1).skip(skip).limit(limit)
-        transactions = await cursor.to_list(length=limit)
+    async def get_wallet_transactions(self, user_id: str, skip: int = 0, limit: int = 100, cursor: str = None) -> tuple:
+        """Get user's wallet transaction history, returns (transactions, next_cursor)"""
+        transactions, next_cursor = await paginate(
+            self.db.wallet_transactions, {"user_id": user_id}, limit, cursor, skip
+        )
         
         for txn in transactions:
             txn["_id"] = str(txn["_id"])
         
-        return transactions
+        return transactions, next_cursor
     
     async def get_wallet_balance(self, user_id: str) -> float:
         """Get user's wallet balance"""
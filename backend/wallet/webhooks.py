@@ -0,0 +1,241 @@
+"""
+Razorpay webhook ingestion
+
+``POST /wallet/webhooks/razorpay`` only checks the signature and stores
+``payment.captured`` events in the ``razorpay_webhook_events`` queue (keyed
+by Razorpay's event id, so redeliveries are no-ops), then answers 200
+immediately. ``RazorpayWebhookWorker`` drains the queue in batches on every
+worker: it claims a batch, then credits each payment through the same
+pending -> processing lock as ``/wallet/verify-payment``, so whichever of
+the browser and the webhook arrives first credits the wallet and the other
+is a no-op. Failures are retried with backoff; events locked by a worker
+that died are picked up again after a timeout.
+"""
+import asyncio
+import hashlib
+import hmac
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+from core.config import settings
+from bots.outbox import enqueue_alert
+from .pending import restore_expired
+
+
+# A batch locked longer than this belongs to a worker that died
+STALE_LOCK = timedelta(minutes=5)
+
+
+def verify_webhook_signature(body: bytes, signature: str) -> bool:
+    """X-Razorpay-Signature check (HMAC-SHA256 of the raw body with the webhook secret)"""
+    if not settings.RAZORPAY_WEBHOOK_SECRET or not signature:
+        return False
+    expected = hmac.new(settings.RAZORPAY_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+async def enqueue_webhook_event(db: AsyncIOMotorDatabase, event_id: str, event: dict) -> bool:
+    """
+    Store a payment.captured event for the worker
+    Returns False if the event was already queued (Razorpay redelivery)
+    """
+    payment = event.get("payload", {}).get("payment", {}).get("entity", {})
+    now = datetime.utcnow()
+    document = {
+        "_id": event_id or f"{event.get('event')}:{payment.get('id')}",
+        "event": event.get("event"),
+        "payment_id": payment.get("id"),
+        "order_id": payment.get("order_id"),
+        "amount": payment.get("amount"),  # paise
+        "currency": payment.get("currency"),
+        "status": "queued",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now.isoformat()
+    }
+    try:
+        await db.razorpay_webhook_events.insert_one(document)
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+class RazorpayWebhookWorker:
+    """Background task crediting wallets from queued webhook events"""
+
+    def __init__(self, get_db: Callable[[], AsyncIOMotorDatabase]):
+        self.get_db = get_db
+        self.batch_size = settings.RAZORPAY_WEBHOOK_BATCH_SIZE
+        self.poll_seconds = settings.RAZORPAY_WEBHOOK_POLL_SECONDS
+        self.max_attempts = settings.RAZORPAY_WEBHOOK_MAX_ATTEMPTS
+        self.retention = timedelta(days=settings.RAZORPAY_WEBHOOK_RETENTION_DAYS)
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.credited = 0
+        self.already_credited = 0
+        self.retries = 0
+        self.failures = 0
+
+    def start(self):
+        """Start worker loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop worker loop (claimed events are retried after STALE_LOCK)"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                handled = await self.process_batch()
+                # Drain backlog without waiting; otherwise poll
+                if handled < self.batch_size:
+                    await asyncio.sleep(self.poll_seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Razorpay webhook worker error: {e}")
+                await asyncio.sleep(self.poll_seconds)
+
+    async def _claim_batch(self, db: AsyncIOMotorDatabase) -> list:
+        """Lock up to batch_size due events for this worker"""
+        now = datetime.utcnow()
+        due = await db.razorpay_webhook_events.find(
+            {"$or": [
+                {"status": "queued", "next_attempt_at": {"$lte": now}},
+                {"status": "processing", "locked_at": {"$lt": now - STALE_LOCK}}
+            ]},
+            {"_id": 1}
+        ).limit(self.batch_size).to_list(length=self.batch_size)
+        if not due:
+            return []
+
+        batch_id = uuid.uuid4().hex
+        await db.razorpay_webhook_events.update_many(
+            {"_id": {"$in": [event["_id"] for event in due]}, "$or": [
+                {"status": "queued"},
+                {"status": "processing", "locked_at": {"$lt": now - STALE_LOCK}}
+            ]},
+            {"$set": {"status": "processing", "batch_id": batch_id, "locked_at": now}}
+        )
+        return await db.razorpay_webhook_events.find({"batch_id": batch_id}).to_list(length=self.batch_size)
+
+    async def process_batch(self) -> int:
+        """Credit one batch of queued payments, returns number of events handled"""
+        from .service import WalletService
+
+        db = self.get_db()
+        events = await self._claim_batch(db)
+        if not events:
+            return 0
+
+        # One lookup for the whole batch
+        order_ids = [event["order_id"] for event in events if event.get("order_id")]
+        pending_rows = await db.wallet_pending_transactions.find(
+            {"razorpay_order_id": {"$in": order_ids}},
+            {"razorpay_order_id": 1, "status": 1, "amount": 1, "razorpay_payment_id": 1}
+        ).to_list(length=len(order_ids))
+        rows_by_order = {row["razorpay_order_id"]: row for row in pending_rows}
+
+        service = WalletService(db)
+        await asyncio.gather(*(
+            self._process_event(db, service, event, rows_by_order.get(event.get("order_id")))
+            for event in events
+        ))
+        return len(events)
+
+    async def _process_event(self, db: AsyncIOMotorDatabase, service, event: dict, row: Optional[dict]):
+        """Credit one captured payment and record the outcome"""
+        order_id = event.get("order_id")
+        payment_id = event.get("payment_id")
+        try:
+            if (row is None or row["status"] == "expired") and order_id and await restore_expired(db, order_id):
+                # Paid after the order was swept as abandoned
+                row = await db.wallet_pending_transactions.find_one({"razorpay_order_id": order_id})
+            if row is None:
+                # Not a wallet recharge (or archived long ago) - nothing to credit
+                await self._finish(db, event, "ignored", "no wallet order")
+                return
+            if row["status"] == "completed":
+                self.already_credited += 1
+                await self._finish(db, event, "done", "already credited")
+                return
+            if event.get("amount") is not None and round(row["amount"] * 100) != event["amount"]:
+                await self._finish(db, event, "failed", f"amount mismatch: order {row['amount']}, captured {event['amount'] / 100}")
+                return
+
+            pending_txn = await service.claim_pending_payment(order_id, payment_id)
+            if not pending_txn:
+                current = await db.wallet_pending_transactions.find_one({"_id": row["_id"]}, {"status": 1})
+                if current and current["status"] == "completed":
+                    self.already_credited += 1
+                    await self._finish(db, event, "done", "already credited")
+                    return
+                # Being credited by a verify call right now (or needs review) - check again later
+                raise RuntimeError(f"payment is {current['status'] if current else 'missing'}")
+
+            await service.credit_claimed_payment(pending_txn, payment_id)
+            self.credited += 1
+            await self._finish(db, event, "done", "credited")
+        except Exception as e:
+            await self._record_failure(db, event, str(getattr(e, "detail", e)))
+
+    async def _finish(self, db: AsyncIOMotorDatabase, event: dict, status: str, result: str):
+        now = datetime.utcnow()
+        if status == "failed":
+            self.failures += 1
+            print(f"Razorpay webhook event {event['_id']} failed: {result}")
+            await enqueue_alert(db, "payment_needs_review", {
+                "amount": event["amount"] / 100 if event.get("amount") is not None else None,
+                "razorpay_order_id": event.get("order_id"),
+                "razorpay_payment_id": event.get("payment_id"),
+                "attempts": event.get("attempts", 0),
+                "error": result
+            })
+        await db.razorpay_webhook_events.update_one(
+            {"_id": event["_id"]},
+            {"$set": {
+                "status": status,
+                "result": result,
+                "processed_at": now.isoformat(),
+                "expires_at": now + self.retention
+            }}
+        )
+
+    async def _record_failure(self, db: AsyncIOMotorDatabase, event: dict, error: str):
+        """Schedule retry with exponential backoff or give up after max attempts"""
+        attempts = event.get("attempts", 0) + 1
+        if attempts >= self.max_attempts:
+            await self._finish(db, event, "failed", error[:500])
+            return
+        self.retries += 1
+        await db.razorpay_webhook_events.update_one(
+            {"_id": event["_id"]},
+            {"$set": {
+                "status": "queued",
+                "attempts": attempts,
+                "last_error": error[:500],
+                "next_attempt_at": datetime.utcnow() + timedelta(seconds=min(300, 5 * 2 ** attempts))
+            }}
+        )
+
+    def stats(self) -> dict:
+        """Worker counters"""
+        return {
+            "running": self._task is not None,
+            "credited": self.credited,
+            "already_credited": self.already_credited,
+            "retries": self.retries,
+            "failures": self.failures
+        }